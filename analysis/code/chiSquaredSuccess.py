@@ -3,22 +3,24 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "code"))
+from results_store import results_store, RECORDED
 
 TOTAL_POTENTIAL_DEALS = 600
-FILE_NAMES = {
-    0: "data/finalResults/95simRESULTSgrp0_CLEAN.csv",
-    1: "data/finalResults/95simRESULTSgrp1_CLEAN.csv",
-    2: "data/finalResults/95simRESULTSgrp2_CLEAN.csv"
-}
+GROUPS = [0, 1, 2]
 
+store = results_store()
+deals = store.deals(decay=0.95, group=GROUPS, run=RECORDED, columns=["group"])
 success_counts = {}
 
-for group_id, file_name in FILE_NAMES.items():
-    try:
-        df = pd.read_csv(file_name)
-        success_counts[group_id] = len(df)
-    except FileNotFoundError:
-        success_counts[group_id] = "File Not Found"
+for group_id in GROUPS:
+    if store.parts("RESULTS", decay=0.95, group=group_id, run=RECORDED):
+        success_counts[group_id] = int((deals['group'] == group_id).sum())
+    else:
+        success_counts[group_id] = "No Data"
 
 if any(isinstance(count, str) for count in success_counts.values()):
     print("Incomplete data: cannot perform analysis.")
@@ -3,6 +3,11 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "code"))
+from results_store import results_store, RECORDED
 
 TOTAL_POTENTIAL_DEALS = 600
 
@@ -11,26 +16,19 @@ decay_configs = {
     95: "Base (5% Decay)",
     99: "Low Urgency (1% Decay)"
 }
-data_dir = "data/finalResults/"
+store = results_store()
 results_list = []
 
 for decay_int, decay_label in decay_configs.items():
-    file_g1 = f"{data_dir}{decay_int}simRESULTSgrp1_CLEAN.csv"
-    file_g2 = f"{data_dir}{decay_int}simRESULTSgrp2_CLEAN.csv"
+    deals = store.deals(decay=decay_int / 100, group=[1, 2], run=RECORDED, columns=["group"])
 
     success_counts = {}
 
-    try:
-        df_g1 = pd.read_csv(file_g1)
-        success_counts[1] = len(df_g1)
-    except FileNotFoundError:
-        success_counts[1] = "File Not Found"
-
-    try:
-        df_g2 = pd.read_csv(file_g2)
-        success_counts[2] = len(df_g2)
-    except FileNotFoundError:
-        success_counts[2] = "File Not Found"
+    for group_id in [1, 2]:
+        if store.parts("RESULTS", decay=decay_int / 100, group=group_id, run=RECORDED):
+            success_counts[group_id] = int((deals['group'] == group_id).sum())
+        else:
+            success_counts[group_id] = "No Data"
 
     if any(isinstance(count, str) for count in success_counts.values()):
         results_list.append({
@@ -9,6 +9,12 @@ from matplotlib.projections.polar import PolarAxes
 from matplotlib.projections import register_projection
 from matplotlib.spines import Spine
 from matplotlib.transforms import Affine2D
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "code"))
+from results_store import results_store, RECORDED
+
 
 def radar_factory(num_vars, frame='circle'):
     """Create a radar chart with `num_vars` axes."""
@@ -78,53 +84,24 @@ def radar_factory(num_vars, frame='circle'):
 print("Loading data for radar chart...")
 
 
-price_files = {
-    0: "data/finalResults/95simRESULTSgrp0_CLEAN.csv",
-    1: "data/finalResults/95simRESULTSgrp1_CLEAN.csv",
-    2: "data/finalResults/95simRESULTSgrp2_CLEAN.csv"
-}
-price_data = []
-for group_id, file_name in price_files.items():
-    df = pd.read_csv(file_name)
-    df['group'] = str(group_id)
-    price_data.append(df)
-df_price = pd.concat(price_data, ignore_index=True)
-
-
-efficiency_files = {
-    0: "data/finalResults/95simRESULTSgrp0_CLEAN.csv",
-    1: "data/finalResults/95simRESULTSgrp1_CLEAN.csv",
-    2: "data/finalResults/95simRESULTSgrp2_CLEAN.csv"
-}
-efficiency_data = []
-for group_id, file_name in efficiency_files.items():
-    df = pd.read_csv(file_name)
-    df['round'] = df['round'] + 1  
-    df['group'] = str(group_id)
-    efficiency_data.append(df)
-df_efficiency = pd.concat(efficiency_data, ignore_index=True)
+store = results_store()
+df_price = store.deals(decay=0.95, group=[0, 1, 2], run=RECORDED)
+df_price['group'] = df_price['group'].astype(str)
+
+
+df_efficiency = df_price.copy()
+df_efficiency['round'] = df_efficiency['round'] + 1
 
 
 TOTAL_DEALS = 600
 success_counts = {}
 for group_id in [0, 1, 2]:
-    file_name = f"data/finalResults/95simRESULTSgrp{group_id}_CLEAN.csv"
-    df = pd.read_csv(file_name)
-    success_counts[group_id] = len(df)
+    success_counts[group_id] = int((df_price['group'] == str(group_id)).sum())
 success_rates = {k: v/TOTAL_DEALS * 100 for k, v in success_counts.items()}
 
 
-spoilage_files = {
-    0: "data/simulationState/95simSTOCKgrp0.csv",
-    1: "data/simulationState/95simSTOCKgrp1.csv",
-    2: "data/simulationState/95simSTOCKgrp2.csv"
-}
-spoilage_data = []
-for group_id, file_name in spoilage_files.items():
-    df = pd.read_csv(file_name)
-    df['group'] = str(group_id)
-    spoilage_data.append(df)
-df_spoilage = pd.concat(spoilage_data, ignore_index=True)
+df_spoilage = store.load("STOCK", decay=0.95, group=[0, 1, 2], run=RECORDED)
+df_spoilage['group'] = df_spoilage['group'].astype(str)
 df_spoilage.rename(columns={'decayed stock': 'decayed_stock'}, inplace=True)
 
 
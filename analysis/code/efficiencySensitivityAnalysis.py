@@ -3,6 +3,11 @@ import statsmodels.api as sm
 from statsmodels.formula.api import ols
 import matplotlib.pyplot as plt
 import seaborn as sns
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "code"))
+from results_store import results_store, RECORDED
 
 decay_rates = {
     0.90: "High Urgency (10% Decay)",
@@ -11,35 +16,18 @@ decay_rates = {
 }
 
 groups = [1, 2]
-data_dir = "data/finalResults/"
-all_data = []
 
 print("--- Loading Efficiency Sensitivity Analysis Data ---")
-for decay_multiplier, decay_label in decay_rates.items():
-    decay_int = int(decay_multiplier * 100)
-
-    for group_id in groups:
-        file_name = f"{data_dir}{decay_int}simRESULTSgrp{group_id}_CLEAN.csv"
-
-        try:
-            df = pd.read_csv(file_name)
-            if not df.empty:
-                df.loc[:, 'round'] = df.loc[:, 'round'] + 1  
-                df.loc[:, 'Group'] = str(group_id)
-                df.loc[:, 'Decay_Rate'] = decay_label
-                all_data.append(df)
-                print(f"Loaded: {file_name}")
-        except FileNotFoundError:
-            print(f"File not found: {file_name}. Skipping.")
-            continue
-
-if not all_data:
+df_combined = results_store().deals(decay=list(decay_rates), group=groups, run=RECORDED)
+
+if df_combined.empty:
     print("\nError: No sensitivity analysis files were successfully loaded. Check file paths and names.")
 else:
-    df_combined = pd.concat(all_data, ignore_index=True)
+    print(df_combined.groupby(['decay', 'group']).size())
+    df_combined['round'] = df_combined['round'] + 1
 
-    df_combined['Group'] = df_combined['Group'].astype('category')
-    df_combined['Decay_Rate'] = pd.Categorical(df_combined['Decay_Rate'], categories=["High Urgency (10% Decay)", "Base (5% Decay)", "Low Urgency (1% Decay)"], ordered=True)
+    df_combined['Group'] = df_combined['group'].astype(str).astype('category')
+    df_combined['Decay_Rate'] = pd.Categorical(df_combined['decay'].map(decay_rates), categories=["High Urgency (10% Decay)", "Base (5% Decay)", "Low Urgency (1% Decay)"], ordered=True)
 
     formula = 'round ~ C(Group) * C(Decay_Rate)'
     lm = ols(formula, data=df_combined).fit()
@@ -1,36 +1,24 @@
 import pandas as pd
 import json
+import os
+import sys
 from typing import List
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "code"))
+from results_store import results_store, RECORDED
 
-def split_negotiations(input_file: str, output_file: str = None) -> List[str]:
-    df = pd.read_csv(input_file)
-    logs = df.to_dict('records')
+
+def split_negotiations(decay: float, group: int, output_file: str = None) -> List[str]:
+    df = results_store().load("NEGOTIATIONS", decay=decay, group=group, run=RECORDED, columns=["replicate", "retailer", "supplier", "round", "speaker", "message"])
     
     negotiations = []
-    cycle_boundaries = []
-    
-    for i, log in enumerate(logs):
-        if log['round'] == 0 and i > 0:
-            if logs[i-1]['round'] > 0:
-                cycle_boundaries.append(i)
-    
-    cycle_boundaries.append(len(logs))
     
-    for i, boundary in enumerate(cycle_boundaries):
-        if i == 0:
-            cycle_logs = logs[:boundary]
-        else:
-            cycle_logs = logs[cycle_boundaries[i-1]:boundary]
-        
-        if not cycle_logs:
-            continue
-            
-        current_cycle = i + 1
+    for replicate, cycle_logs in df.groupby("replicate", sort=True):
+        current_cycle = replicate + 1
         
         negotiation_groups = {}
         
-        for log in cycle_logs:
+        for log in cycle_logs.to_dict('records'):
             key = (log['retailer'], log['supplier'])
             if key not in negotiation_groups:
                 negotiation_groups[key] = []
@@ -57,4 +45,4 @@ def split_negotiations(input_file: str, output_file: str = None) -> List[str]:
 
 
 if __name__ == "__main__":
-    negotiations = split_negotiations('data/rawNegotiations/95simNEGOTIATIONSgrp2.csv', 'negotiations_output.json')
+    negotiations = split_negotiations(0.95, 2, 'negotiations_output.json')
@@ -6,29 +6,18 @@ from statsmodels.stats.multicomp import pairwise_tukeyhsd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import itertools
+import sys
+import os
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "code"))
+from results_store import results_store, RECORDED
 
-file_names = {
-    0: "data/finalResults/95simRESULTSgrp0_CLEAN.csv",
-    1: "data/finalResults/95simRESULTSgrp1_CLEAN.csv",
-    2: "data/finalResults/95simRESULTSgrp2_CLEAN.csv"
-}
-all_data = []
 
+df_combined = results_store().deals(decay=0.95, group=[0, 1, 2], run=RECORDED)
 
-for group_id, file_name in file_names.items():
-    try:
-        df = pd.read_csv(file_name)
-        if not df.empty:
-            df.loc[:, 'group'] = group_id
-            all_data.append(df)
-    except FileNotFoundError:
-        continue
-
-if not all_data:
+if df_combined.empty:
     print("Error: No transaction results files were successfully loaded.")
 else:
-    df_combined = pd.concat(all_data, ignore_index=True)
     df_combined['group'] = df_combined['group'].astype(str)
     unique_groups = df_combined['group'].nunique()
     
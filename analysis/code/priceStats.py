@@ -1,27 +1,16 @@
 import pandas as pd
 import numpy as np
+import sys
+import os
 
-file_names = {
-    0: "data/finalResults/simRESULTSgrp0_CLEAN.csv",
-    1: "data/finalResults/simRESULTSgrp1_CLEAN.csv",
-    2: "data/finalResults/simRESULTSgrp2_CLEAN.csv"
-}
-all_data = []
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "code"))
+from results_store import results_store, RECORDED
 
-for group_id, file_name in file_names.items():
-    try:
-        df = pd.read_csv(file_name)
-        if not df.empty:
-            df.loc[:, 'group'] = group_id
-            all_data.append(df)
-    except FileNotFoundError:
-        continue
+df_combined = results_store().deals(decay=0.95, group=[0, 1, 2], run=RECORDED)
 
-if not all_data:
+if df_combined.empty:
     print("Error: No transaction results files were successfully loaded.")
 else:
-    df_combined = pd.concat(all_data, ignore_index=True)
-    
     summary_stats = df_combined.groupby('group')['final_price'].agg(
         Mean=('mean'),
         Median=('median'),
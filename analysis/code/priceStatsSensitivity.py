@@ -1,5 +1,10 @@
 import pandas as pd
 import numpy as np
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "code"))
+from results_store import results_store, RECORDED
 
 decay_rates = {
     0.90: "High Urgency (10% Decay)",
@@ -8,30 +13,15 @@ decay_rates = {
 }
 
 groups = [1, 2]
-data_dir = "data/finalResults/"
-all_data = []
-
-for decay_multiplier, decay_label in decay_rates.items():
-    decay_int = int(decay_multiplier * 100)
-
-    for group_id in groups:
-        file_name = f"{data_dir}{decay_int}simRESULTSgrp{group_id}_CLEAN.csv"
-
-        try:
-            df = pd.read_csv(file_name)
-            if not df.empty:
-                df.loc[:, 'Group'] = str(group_id)
-                df.loc[:, 'Decay_Rate'] = decay_label
-                all_data.append(df)
-        except FileNotFoundError:
-            continue
+df_combined = results_store().deals(decay=list(decay_rates), group=groups, run=RECORDED)
 
-if not all_data:
+if df_combined.empty:
     print("\nError: No sensitivity analysis files were successfully loaded. Check file paths and names.")
 else:
-    df_combined = pd.concat(all_data, ignore_index=True)
+    df_combined['Group'] = df_combined['group'].astype(str)
+    df_combined['Decay_Rate'] = pd.Categorical(df_combined['decay'].map(decay_rates), categories=list(decay_rates.values()), ordered=True)
 
-    summary_stats = df_combined.groupby(['Decay_Rate', 'Group'])['final_price'].agg(
+    summary_stats = df_combined.groupby(['Decay_Rate', 'Group'], observed=True)['final_price'].agg(
         Mean=('mean'),
         Median=('median'),
         STDEV=('std')
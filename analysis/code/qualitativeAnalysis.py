@@ -2,13 +2,21 @@ import json
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-from openai import OpenAI
 from dotenv import load_dotenv
 import time
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "code"))
+from llm_cache import cached_client
+from llm_ledger import call_ledger, ledger_client
+from llm_limits import limited_client, openai_client
+from llm_retry import retry_client
+from call_context import calling
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv('API_KEY'), base_url="https://api.siliconflow.cn/")
+ledger = call_ledger()
+client = retry_client(ledger_client(cached_client(limited_client(openai_client()), bypass_stochastic=False), ledger)) #temperature 0.1, but a rerun should reuse the coding already paid for
 
 CONSTRUCTS = {
     'Mutual Knowledge': [
@@ -134,16 +142,17 @@ def detect_constructs(negotiation_text):
     max_retries = 3
     for attempt in range(max_retries):
         try:
-            response = client.chat.completions.create(
-                model="Qwen/Qwen3-30B-A3B-Instruct-2507",
-                messages=[
-                    {"role": "system", "content": "You are an expert in behavioral economics and negotiation analysis."},
-                    {"role": "user", "content": prompt}
-                ],
-                stream=False,
-                temperature=0.1,
-                max_tokens=1500
-            )
+            with calling(site="detect_constructs", attempt=attempt):
+                response = client.chat.completions.create(
+                    model="Qwen/Qwen3-30B-A3B-Instruct-2507",
+                    messages=[
+                        {"role": "system", "content": "You are an expert in behavioral economics and negotiation analysis."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    stream=False,
+                    temperature=0.1,
+                    max_tokens=1500
+                )
             response_text = response.choices[0].message.content
             print(response_text)
             import re
@@ -201,8 +210,9 @@ def analyze_negotiations(negotiations, csv_file="data/construct_frequency.csv"):
         df_result = pd.DataFrame([result])
         df_result.to_csv(csv_file, mode='a', header=not file_exists, index=False)
         file_exists = True  # After first write, header is written
-        
-        time.sleep(0.5)
+
+    ledger.save("data/construct_ledger.parquet")
+    print(ledger.report().to_string())
 
 def create_cooccurrence_matrix(results):
     cooccurrence_matrix = pd.DataFrame(0, index=CONSTRUCTS, columns=CONSTRUCTS)
@@ -3,6 +3,11 @@ import statsmodels.api as sm
 from statsmodels.formula.api import ols
 import matplotlib.pyplot as plt
 import seaborn as sns
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "code"))
+from results_store import results_store, RECORDED
 
 
 decay_rates = {
@@ -12,38 +17,16 @@ decay_rates = {
 }
 
 groups = [1, 2]
-data_dir = "data/simulationState/" 
-all_data = []
-
-for decay_multiplier, decay_label in decay_rates.items():
-    decay_int = int(decay_multiplier * 100) 
-    
-    for group_id in groups:
-        file_name = f"{data_dir}{decay_int}simSTOCKgrp{group_id}.csv"
-        
-        try:
-            df = pd.read_csv(file_name)
-            if not df.empty:
-                df.rename(columns={'decayed stock': 'decayed_stock'}, inplace=True) 
+df_combined = results_store().load("STOCK", decay=list(decay_rates), group=groups, run=RECORDED)
 
-                df.loc[:, 'Group'] = str(group_id)
-                df.loc[:, 'Decay_Rate'] = decay_label
-                all_data.append(df)
-                print(f"Loaded: {file_name}")
-        except FileNotFoundError:
-            print(f"File not found: {file_name}. Skipping.")
-        except KeyError:
-            print(f"Error: 'decayed_stock' column not found in {file_name}. Check data.")
-            continue
-
-if not all_data:
+if df_combined.empty:
     print("\nError: No sensitivity analysis files were successfully loaded.")
 else:
-    df_combined = pd.concat(all_data, ignore_index=True)
-
-    df_combined['Group'] = df_combined['Group'].astype('category')
+    df_combined.rename(columns={'decayed stock': 'decayed_stock'}, inplace=True)
+    df_combined['Group'] = df_combined['group'].astype(str).astype('category')
     ordered_categories = [ "High Urgency (10% Decay)",  "Base (5% Decay)", "Low Urgency (1% Decay)"]
-    df_combined['Decay_Rate'] = pd.Categorical(df_combined['Decay_Rate'], categories=ordered_categories, ordered=True)
+    df_combined['Decay_Rate'] = pd.Categorical(df_combined['decay'].map(decay_rates), categories=ordered_categories, ordered=True)
+    print(df_combined.groupby(['Decay_Rate', 'Group'], observed=True).size())
 
     formula = 'decayed_stock ~ C(Group) * C(Decay_Rate)'
     lm = ols(formula, data=df_combined).fit()
@@ -0,0 +1,133 @@
+import asyncio
+from simulation_core import *
+from call_context import calling
+from tracing import trace, pair
+from topology import active_pairs
+
+"""
+_________________________________________________________________________________________
+concurrent engine
+
+same rounds as run_negotiations (decay every 2 rounds, rolling summaries), but all
+retailer x supplier pairs of a round run at once on aclient, so a round takes about
+as long as its slowest pair. rounds are still a barrier: decay happens between them.
+pairs of two rule-based agents make no calls, so they run inline before the others
+start rather than as one task each.
+
+"""
+
+MAX_CONCURRENCY = 10 #pairs in flight at once, each pair has at most one request open
+
+
+async def pair_turn(round_num, retailer_idx, supplier_idx, retailers, suppliers, offerLog, negotiation_raw, limit, pending):
+    async with limit:
+        with calling(group=suppliers[supplier_idx].grp, supplier=suppliers[supplier_idx].name, retailer=retailers[retailer_idx].name, round=round_num):
+            await pair_round(round_num, retailer_idx, supplier_idx, retailers, suppliers, offerLog, negotiation_raw, pending)
+
+
+async def pair_round(round_num, retailer_idx, supplier_idx, retailers, suppliers, offerLog, negotiation_raw, pending):
+    retailer = retailers[retailer_idx]
+    supplier = suppliers[supplier_idx]
+    market = supplier.market
+
+    if round_num == 0:
+        await retailer.aintroduce(supplier_idx, negotiation_raw, suppliers)
+
+    if supplier.stock<=10:
+        trace.debug("STOCKOUT %s", supplier.name, extra=pair(supplier.name, retailer.name))
+        market.stop(supplier_idx, retailer_idx)
+        return
+
+    if round_num>0:
+        if not market.is_live(supplier_idx, retailer_idx):
+            trace.debug("Negotiation has ended: %s continues %s, %s continues %s, deal %s", supplier.name, market.supplier_continues[supplier_idx, retailer_idx], retailer.name, market.retailer_continues[supplier_idx, retailer_idx], market.deal[supplier_idx, retailer_idx], extra=pair(supplier.name, retailer.name))
+            return
+    trace.debug("Negotiation: %s & %s", retailer.name, supplier.name, extra=pair(supplier.name, retailer.name))
+
+    # messages go through the pair's shared transcript, not agent.history, which other pairs overwrite concurrently
+    if await supplier.anegotiate(retailer_idx, round_num, negotiation_raw, retailers) is None: #if fails the regenration in accordance to hard constraint, terminates that specific negotiation
+        log(supplier.name, retailer.name, round_num, None, None, offerLog, "no_offer", "no volume in any regenerated offer")
+        market.deal[supplier_idx, retailer_idx] = True
+        return
+    await retailer.anegotiate(supplier_idx, round_num, negotiation_raw, suppliers)
+
+    if end(retailer.chat(supplier_idx)):
+        # no await inside settle, so the stock check and the deduction cannot interleave with another pair of this supplier
+        settle(supplier, retailer, retailer_idx, supplier_idx, round_num, offerLog)
+        return
+
+    if supplier.llm or retailer.llm: #rule-based pairs need no summary
+        await aroll(supplier, retailer, retailer_idx, supplier_idx, round_num)
+
+    if round_num >= 1 and pending is not None: #batched: decided together once the round's pairs are done
+        pending.append((retailer_idx, supplier_idx))
+    elif round_num >= 1:
+        if await supplier.adecide(retailer_idx) == False or await retailer.adecide(supplier_idx, round_num) == False:
+            market.stop(supplier_idx, retailer_idx)
+
+
+async def adecide_batched(pending, round_num, retailers, suppliers, limit): #decide_batched with the supplier calls, then the retailer calls, in parallel
+    verdicts = {pair: True for pair in pending}
+
+    async def ask(agent, fields, *args):
+        async with limit:
+            with calling(round=round_num, **fields):
+                return await agent.adecide_batch(*args)
+
+    supplier_oths = by_agent(pending, 1)
+    answers = await asyncio.gather(*[ask(suppliers[s], dict(group=suppliers[s].grp, supplier=suppliers[s].name), oths) for s, oths in supplier_oths])
+    for (s, _), answer in zip(supplier_oths, answers):
+        for r, verdict in answer.items():
+            verdicts[(r, s)] = verdict
+
+    retailer_oths = by_agent(pending, 0, verdicts)
+    answers = await asyncio.gather(*[ask(retailers[r], dict(group=retailers[r].group, retailer=retailers[r].name), oths, round_num) for r, oths in retailer_oths])
+    for (r, _), answer in zip(retailer_oths, answers):
+        for s, verdict in answer.items():
+            verdicts[(r, s)] = verdict
+
+    apply_verdicts(verdicts, retailers, suppliers)
+
+
+async def run_negotiations_async(time_limit, offerLog, negotiation_raw, stock, purchasing, retailers, suppliers, max_concurrency=MAX_CONCURRENCY, batch_decisions=False, checkpoint=None, trajectory=None, topology=None):
+    limit = asyncio.Semaphore(max_concurrency)
+    with journaling(checkpoint):
+        start = checkpoint.resume(offerLog, negotiation_raw, retailers, suppliers, trajectory) if checkpoint else 0
+        market = init_negotiations(retailers, suppliers, topology) if start == 0 else suppliers[0].market
+        active = active_pairs(market)
+
+        for round_num in range(start, time_limit):
+            trace.info("--- Round %d ---", round_num + 1)
+
+            if market.stocked_out():
+                trace.info("All suppliers stockout. Ending simulation early.")
+                break
+
+            if round_num % 2 == 0 and round_num > 0:
+                market.decay()
+            if trajectory:
+                trajectory.opening(round_num, market)
+
+            pending = [] if batch_decisions else None
+            pairs = active.pairs()
+            for retailer_idx, supplier_idx in pairs: #rule-only pairs never wait on a call, so they run inline, in mesh order, instead of as tasks
+                if not (retailers[retailer_idx].llm or suppliers[supplier_idx].llm):
+                    await pair_turn(round_num, retailer_idx, supplier_idx, retailers, suppliers, offerLog, negotiation_raw, limit, pending)
+            await asyncio.gather(*[
+                pair_turn(round_num, retailer_idx, supplier_idx, retailers, suppliers, offerLog, negotiation_raw, limit, pending)
+                for retailer_idx, supplier_idx in pairs if retailers[retailer_idx].llm or suppliers[supplier_idx].llm
+            ])
+            if pending:
+                await adecide_batched(pending, round_num, retailers, suppliers, limit)
+            active.prune()
+
+            if trajectory:
+                trajectory.record(round_num, market)
+            if checkpoint:
+                checkpoint.save(round_num + 1, retailers, suppliers, offerLog, negotiation_raw, trajectory)
+
+    record_state(stock, purchasing, market)
+
+
+def run_negotiations_concurrent(time_limit, offerLog, negotiation_raw, stock, purchasing, retailers, suppliers, max_concurrency=MAX_CONCURRENCY, batch_decisions=False, checkpoint=None, trajectory=None, topology=None):
+    asyncio.run(run_negotiations_async(time_limit, offerLog, negotiation_raw, stock, purchasing, retailers, suppliers, max_concurrency, batch_decisions, checkpoint, trajectory, topology))
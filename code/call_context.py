@@ -0,0 +1,28 @@
+import contextvars
+from contextlib import contextmanager
+
+"""
+_________________________________________________________________________________________
+call context
+
+tags every llm request with where it came from. the engines set the pair fields
+(group, supplier, retailer, round) and the agent methods add site and attempt, so
+client wrappers can see them without any change to the create() signature.
+contextvars follow asyncio tasks, so concurrent pairs keep their own tags.
+
+"""
+
+call_context = contextvars.ContextVar("call_context", default={})
+
+
+@contextmanager
+def calling(**fields):
+    token = call_context.set({**call_context.get(), **fields})
+    try:
+        yield
+    finally:
+        call_context.reset(token)
+
+
+def current():
+    return call_context.get()
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+import pickle
+import shutil
+import threading
+import zlib
+from collections import defaultdict, deque
+from types import SimpleNamespace
+from openai.types.chat import ChatCompletion
+from call_context import current
+from llm_cache import is_async
+from event_log import snapshot, restore
+from tracing import trace
+
+"""
+_________________________________________________________________________________________
+checkpoints
+
+a checkpoint directory holds
+- state.pkl.z: every agent and the market_state they share (stock, spoilt, totals,
+  prices, continue/deal flags, the pair transcripts, rule-agent tactic state) plus the offer and negotiation logs (or, for
+  streamed event_logs, how far they got), as a zlib-compressed pickle, rewritten
+  after each completed round
+- calls.jsonl: every llm reply since that snapshot, appended as it arrives
+
+a run given the same directory restarts from the snapshot and answers the calls of
+the interrupted round from the journal, matched on call site, pair, round and
+attempt, so pairs (or parts of a pair) that already finished cost no new llm calls.
+only the calls that never came back are made again.
+
+"""
+
+KEY_FIELDS = ["site", "group", "supplier", "retailer", "round", "attempt", "parties"]
+
+
+class call_journal:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.replies = defaultdict(deque) #call key -> replies recorded before the restart, in order
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError: #last line cut off by the crash
+                        break
+                    self.replies[entry["key"]].append(entry["response"])
+        self.file = open(path, "a")
+        self.replayed = 0
+
+    def key(self):
+        ctx = current()
+        return json.dumps([ctx.get(field) for field in KEY_FIELDS])
+
+    def take(self, key): #a recorded reply for this call, None once the journal has none left
+        with self.lock:
+            if self.replies[key]:
+                self.replayed += 1
+                return ChatCompletion.model_validate_json(self.replies[key].popleft())
+        return None
+
+    def add(self, key, response):
+        with self.lock:
+            self.file.write(json.dumps({"key": key, "response": response.model_dump_json()}) + "\n")
+            self.file.flush()
+
+    def reset(self): #a new snapshot covers everything recorded so far
+        with self.lock:
+            self.file.close()
+            self.replies.clear()
+            self.file = open(self.path, "w")
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class journal_client: #drop-in for client/aclient, outermost while a checkpointed run is in progress
+    def __init__(self, inner, journal):
+        self.inner = inner
+        self.journal = journal
+        self.is_async = is_async(inner)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.acreate if self.is_async else self.create))
+
+    def create(self, **kwargs):
+        key = self.journal.key()
+        response = self.journal.take(key)
+        if response is None:
+            response = self.inner.chat.completions.create(**kwargs)
+            self.journal.add(key, response)
+        return response
+
+    async def acreate(self, **kwargs):
+        key = self.journal.key()
+        response = self.journal.take(key)
+        if response is None:
+            response = await self.inner.chat.completions.create(**kwargs)
+            self.journal.add(key, response)
+        else:
+            await asyncio.sleep(0) #yield like a real call, so the other pairs keep their turn order
+        return response
+
+
+class checkpoint:
+    def __init__(self, directory):
+        self.directory = directory
+        self.state_path = f"{directory}/state.pkl.z"
+        self.journal = None
+
+    def open(self): #start (or pick up) the call journal
+        os.makedirs(self.directory, exist_ok=True)
+        self.journal = call_journal(f"{self.directory}/calls.jsonl")
+        return self.journal
+
+    def wrap(self, client):
+        return journal_client(client, self.journal)
+
+    def store(self, state):
+        os.makedirs(self.directory, exist_ok=True)
+        blob = zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), 6)
+        with open(self.state_path + ".tmp", "wb") as f:
+            f.write(blob)
+        os.replace(self.state_path + ".tmp", self.state_path) #a snapshot only exists once it is complete
+
+    def load(self): #the last snapshot, None if there is none
+        if not os.path.exists(self.state_path):
+            return None
+        with open(self.state_path, "rb") as f:
+            return pickle.loads(zlib.decompress(f.read()))
+
+    def save(self, next_round, retailers, suppliers, offerLog, negotiation_raw, trajectory=None):
+        state = {"next_round": next_round, "retailers": retailers, "suppliers": suppliers, "offerLog": snapshot(offerLog), "negotiation_raw": snapshot(negotiation_raw)}
+        if trajectory is not None:
+            state["trajectory"] = trajectory.snapshot()
+        self.store(state)
+        self.journal.reset() #journal keys carry the round, so a crash between these two lines replays nothing stale
+
+    def resume(self, offerLog, negotiation_raw, retailers, suppliers, trajectory=None): #restore the snapshot into the caller's lists, returns the round to start from
+        state = self.load()
+        if state is None:
+            return 0
+        retailers[:] = state["retailers"]
+        suppliers[:] = state["suppliers"]
+        restore(offerLog, state["offerLog"])
+        restore(negotiation_raw, state["negotiation_raw"])
+        if trajectory is not None and "trajectory" in state:
+            trajectory.restore(state["trajectory"])
+        trace.info("Resuming from round %d, %d llm replies on record", state["next_round"] + 1, sum(len(q) for q in self.journal.replies.values()))
+        return state["next_round"]
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+    def clear(self): #the run finished and its results are written
+        self.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,141 @@
+import os
+import queue
+import shutil
+import threading
+from collections import namedtuple
+import pyarrow.parquet as pq
+from results_store import to_table, TABLES, COMPRESSION
+
+"""
+_________________________________________________________________________________________
+streaming event logs
+
+event_log stands in for the offerLog / negotiation_raw / stock / purchasing lists:
+the engines only ever append to them. records are buffered in batches of `batch`;
+a full batch goes to a writer thread, which writes it as a parquet file to a spool
+directory next to the replicate's partition. at most `queued` batches wait for the
+writer (append blocks beyond that), so memory stays at a few batches however many
+rounds and agents a run has. close() copies the spooled batches, one at a time, into
+the partition file as row groups and lists it in the results store's manifest.
+
+checkpoints keep a log_mark (batches on disk plus the unflushed records) instead of
+the records, and restore() rewinds a log to it after a crash. plain lists still
+work everywhere, e.g. for forks.
+
+"""
+
+BATCH = 256 #records per batch / row group
+QUEUED = 2 #batches waiting for the writer before append blocks
+
+log_mark = namedtuple("log_mark", ["spool", "batches", "buffer", "count"])
+
+
+class event_log:
+    def __init__(self, store, kind, run, decay, group, replicate, batch=BATCH, queued=QUEUED):
+        self.store = store
+        self.kind = kind
+        self.partition = (run, decay, group, replicate)
+        self.path = store.path(kind, *self.partition)
+        self.spool = self.path + ".spool"
+        self.batch = batch
+        self.buffer = []
+        self.batches = 0 #batches handed to the writer so far
+        self.count = 0
+        self.queue = queue.Queue(maxsize=queued)
+        self.writer = None
+        self.error = None
+
+    def __len__(self):
+        return self.count
+
+    def append(self, record):
+        self.buffer.append(record)
+        self.count += 1
+        if len(self.buffer) >= self.batch:
+            self.flush()
+
+    def batch_path(self, n):
+        return f"{self.spool}/{n}.parquet"
+
+    def write_batches(self): #writer thread
+        while True:
+            n, records = self.queue.get()
+            try:
+                if n is None:
+                    return
+                os.makedirs(self.spool, exist_ok=True)
+                pq.write_table(to_table(self.kind, records), self.batch_path(n) + ".tmp", compression=COMPRESSION)
+                os.replace(self.batch_path(n) + ".tmp", self.batch_path(n))
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def check(self):
+        if self.error is not None:
+            raise self.error
+
+    def flush(self): #hand the buffered records to the writer thread
+        self.check()
+        if not self.buffer:
+            return
+        if self.writer is None:
+            self.writer = threading.Thread(target=self.write_batches, daemon=True)
+            self.writer.start()
+        self.queue.put((self.batches, self.buffer))
+        self.batches += 1
+        self.buffer = []
+
+    def drain(self): #wait until every batch handed over is on disk
+        self.queue.join()
+        self.check()
+
+    def mark(self):
+        self.drain()
+        return log_mark(self.spool, self.batches, list(self.buffer), self.count)
+
+    def rewind(self, mark): #back to a mark, e.g. from a checkpoint written before a crash
+        self.drain()
+        self.batches = mark.batches
+        self.buffer = list(mark.buffer)
+        self.count = mark.count
+
+    def close(self): #write the partition and list it in the manifest, returns the manifest entry
+        self.flush()
+        if self.writer is not None:
+            self.queue.put((None, None))
+            self.writer.join()
+            self.writer = None
+        self.check()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with pq.ParquetWriter(self.path + ".tmp", TABLES[self.kind], compression=COMPRESSION) as writer:
+            for n in range(self.batches):
+                writer.write_table(pq.ParquetFile(self.batch_path(n)).read())
+            if not self.batches:
+                writer.write_table(to_table(self.kind, []))
+        return self.store.commit(self.kind, *self.partition, self.path + ".tmp")
+
+    def clear(self): #the partition is committed and no checkpoint refers to the spool any more
+        shutil.rmtree(self.spool, ignore_errors=True)
+
+
+def mark_records(mark): #a log_mark's records as a list, for a plain list taking over from a streamed log
+    records = []
+    for n in range(mark.batches):
+        records += pq.ParquetFile(f"{mark.spool}/{n}.parquet").read().to_pylist()
+    return records + list(mark.buffer)
+
+
+def snapshot(log): #what a checkpoint keeps of a log
+    return log.mark() if isinstance(log, event_log) else log
+
+
+def restore(log, saved): #put a snapshot back into a log or a plain list
+    if isinstance(log, event_log) and isinstance(saved, log_mark):
+        log.rewind(saved)
+    elif isinstance(log, event_log): #a checkpoint taken with plain lists
+        log.rewind(log_mark(log.spool, 0, [], 0))
+        for record in saved:
+            log.append(record)
+    else:
+        log[:] = mark_records(saved) if isinstance(saved, log_mark) else saved
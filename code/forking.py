@@ -0,0 +1,126 @@
+import copy
+from simulation_core import run_negotiations
+from async_engine import run_negotiations_concurrent, MAX_CONCURRENCY
+from checkpoint import checkpoint
+from event_log import restore
+
+"""
+_________________________________________________________________________________________
+forked continuations
+
+run the first k rounds once, then continue the same market several times with
+different parameters, e.g. another decay rate or group strategy from round k on:
+
+    point = branch_point.run(4, retailers, suppliers)
+    outcomes = point.forks([{"decay_rate": 0.9}, {"decay_rate": 0.8}])
+
+each continuation starts from a deep copy of the round-k state, but the transcripts'
+turns (all the prefix text) are shared rather than copied, and each fork only appends
+its own. overrides are sim_config fields: the fork's agents get a config with those
+replaced and rebuild their info and prompts from it; change(retailers, suppliers)
+can edit agents directly (strategy text, tactics) after that.
+a branch_point can also be stored and loaded as a checkpoint directory, so a
+prefix is paid for once across processes and sessions.
+
+"""
+
+
+def refresh(agent, overrides): #a config with overrides replaced, and everything the agent derived from its config when it was created
+    agent.config = agent.config._replace(**overrides)
+    agent.info = agent.describe()
+    agent.prompts = agent.build_prompts()
+
+
+class continuation: #checkpoint stand-in: starts a run from a branch point, saves nothing
+    def __init__(self, state, overrides=None, change=None):
+        self.state = state
+        self.overrides = overrides
+        self.change = change
+
+    def open(self):
+        return None
+
+    def wrap(self, client):
+        return client
+
+    def save(self, *args):
+        pass
+
+    def close(self):
+        pass
+
+    def resume(self, offerLog, negotiation_raw, retailers, suppliers, trajectory=None):
+        state = copy.deepcopy(self.state) #lists and agents are copied, turn text is shared
+        retailers[:] = state["retailers"]
+        suppliers[:] = state["suppliers"]
+        restore(offerLog, state["offerLog"]) #a branch point loaded from a streamed run's checkpoint holds log marks
+        restore(negotiation_raw, state["negotiation_raw"])
+        if trajectory is not None and "trajectory" in state:
+            trajectory.restore(state["trajectory"])
+        if self.overrides:
+            for agent in retailers + suppliers:
+                refresh(agent, self.overrides)
+        if self.change is not None:
+            self.change(retailers, suppliers)
+        return state["next_round"]
+
+
+class prefix_capture(continuation): #checkpoint stand-in for the shared prefix run, keeps the last round's state in memory
+    def __init__(self):
+        super().__init__(None)
+
+    def save(self, next_round, retailers, suppliers, offerLog, negotiation_raw, trajectory=None):
+        self.state = {"next_round": next_round, "retailers": retailers, "suppliers": suppliers, "offerLog": offerLog, "negotiation_raw": negotiation_raw}
+
+    def resume(self, *args):
+        return 0
+
+
+def run(time_limit, offerLog, negotiation_raw, stock, purchasing, retailers, suppliers, batch_decisions, concurrent, saved, topology=None):
+    if concurrent:
+        run_negotiations_concurrent(time_limit, offerLog, negotiation_raw, stock, purchasing, retailers, suppliers, MAX_CONCURRENCY, batch_decisions, saved, topology=topology)
+    else:
+        run_negotiations(time_limit, offerLog, negotiation_raw, stock, purchasing, retailers, suppliers, batch_decisions, saved, topology=topology)
+
+
+class branch_point:
+    def __init__(self, state):
+        self.state = state
+
+    @classmethod
+    def run(cls, k, retailers, suppliers, batch_decisions=False, concurrent=False, topology=None): #play rounds 0..k-1 once, forks keep the prefix's topology
+        capture = prefix_capture()
+        run(k, [], [], [], [], retailers, suppliers, batch_decisions, concurrent, capture, topology)
+        return cls(capture.state)
+
+    @classmethod
+    def load(cls, directory): #from a stored branch point or any run's checkpoint
+        state = checkpoint(directory).load()
+        if state is None:
+            raise FileNotFoundError(f"no snapshot in {directory}")
+        return cls(state)
+
+    def save(self, directory):
+        checkpoint(directory).store(self.state)
+
+    @property
+    def round(self):
+        return self.state["next_round"]
+
+    @property
+    def config(self):
+        return self.state["suppliers"][0].config
+
+    def fork(self, overrides=None, change=None, time_limit=None, batch_decisions=False, concurrent=False):
+        #one continuation to time_limit (default: the fork's rounds), returns (offerLog, negotiation_raw, stock, purchasing) for the whole run, prefix included
+        offerLog, negotiation_raw, stock, purchasing = [], [], [], []
+        time_limit = time_limit or self.config._replace(**(overrides or {})).rounds
+        run(time_limit, offerLog, negotiation_raw, stock, purchasing, [], [], batch_decisions, concurrent, continuation(self.state, overrides, change))
+        return offerLog, negotiation_raw, stock, purchasing
+
+    def forks(self, variants, **kwargs): #variants: overrides dicts, or (overrides, change) pairs
+        outcomes = []
+        for variant in variants:
+            overrides, change = variant if isinstance(variant, tuple) else (variant, None)
+            outcomes.append(self.fork(overrides, change, **kwargs))
+        return outcomes
@@ -0,0 +1,153 @@
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion
+from dotenv import load_dotenv
+
+load_dotenv()
+
+"""
+_________________________________________________________________________________________
+disk cache for chat completions
+
+entries are keyed on a hash of everything that decides the output (model, messages,
+temperature, top_p, seed and the other sampling kwargs) and stored in sqlite, so
+the worker processes of main_runner can share one file. least recently used
+entries are evicted once the file passes max_bytes.
+
+modes: "readwrite" (default), "readonly" (exact replay: never writes, a miss raises
+cache_miss instead of calling the api), "off".
+stochastic calls (temperature > 0 without a seed) bypass the cache unless
+bypass_stochastic is False, e.g. to replay a whole debugging session.
+
+"""
+
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite")
+CACHE_MODE = os.getenv("LLM_CACHE_MODE", "readwrite")
+CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 2 * 1024**3))
+
+UNKEYED = ("stream", "timeout", "extra_headers") #kwargs that do not change the completion
+
+cache_status = contextvars.ContextVar("cache_status", default=None) #"hit", "miss" or "bypass" for the last call in this context
+
+
+class cache_miss(LookupError):
+    pass
+
+
+def is_async(client): #async clients (and wrappers around them) return awaitables from create
+    return isinstance(client, AsyncOpenAI) or getattr(client, "is_async", False)
+
+
+def request_key(kwargs):
+    keyed = {k: v for k, v in kwargs.items() if k not in UNKEYED}
+    blob = json.dumps(keyed, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def stochastic(kwargs):
+    return kwargs.get("temperature", 1.0) > 0 and kwargs.get("seed") is None
+
+
+class completion_cache:
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = None
+        self.pid = None
+        self.size = 0
+
+    def connect(self): #one connection per process, sqlite handles must not cross a fork
+        if self.conn is None or self.pid != os.getpid():
+            self.conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, value TEXT, size INTEGER, accessed REAL)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed)")
+            self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+            self.pid = os.getpid()
+        return self.conn
+
+    def get(self, key):
+        with self.lock:
+            conn = self.connect()
+            row = conn.execute("SELECT value FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE completions SET accessed = ? WHERE key = ?", (time.time(), key))
+        return ChatCompletion.model_validate_json(row[0])
+
+    def put(self, key, response):
+        value = response.model_dump_json()
+        with self.lock:
+            conn = self.connect()
+            conn.execute("INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?)", (key, value, len(value), time.time()))
+            self.size += len(value)
+            if self.size > self.max_bytes:
+                self.evict(conn)
+
+    def evict(self, conn): #drop least recently used entries down to 90% of max_bytes
+        self.size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0] #other processes write too
+        excess = self.size - int(self.max_bytes * 0.9)
+        if excess <= 0:
+            return
+        freed = 0
+        stale = []
+        for key, size in conn.execute("SELECT key, size FROM completions ORDER BY accessed"):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM completions WHERE key = ?", stale)
+        self.size -= freed
+
+
+class cached_client: #drop-in for client/aclient: cached_client(OpenAI(...)).chat.completions.create(**kwargs)
+    def __init__(self, inner, cache=None, mode=CACHE_MODE, bypass_stochastic=True):
+        self.inner = inner
+        self.cache = cache if cache is not None else completion_cache()
+        self.mode = mode
+        self.bypass_stochastic = bypass_stochastic
+        self.is_async = is_async(inner)
+        self.hits = 0
+        self.misses = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.acreate if self.is_async else self.create))
+
+    def lookup(self, kwargs): #returns (key, cached response); key is None when the cache is skipped
+        if self.mode == "off" or (self.bypass_stochastic and stochastic(kwargs)):
+            cache_status.set("bypass")
+            return None, None
+        key = request_key(kwargs)
+        hit = self.cache.get(key)
+        if hit is not None:
+            self.hits += 1
+            cache_status.set("hit")
+            return key, hit
+        if self.mode == "readonly":
+            raise cache_miss(f"no cached completion for request {key[:12]} (readonly cache)")
+        self.misses += 1
+        cache_status.set("miss")
+        return key, None
+
+    def store(self, key, response):
+        if key is not None and self.mode == "readwrite":
+            self.cache.put(key, response)
+        return response
+
+    def create(self, **kwargs):
+        key, hit = self.lookup(kwargs)
+        if hit is not None:
+            return hit
+        return self.store(key, self.inner.chat.completions.create(**kwargs))
+
+    async def acreate(self, **kwargs):
+        key, hit = self.lookup(kwargs)
+        if hit is not None:
+            return hit
+        return self.store(key, await self.inner.chat.completions.create(**kwargs))
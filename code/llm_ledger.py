@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from types import SimpleNamespace
+import pandas as pd
+from call_context import current
+from llm_cache import cache_status, is_async
+from prompts import prompt_size
+
+"""
+_________________________________________________________________________________________
+call ledger
+
+one record per chat.completions.create: call site, group, pair, round, attempt (the
+supplier's volume-regeneration loop), retry (retry_client resending after a transient
+error, every try is its own record), latency, prompt/completion tokens and whether
+the cache answered, plus the prompt's length and how much of it is the agent's static
+system prompt (a prefix the provider can cache). ledger_client wraps the outermost
+client, so cache hits are timed too. a decision the agents' rules settle without a call
+gets a record too, with cache "rule" and no latency or tokens, so report() can give the
+pre-filter's hit rate next to the calls. save() writes parquet with dictionary-encoded
+text columns, report() summarises a run per call site.
+
+"""
+
+FIELDS = ["site", "group", "supplier", "retailer", "round", "attempt", "retry"]
+
+
+class call_ledger:
+    def __init__(self):
+        self.records = []
+        self.lock = threading.Lock()
+
+    def add(self, record):
+        with self.lock:
+            self.records.append(record)
+
+    def clear(self):
+        with self.lock:
+            self.records = []
+
+    def rule(self): #a decision settled by rule instead of a call, at the current call site
+        ctx = current()
+        self.add([time.time(), *[ctx.get(field) for field in FIELDS], 0.0, None, None, "rule", None, None, None])
+
+    def frame(self):
+        with self.lock:
+            df = pd.DataFrame(self.records, columns=["finished"] + FIELDS + ["latency", "prompt_tokens", "completion_tokens", "cache", "error", "prompt_chars", "prefix_chars"])
+        for column in ["site", "supplier", "retailer", "cache", "error"]:
+            df[column] = df[column].astype("category")
+        for column in ["group", "round", "attempt", "retry", "prompt_tokens", "completion_tokens", "prompt_chars", "prefix_chars"]:
+            df[column] = df[column].astype("Int32")
+        df["latency"] = df["latency"].astype("float32")
+        return df
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.frame().to_parquet(path, index=False, compression="zstd")
+
+    def report(self):
+        return summarise_ledger(self.frame())
+
+
+def summarise_ledger(df): #per call site: calls, latency percentiles, tokens, cache hit rate, static prompt share, decisions settled by rule
+    ruled = df[df["cache"] == "rule"].groupby("site", observed=True).size()
+    df = df[df["cache"] != "rule"]
+    by_site = df.groupby("site", observed=True)
+    report = pd.DataFrame({
+        "calls": by_site.size(),
+        "errors": by_site["error"].count(),
+        "latency_total": by_site["latency"].sum(),
+        "latency_p50": by_site["latency"].median(),
+        "latency_p95": by_site["latency"].quantile(0.95),
+        "prompt_tokens": by_site["prompt_tokens"].sum(),
+        "completion_tokens": by_site["completion_tokens"].sum(),
+        "cache_hit_rate": by_site["cache"].apply(lambda c: (c == "hit").mean()),
+        "retries": by_site["attempt"].apply(lambda a: (a.fillna(0) > 0).sum()),
+        "resent": by_site["retry"].apply(lambda a: (a.fillna(0) > 0).sum()),
+        "prompt_chars": by_site["prompt_chars"].sum(),
+        "prefix_chars": by_site["prefix_chars"].sum(),
+        "ruled": ruled,
+    }) #a site whose decisions were all settled by rule has no calls
+    report[["calls", "errors", "ruled"]] = report[["calls", "errors", "ruled"]].fillna(0)
+    report.loc["total"] = report.sum(numeric_only=True)
+    report.loc["total", ["latency_p50", "latency_p95"]] = [df["latency"].median(), df["latency"].quantile(0.95)]
+    report.loc["total", "cache_hit_rate"] = (df["cache"] == "hit").mean() if len(df) else 0.0
+    report["prefix_share"] = (report["prefix_chars"] / report["prompt_chars"]).where(report["prompt_chars"] > 0) #chars, not tokens, but close enough to compare sites
+    report["rule_rate"] = (report["ruled"] / (report["ruled"] + report["calls"])).where(report["ruled"] > 0, 0.0) #share of the site's decisions the pre-filter settled
+    decide = report.index.str.contains("decide")
+    report.loc["total", "rule_rate"] = ruled.sum() / (ruled.sum() + report.loc[decide, "calls"].sum()) if ruled.sum() else 0.0 #over the decide sites only
+    return report
+
+
+class ledger_client: #drop-in for client/aclient, records every call to a call_ledger
+    def __init__(self, inner, ledger):
+        self.inner = inner
+        self.ledger = ledger
+        self.is_async = is_async(inner)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.acreate if self.is_async else self.create))
+
+    def record(self, start, kwargs, response, error):
+        ctx = current()
+        usage = getattr(response, "usage", None)
+        chars = sum(len(m.get("content") or "") for m in kwargs.get("messages", []))
+        prefix = prompt_size.get() #set by prompt_template.messages while the kwargs were built, kept for retries of the same call
+        if prefix is not None and prefix[1] != chars: #left over from another prompt
+            prefix = None
+        self.ledger.add([
+            time.time(), *[ctx.get(field) for field in FIELDS],
+            time.perf_counter() - start,
+            getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None),
+            cache_status.get(), None if error is None else type(error).__name__,
+            chars, None if prefix is None else prefix[0],
+        ])
+
+    def create(self, **kwargs):
+        cache_status.set(None)
+        start = time.perf_counter()
+        try:
+            response = self.inner.chat.completions.create(**kwargs)
+        except Exception as e:
+            self.record(start, kwargs, None, e)
+            raise
+        self.record(start, kwargs, response, None)
+        return response
+
+    async def acreate(self, **kwargs):
+        cache_status.set(None)
+        start = time.perf_counter()
+        try:
+            response = await self.inner.chat.completions.create(**kwargs)
+        except Exception as e:
+            self.record(start, kwargs, None, e)
+            raise
+        self.record(start, kwargs, response, None)
+        return response
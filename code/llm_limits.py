@@ -0,0 +1,213 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+import httpx
+from openai import OpenAI, AsyncOpenAI, RateLimitError
+from dotenv import load_dotenv
+from llm_cache import is_async
+
+load_dotenv()
+
+"""
+_________________________________________________________________________________________
+shared client layer: pooled connections, quota and adaptive concurrency
+
+openai_client()/async_openai_client() build the provider client on one pooled
+keep-alive http connection set, with the sdk's own retries off (retry_client in
+llm_retry does them, so every try passes the limiter and is recorded).
+limited_client wraps it (under the cache, so hits are free) and, before each request:
+- takes one request and the estimated tokens from a pair of token buckets (requests
+  and tokens per minute) kept in a small sqlite file, so every thread, asyncio task
+  and main_runner worker draws on the same quota. the bucket is corrected with the
+  real usage afterwards, and a 429 empties it so all processes back off together.
+- waits for a slot in an aimd window: +1/limit per call that comes back in time,
+  halved (at most once per slow_after seconds) on a 429 or a call slower than
+  slow_after. the window is per process.
+
+limits are set a little under the provider quota (HEADROOM), from the environment:
+LLM_RPM, LLM_TPM, LLM_MAX_CONNECTIONS, LLM_LIMIT_PATH.
+
+"""
+
+BASE_URL = "https://api.siliconflow.cn/"
+LIMIT_RPM = int(os.getenv("LLM_RPM", 1000))
+LIMIT_TPM = int(os.getenv("LLM_TPM", 50000))
+HEADROOM = 0.9 #fraction of the quota actually used
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 64))
+LIMIT_PATH = os.getenv("LLM_LIMIT_PATH", ".llm_limits.sqlite")
+COMPLETION_ESTIMATE = 512 #tokens reserved for a reply when the request sets no max_tokens
+
+
+def pool():
+    return httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS, keepalive_expiry=60)
+
+
+def openai_client():
+    return OpenAI(api_key=os.getenv('API_KEY'), base_url=BASE_URL, max_retries=0, http_client=httpx.Client(limits=pool(), timeout=httpx.Timeout(600, connect=10)))
+
+
+def async_openai_client():
+    return AsyncOpenAI(api_key=os.getenv('API_KEY'), base_url=BASE_URL, max_retries=0, http_client=httpx.AsyncClient(limits=pool(), timeout=httpx.Timeout(600, connect=10)))
+
+
+def estimate_tokens(kwargs): #prompt (~4 chars a token) plus the reply budget of each of the n choices
+    prompt = sum(len(m.get("content") or "") for m in kwargs.get("messages", [])) // 4
+    return prompt + (kwargs.get("max_tokens") or COMPLETION_ESTIMATE) * kwargs.get("n", 1)
+
+
+class rate_limiter: #requests/tokens per minute token buckets, shared by all processes through sqlite
+    def __init__(self, rpm=LIMIT_RPM, tpm=LIMIT_TPM, path=LIMIT_PATH):
+        self.rpm = rpm * HEADROOM
+        self.tpm = tpm * HEADROOM
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = None
+        self.pid = None
+
+    def connect(self): #one connection per process, as in completion_cache
+        if self.conn is None or self.pid != os.getpid():
+            self.conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, requests REAL, tokens REAL, updated REAL)")
+            self.conn.execute("INSERT OR IGNORE INTO buckets VALUES ('default', ?, ?, ?)", (self.rpm, self.tpm, time.time()))
+            self.pid = os.getpid()
+        return self.conn
+
+    def update(self, take_requests, take_tokens): #refill, then take if both buckets allow; returns seconds to wait, 0 when taken
+        with self.lock:
+            conn = self.connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                requests, tokens, updated = conn.execute("SELECT requests, tokens, updated FROM buckets WHERE name = 'default'").fetchone()
+                now = time.time()
+                requests = min(self.rpm, requests + (now - updated) * self.rpm / 60)
+                tokens = min(self.tpm, tokens + (now - updated) * self.tpm / 60)
+                take_tokens = min(take_tokens, self.tpm) #a request larger than the whole bucket still goes, once it is full
+                wait = max((take_requests - requests) * 60 / self.rpm, (take_tokens - tokens) * 60 / self.tpm, 0)
+                if wait == 0 or take_requests == 0:
+                    requests -= take_requests
+                    tokens -= take_tokens
+                conn.execute("UPDATE buckets SET requests = ?, tokens = ?, updated = ? WHERE name = 'default'", (requests, tokens, now))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return 0 if take_requests == 0 else wait
+
+    def acquire(self, tokens):
+        while (wait := self.update(1, tokens)) > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens): #the sqlite transaction can wait on other processes' locks, so it runs off the event loop
+        while (wait := await asyncio.to_thread(self.update, 1, tokens)) > 0:
+            await asyncio.sleep(wait)
+
+    def correct(self, tokens): #charge (or refund) the difference between the estimate and the real usage
+        self.update(0, tokens)
+
+    async def acorrect(self, tokens):
+        await asyncio.to_thread(self.update, 0, tokens)
+
+    def drain(self): #after a 429: nothing left for anyone until the buckets refill
+        with self.lock:
+            self.connect().execute("UPDATE buckets SET requests = 0, tokens = 0, updated = ? WHERE name = 'default'", (time.time(),))
+
+    async def adrain(self):
+        await asyncio.to_thread(self.drain)
+
+
+class aimd: #requests in flight in this process, additive increase / multiplicative decrease
+    def __init__(self, start=8, floor=1, ceiling=MAX_CONNECTIONS, slow_after=60.0):
+        self.limit = float(start)
+        self.floor = floor
+        self.ceiling = ceiling
+        self.slow_after = slow_after
+        self.active = 0
+        self.last_cut = 0.0
+        self.cond = threading.Condition()
+
+    def take(self):
+        if self.active < int(self.limit):
+            self.active += 1
+            return True
+        return False
+
+    def acquire(self):
+        with self.cond:
+            while not self.take():
+                self.cond.wait()
+
+    async def aacquire(self): #threads block on the condition, tasks poll so they never block the loop
+        while True:
+            with self.cond:
+                if self.take():
+                    return
+            await asyncio.sleep(0.05)
+
+    def release(self, latency, throttled):
+        with self.cond:
+            self.active -= 1
+            now = time.monotonic()
+            if throttled or latency > self.slow_after:
+                if now - self.last_cut > self.slow_after: #one cut per window, not one per slow call in flight
+                    self.limit = max(self.floor, self.limit / 2)
+                    self.last_cut = now
+            else:
+                self.limit = min(self.ceiling, self.limit + 1 / self.limit)
+            self.cond.notify_all()
+
+
+class limited_client: #drop-in for client/aclient, waits for quota and a concurrency slot before each request
+    def __init__(self, inner, limiter=None, window=None):
+        self.inner = inner
+        self.limiter = limiter if limiter is not None else rate_limiter()
+        self.window = window if window is not None else aimd()
+        self.is_async = is_async(inner)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.acreate if self.is_async else self.create))
+
+    def settle(self, estimate, response):
+        usage = getattr(response, "usage", None)
+        if getattr(usage, "total_tokens", None):
+            self.limiter.correct(usage.total_tokens - estimate)
+
+    async def asettle(self, estimate, response):
+        usage = getattr(response, "usage", None)
+        if getattr(usage, "total_tokens", None):
+            await self.limiter.acorrect(usage.total_tokens - estimate)
+
+    def create(self, **kwargs):
+        estimate = estimate_tokens(kwargs)
+        self.limiter.acquire(estimate)
+        self.window.acquire()
+        start = time.perf_counter()
+        throttled = False
+        try:
+            response = self.inner.chat.completions.create(**kwargs)
+        except RateLimitError:
+            throttled = True
+            self.limiter.drain()
+            raise
+        finally:
+            self.window.release(time.perf_counter() - start, throttled)
+        self.settle(estimate, response)
+        return response
+
+    async def acreate(self, **kwargs):
+        estimate = estimate_tokens(kwargs)
+        await self.limiter.aacquire(estimate)
+        await self.window.aacquire()
+        start = time.perf_counter()
+        throttled = False
+        try:
+            response = await self.inner.chat.completions.create(**kwargs)
+        except RateLimitError:
+            throttled = True
+            await self.limiter.adrain()
+            raise
+        finally:
+            self.window.release(time.perf_counter() - start, throttled)
+        await self.asettle(estimate, response)
+        return response
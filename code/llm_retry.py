@@ -0,0 +1,167 @@
+import asyncio
+import random
+import threading
+import time
+from types import SimpleNamespace
+from openai import APIConnectionError, APIStatusError, RateLimitError, InternalServerError
+from llm_cache import is_async
+from call_context import calling
+from tracing import trace
+
+"""
+_________________________________________________________________________________________
+retries and circuit breaker
+
+retry_client is the outermost wrapper around every client. each request gets up to
+`attempts` tries within `deadline` seconds (each try's own timeout is cut to what is
+left), with full-jitter exponential backoff or the server's Retry-After. only
+transient errors are retried: timeouts, dropped connections, 408/409/425/429 and
+5xx; bad requests, auth errors and readonly cache misses go straight up.
+each try runs under calling(retry=n), so the ledger underneath records every one.
+
+the circuit_breaker counts consecutive transient failures across all calls of the
+process. past `threshold` it opens and every call waits, not fails, for `cooldown`
+seconds; then a single probe goes through. a failed probe doubles the cooldown, a
+success closes it. if the endpoint stays down for `max_pause` seconds the breaker
+raises endpoint_down, and main_runner stops starting new replicates.
+
+"""
+
+ATTEMPTS = 6
+DEADLINE = 900 #seconds per request, all tries and backoff included, pauses of an open breaker excluded
+ATTEMPT_TIMEOUT = 300 #seconds for a single try
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+
+
+class endpoint_down(RuntimeError):
+    pass
+
+
+def retryable(error):
+    if isinstance(error, (APIConnectionError, RateLimitError, InternalServerError)): #APITimeoutError is an APIConnectionError
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in (408, 409, 425, 429) or error.status_code >= 500
+    return False
+
+
+def backoff(retry, error): #seconds before the next try
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_CAP)
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** retry))
+
+
+class circuit_breaker:
+    def __init__(self, threshold=5, cooldown=30.0, max_cooldown=600.0, max_pause=3600.0):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.max_pause = max_pause
+        self.failures = 0 #consecutive transient failures
+        self.opened = None #when the breaker last opened, None while closed
+        self.down_since = None #first opening of the current outage
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def admit(self): #seconds to wait before trying, 0 to go ahead
+        with self.lock:
+            if self.opened is None:
+                return 0
+            now = time.monotonic()
+            if now - self.down_since > self.max_pause:
+                raise endpoint_down(f"endpoint unhealthy for {now - self.down_since:.0f}s after {self.failures} failed calls")
+            if now < self.opened + self.cooldown:
+                return self.opened + self.cooldown - now
+            if self.probing:
+                return 1.0
+            self.probing = True
+            return 0
+
+    def success(self):
+        with self.lock:
+            if self.opened is not None:
+                trace.info("Endpoint healthy again, resuming after %.0fs", time.monotonic() - self.down_since)
+            self.failures = 0
+            self.opened = None
+            self.down_since = None
+            self.probing = False
+            self.cooldown = self.base_cooldown
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            now = time.monotonic()
+            if self.probing: #the probe failed, stay open for longer
+                self.probing = False
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                self.opened = now
+            elif self.opened is None and self.failures >= self.threshold:
+                trace.warning("Circuit open after %d failed calls, pausing %.0fs", self.failures, self.cooldown)
+                self.opened = now
+                self.down_since = now
+
+    def release(self): #a non-transient error from the probe: the endpoint answered, let the next call probe
+        with self.lock:
+            self.probing = False
+
+
+class retry_client: #drop-in for client/aclient, outermost wrapper
+    def __init__(self, inner, breaker=None, attempts=ATTEMPTS, deadline=DEADLINE, attempt_timeout=ATTEMPT_TIMEOUT):
+        self.inner = inner
+        self.breaker = breaker if breaker is not None else circuit_breaker()
+        self.attempts = attempts
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.is_async = is_async(inner)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.acreate if self.is_async else self.create))
+
+    def timeout(self, kwargs, deadline):
+        return max(1.0, min(kwargs.get("timeout") or self.attempt_timeout, self.attempt_timeout, deadline - time.monotonic()))
+
+    def failed(self, error, retry, deadline): #seconds to back off, or raise when the error is final
+        if not retryable(error):
+            self.breaker.release()
+            raise error
+        self.breaker.failure()
+        pause = backoff(retry, error)
+        if retry == self.attempts - 1 or time.monotonic() + pause >= deadline:
+            raise error
+        trace.warning("%s on try %d, retrying in %.1fs", type(error).__name__, retry + 1, pause)
+        return pause
+
+    def create(self, **kwargs):
+        deadline = time.monotonic() + self.deadline
+        for retry in range(self.attempts):
+            while (wait := self.breaker.admit()) > 0:
+                time.sleep(wait)
+                deadline += wait
+            try:
+                with calling(retry=retry):
+                    response = self.inner.chat.completions.create(**{**kwargs, "timeout": self.timeout(kwargs, deadline)})
+            except Exception as e:
+                time.sleep(self.failed(e, retry, deadline))
+                continue
+            self.breaker.success()
+            return response
+
+    async def acreate(self, **kwargs):
+        deadline = time.monotonic() + self.deadline
+        for retry in range(self.attempts):
+            while (wait := self.breaker.admit()) > 0:
+                await asyncio.sleep(wait)
+                deadline += wait
+            try:
+                with calling(retry=retry):
+                    response = await self.inner.chat.completions.create(**{**kwargs, "timeout": self.timeout(kwargs, deadline)})
+            except Exception as e:
+                await asyncio.sleep(self.failed(e, retry, deadline))
+                continue
+            self.breaker.success()
+            return response
@@ -1,55 +1,167 @@
 from simulation_core import *
-import pandas as pd
-import os
-
-for m in range(20):
-    for i in range(3):
-        # Run for groups 0, 1, 2
-        group = i
-
-        filenameR = "data/finalResults/1simRESULTSgrp"+str(group)+".csv"
-        filenameS = "data/simulationState/1simSTOCKgrp"+str(group)+".csv"
-        filenameP = "data/simulationState/1simPURCHASINGgrp"+str(group)+".csv"
-        filenameN = "data/rawNegotiations/1simNEGOTIATIONSgrp"+str(group)+".csv"
-        offerLog = [] 
-        negotiation_raw = [] 
-        stock = []
-        purchasing = []
-
-        suppliers = []
-        retailers = []
-        s1 = supplier("Supplier1", group, suppliers)
-        s2 = supplier("Supplier2", group, suppliers)
-        s3 = supplier("Supplier3", group, suppliers)
-
-        r1 = retailer("Retailer1", group, retailers)
-        r2 = retailer("Retailer2", group, retailers)
-        r3 = retailer("Retailer3", group, retailers)
-        r4 = retailer("Retailer4", group, retailers)
-        r5 = retailer("Retailer5", group, retailers)
-        r6 = retailer("Retailer6", group, retailers)
-        r7 = retailer("Retailer7", group, retailers)
-        r8 = retailer("Retailer8", group, retailers)
-        r9 = retailer("Retailer9", group, retailers)
-        r10 = retailer("Retailer10", group, retailers)
-
-        print(f"Beginning round {m} of group {group}!!")
-
-        run_negotiations(rounds, offerLog, negotiation_raw, stock, purchasing, retailers, suppliers)
-        print(f"Offer log for group {group}: {offerLog}")
-
-        df = pd.DataFrame(offerLog)
-        header = not os.path.exists(filenameR)
-        df.to_csv(filenameR, mode='a', header=header, index=False)
-
-        df1 = pd.DataFrame(stock)
-        header = not os.path.exists(filenameS)
-        df1.to_csv(filenameS, mode='a', header=header, index=False)
-
-        df_neg = pd.DataFrame(negotiation_raw)
-        header = not os.path.exists(filenameN)
-        df_neg.to_csv(filenameN, mode='a', header=header, index=False)
-
-        df_neg = pd.DataFrame(purchasing)
-        header = not os.path.exists(filenameP)
-        df_neg.to_csv(filenameP, mode='a', header=header, index=False)
+import simulation_core
+from replay_client import replay_client
+from llm_ledger import ledger_client
+from llm_retry import endpoint_down
+from checkpoint import checkpoint
+from rule_agents import concession_supplier, concession_retailer, zeuthen_supplier, zeuthen_retailer
+from async_engine import run_negotiations_concurrent, MAX_CONCURRENCY
+from concurrent.futures import ProcessPoolExecutor, CancelledError, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from results_store import results_store, TABLES
+from event_log import event_log
+from trajectories import trajectory, trajectory_store
+from topology import complete, k_regular, random_bipartite, edge_list
+
+PREFIX = "1sim" #start of the run tag (see run_tag), keeps new runs apart from the recorded 90sim/95sim/99sim ones
+CONFIG = DEFAULT_CONFIG #e.g. DEFAULT_CONFIG._replace(decay_rate=0.9) for another arm
+REPLICATES = 20
+GROUPS = [0, 1, 2]
+WORKERS = 6 #(replicate, group) jobs running at once, each with its own concurrent engine
+LEDGER_DIR = "data/ledger" #one parquet of llm calls per run
+CHECKPOINT_DIR = "data/checkpoints" #per-round state of unfinished runs, a rerun picks them up
+SUPPLIERS = [supplier] * 3 #agent class per seat, mix in e.g. concession_supplier or zeuthen_retailer for rule-based agents
+RETAILERS = [retailer] * 10
+TOPOLOGY = complete() #who negotiates with whom, e.g. k_regular(2) or edge_list("data/edges.csv") for sparse markets
+BATCH_DECISIONS = False #True for one decide call per agent per round instead of one per pair
+REPLAY = None #e.g. "95sim": replay data/rawNegotiations/95simNEGOTIATIONSgrp<group>.csv offline instead of calling the api
+store = results_store()
+trajectories = trajectory_store()
+
+
+def arm(config): #a config's name: its decay rate, and any other market constant off the default
+    changed = [f"{field}{getattr(config, field):.10g}" for field in ("production_cost", "market_value", "initial_stock") if getattr(config, field) != getattr(DEFAULT_CONFIG, field)]
+    return "_".join([f"decay{config.decay_rate:g}"] + changed)
+
+
+def run_tag(config, prefix=PREFIX): #results store partition, ledger and checkpoint names of a config's runs, e.g. 1sim_decay0.95_production_cost30
+    return f"{prefix}_{arm(config)}"
+
+
+def done(store, config, group, replicate, prefix=PREFIX):
+    return all(store.has(kind, run_tag(config, prefix), config.decay_rate, group, replicate) for kind in TABLES)
+
+
+def run_job(replicate, group, config=CONFIG, root=None, prefix=PREFIX): #one replicate of one group, written to its own partitions of the results store (under root and with a sweep's prefix for a sweep cell)
+    results = results_store(root) if root else store
+    recorded = trajectory_store(f"{root}/trajectories") if root else trajectories
+    if done(results, config, group, replicate, prefix):
+        return replicate, group #already ran, e.g. before a crash
+
+    if REPLAY:
+        recording = f"data/rawNegotiations/{REPLAY}NEGOTIATIONSgrp{group}.csv"
+        simulation_core.client = ledger_client(replay_client(recording, replicate), simulation_core.ledger)
+        simulation_core.aclient = ledger_client(replay_client(recording, replicate, is_async=True), simulation_core.ledger)
+    simulation_core.ledger.clear()
+
+    run = run_tag(config, prefix) #arms of other configs can share a pool and a store
+    logs = {kind: event_log(results, kind, run, config.decay_rate, group, replicate) for kind in TABLES} #streamed to the results store
+    offerLog = logs["RESULTS"]
+    negotiation_raw = logs["NEGOTIATIONS"]
+    stock = logs["STOCK"]
+    purchasing = logs["PURCHASING"]
+
+    suppliers = []
+    retailers = []
+    for i, agent in enumerate(SUPPLIERS):
+        agent("Supplier"+str(i+1), group, suppliers, config=config)
+    for i, agent in enumerate(RETAILERS):
+        agent("Retailer"+str(i+1), group, retailers, config=config)
+
+    print(f"Beginning round {replicate} of group {group}!!")
+
+    tag = f"{run}grp{group}_rep{replicate}"
+    saved = checkpoint(f"{CHECKPOINT_DIR}/{tag}")
+    traced = trajectory(config.rounds, len(suppliers), len(retailers)) #per-round agent state, kept in the checkpoints too
+    run_negotiations_concurrent(config.rounds, offerLog, negotiation_raw, stock, purchasing, retailers, suppliers, MAX_CONCURRENCY, BATCH_DECISIONS, saved, traced, TOPOLOGY)
+    print(f"Offer log for group {group}: {len(offerLog)} entries")
+    simulation_core.ledger.save(f"{LEDGER_DIR}/{tag}_LEDGER.parquet")
+    print(f"LLM calls for replicate {replicate} of group {group}:\n{simulation_core.ledger.report().to_string()}")
+
+    for row in suppliers[0].market.summaries(): #kept in the transcripts, so a resumed run has them too
+        logs["SUMMARIES"].append(row)
+    for log in logs.values():
+        log.close()
+    recorded.save(traced, run, config.decay_rate, group, replicate, suppliers, retailers)
+    saved.clear()
+    for log in logs.values():
+        log.clear()
+    return replicate, group
+
+
+def collect_futures(futures, finished, failed, unrun): #sort finished futures into the lists, returns (jobs whose pool broke, endpoint went down)
+    broken = []
+    halted = False
+    for future in as_completed(futures):
+        job = futures[future]
+        try:
+            future.result()
+            finished.append(job)
+        except BrokenProcessPool: #this job's worker died hard, or it went down with the one that did
+            broken.append(job)
+        except CancelledError: #never started, the endpoint went down
+            unrun.append(job)
+        except endpoint_down as e: #stop here instead of failing every remaining replicate the same way
+            print(f"Replicate {job[0]} of group {job[1]} stopped: {e}. Not starting any more runs.")
+            failed.append(job)
+            halted = True
+            for other in futures:
+                other.cancel()
+        except Exception as e:
+            print(f"Replicate {job[0]} of group {job[1]} failed: {e}")
+            failed.append(job)
+    return broken, halted
+
+
+def dispatch(pending, workers=WORKERS, restarts=2): #run_job(*job) for every job across a pool of worker processes, returns (finished, failed, unrun) jobs
+    finished = []
+    failed = [] #ran and raised, or killed its own worker more than restarts times
+    unrun = [] #never started, the endpoint went down first
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_job, *job): job for job in pending}
+        suspects, halted = collect_futures(futures, finished, failed, unrun)
+
+    #a broken pool takes every job in it down, so the jobs it held run one per pool from here on:
+    #only the one that kills its own worker is retried, and the others are not caught up in it again
+    if halted:
+        unrun += suspects
+        suspects = []
+    for attempt in range(restarts + 1):
+        if not suspects:
+            break
+        crashed = []
+        while suspects and not halted:
+            batch, suspects = suspects[:workers], suspects[workers:]
+            pools = [ProcessPoolExecutor(max_workers=1) for _ in batch]
+            futures = {pool.submit(run_job, *job): job for pool, job in zip(pools, batch)}
+            broken, halted = collect_futures(futures, finished, failed, unrun)
+            crashed += broken
+            for pool in pools:
+                pool.shutdown(cancel_futures=True)
+        if halted:
+            unrun += suspects
+            failed += crashed
+            crashed = []
+        suspects = crashed
+    for job in suspects:
+        print(f"Replicate {job[0]} of group {job[1]} killed its worker {restarts + 1} times, giving up on it")
+    failed += suspects
+    return finished, failed, unrun
+
+
+def run_all(replicates=REPLICATES, groups=GROUPS, workers=WORKERS, restarts=2, jobs=None, config=CONFIG): #jobs: (replicate, group) list, e.g. the failed ones of an earlier call
+    pending = list(jobs) if jobs is not None else [(m, g) for m in range(replicates) for g in groups]
+    finished, failed, unrun = dispatch([(m, g, config) for m, g in pending], workers, restarts)
+    finished = [(m, g) for m, g, _ in finished]
+    failed = [(m, g) for m, g, _ in failed]
+    unrun = [(m, g) for m, g, _ in unrun]
+
+    print(f"{len(finished)} runs stored, {len(failed)} failed: {sorted(failed)}, {len(unrun)} never started: {sorted(unrun)}")
+    if failed or unrun:
+        print(f"Rerun just these with run_all(jobs={sorted(failed + unrun)})")
+    return finished, failed + unrun
+
+
+if __name__ == "__main__":
+    run_all()
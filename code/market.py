@@ -0,0 +1,106 @@
+from collections import Counter
+import numpy as np
+from transcript import chat_transcript
+
+"""
+_________________________________________________________________________________________
+market state
+
+market_state holds the numbers of every agent in a market as numpy vectors, one entry
+per supplier (stock, spoilt, sold, lowest_price) or retailer (bought, highest_price),
+and the pair flags as supplier x retailer boolean matrices:
+
+    supplier_continues[s, r]  supplier s still wants to negotiate with retailer r
+    retailer_continues[s, r]  retailer r still wants to negotiate with supplier s
+    deal[s, r]                the pair stopped on an agreement (booked or not)
+
+plus the pair transcripts, {(s, r): chat_transcript}, only for the pairs the topology
+connects. agents are views onto it: supplier.stock reads and writes stock[supplier.idx]
+through a market_field, and supplier.chat(r) is the pair's transcript. an agent is
+its own one-agent market until init_negotiations puts everyone in a shared one, which
+starts from each agent's current numbers. checkpoints and forks pickle or copy the
+agents, and the market comes along once, shared as before.
+decay, stockout checks, summaries and trajectories work on the vectors. decided counts
+the continue/stop verdicts by whether a rule or the model settled them.
+
+quantities are stored as float64 and read back as int when whole, so prompts show
+"7145" rather than "7145.0" after a deal.
+
+"""
+
+NO_PRICE = 100000000 #lowest_price before a supplier's first deal
+
+
+def number(value): #numpy scalar -> int when whole, else float
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+class market_field: #an agent attribute stored in its market's vector
+    def __init__(self, vector):
+        self.vector = vector
+
+    def __get__(self, agent, owner=None):
+        if agent is None:
+            return self
+        return number(getattr(agent.market, self.vector)[agent.idx])
+
+    def __set__(self, agent, value):
+        getattr(agent.market, self.vector)[agent.idx] = value
+
+
+def current(agent, field, default): #an agent's value in the market it is in now, default for one that is not in any yet
+    return getattr(agent, field) if getattr(agent, "market", None) is not None else default
+
+
+class market_state:
+    def __init__(self, suppliers, retailers, edges=()): #edges: (retailer_idx, supplier_idx) pairs that negotiate
+        self.suppliers = list(suppliers)
+        self.retailers = list(retailers)
+        self.stock = np.array([current(s, "stock", s.config.initial_stock) for s in self.suppliers], dtype=np.float64)
+        self.spoilt = np.array([current(s, "spoilt", 0) for s in self.suppliers], dtype=np.float64)
+        self.sold = np.array([current(s, "totalSold", 0) for s in self.suppliers], dtype=np.float64)
+        self.lowest_price = np.array([current(s, "lowestPrice", NO_PRICE) for s in self.suppliers], dtype=np.float64)
+        self.bought = np.array([current(r, "totalBought", 0) for r in self.retailers], dtype=np.float64)
+        self.highest_price = np.array([current(r, "highestPrice", 0) for r in self.retailers], dtype=np.float64)
+
+        shape = (len(self.suppliers), len(self.retailers))
+        self.supplier_continues = np.zeros(shape, dtype=bool)
+        self.retailer_continues = np.zeros(shape, dtype=bool)
+        self.deal = np.zeros(shape, dtype=bool)
+        self.chats = {}
+        self.decided = Counter() #(side, "rule" or "llm") -> decide verdicts settled that way
+        for r, s in edges:
+            self.supplier_continues[s, r] = self.retailer_continues[s, r] = True
+            self.chats[(s, r)] = chat_transcript() #shared by both sides
+
+        for j, supplier in enumerate(self.suppliers):
+            supplier.market, supplier.idx = self, j
+        for i, retailer in enumerate(self.retailers):
+            retailer.market, retailer.idx = self, i
+
+    def summaries(self): #every pair's rolling summaries, as SUMMARIES rows
+        return [{"supplier": self.suppliers[s].name, "retailer": self.retailers[r].name, "round": round, "message": summary}
+                for (s, r), chat in self.chats.items() for round, summary in chat.folds]
+
+    def stop(self, s, r): #either side walked away, or the supplier ran out
+        self.supplier_continues[s, r] = False
+        self.retailer_continues[s, r] = False
+
+    def live(self): #pairs still negotiating
+        return self.supplier_continues & self.retailer_continues & ~self.deal
+
+    def is_live(self, s, r):
+        return self.supplier_continues[s, r] and self.retailer_continues[s, r] and not self.deal[s, r]
+
+    def open_pairs(self): #live pairs whose supplier has stock left, i.e. would negotiate next round
+        return self.live() & (self.stock > 10)[:, None]
+
+    def stocked_out(self):
+        return bool((self.stock <= 10).all())
+
+    def decay(self): #every supplier's stock by its decay rate, the loss counted as spoilt
+        rates = np.array([s.config.decay_rate for s in self.suppliers])
+        decayed = np.floor(self.stock * rates) #int() of a non-negative stock
+        self.spoilt += self.stock - decayed
+        self.stock = decayed
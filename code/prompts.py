@@ -0,0 +1,41 @@
+import contextvars
+import re
+
+"""
+_________________________________________________________________________________________
+prompt templates
+
+each agent builds its system prompts once (role, group, market constants), with the
+indentation of the source stripped. anything that changes between calls (stock,
+rounds left, memory metrics, the chat itself) goes into the user message after the
+static text, ending in a CURRENT STATE block, so consecutive calls of one agent
+share the whole system prompt as a prefix the provider can cache.
+messages() notes how much of the prompt was static in prompt_size, which the
+ledger records per call.
+
+"""
+
+prompt_size = contextvars.ContextVar("prompt_size", default=None) #(static prefix chars, total chars) of the last prompt built in this context
+
+
+def normalise(text): #drop source indentation and trailing spaces, at most one blank line in a row
+    lines = [line.strip() for line in text.strip().splitlines()]
+    return re.sub(r'\n{3,}', '\n\n', "\n".join(lines))
+
+
+def state_block(state): #per-call values, last in the prompt; empty values are left out
+    lines = [f"- {label}: {value}" for label, value in state.items() if value is not None and value != ""]
+    return "\n\nCURRENT STATE:\n" + "\n".join(lines) if lines else ""
+
+
+class prompt_template:
+    def __init__(self, system):
+        self.system = normalise(system)
+
+    def messages(self, user, state=None): #[system, user] with the state block at the very end
+        content = user + state_block(state or {})
+        prompt_size.set((len(self.system), len(self.system) + len(content)))
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": content},
+        ]
@@ -0,0 +1,101 @@
+import json
+from collections import defaultdict, deque
+from types import SimpleNamespace
+import pandas as pd
+from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
+from openai.types.completion_usage import CompletionUsage
+from call_context import current
+
+"""
+_________________________________________________________________________________________
+offline replay client
+
+drop-in for simulation_core.client / aclient that answers from a recorded
+data/rawNegotiations/*simNEGOTIATIONSgrp*.csv instead of the api, one replicate at a time.
+negotiate/introduce calls pop the next recorded message of that pair and speaker,
+decide (single or batched) returns true while the pair still has messages in later rounds, and
+summarise pops the pair's next recorded summary when given the run's SUMMARIES rows, and
+otherwise (the csv recordings predate them) returns the running summary with the folded
+turns appended. no network, fully deterministic, so it measures the engine's own overhead.
+
+e.g.  simulation_core.client = replay_client("data/rawNegotiations/95simNEGOTIATIONSgrp0.csv", replicate=3)
+      replay_client(path, 3, summaries=results_store().load("SUMMARIES", run=..., decay=0.95, group=0, replicate=3))
+
+"""
+
+SPEAKER = { #call site -> recorded speaker
+    "retailer.introduce": "retailer",
+    "retailer.negotiate": "retailer",
+    "supplier.negotiate": "supplier",
+}
+
+NO_MESSAGE = "OFFER:\n- Price per unit: 0\n- Volume: 0\nMESSAGE:\n- (no recorded message)"
+
+
+def load_replicates(path): #split a recording into replicates where the round counter restarts, as negotiation_splitter does
+    df = pd.read_csv(path)
+    starts = df.index[(df["round"] == 0) & (df["round"].shift(fill_value=0) > 0)].tolist()
+    bounds = [0] + starts + [len(df)]
+    return [df.iloc[bounds[i]:bounds[i+1]] for i in range(len(bounds) - 1)]
+
+
+def completion(content, model="replay"):
+    message = ChatCompletionMessage.model_construct(role="assistant", content=content)
+    return ChatCompletion.model_construct(
+        id="replay", object="chat.completion", created=0, model=model,
+        choices=[Choice.model_construct(index=0, finish_reason="stop", message=message)],
+        usage=CompletionUsage.model_construct(prompt_tokens=0, completion_tokens=0, total_tokens=0),
+    )
+
+
+class replay_client:
+    def __init__(self, path, replicate, is_async=False, summaries=None): #summaries: the replicate's SUMMARIES rows, in round order
+        transcript = load_replicates(path)[replicate]
+        self.queues = defaultdict(deque) #(supplier, retailer, speaker) -> messages in recorded order
+        self.last_round = defaultdict(int) #(supplier, retailer) -> last recorded round
+        for row in transcript.itertuples(index=False):
+            self.queues[(row.supplier, row.retailer, row.speaker)].append(row.message)
+            self.last_round[(row.supplier, row.retailer)] = max(self.last_round[(row.supplier, row.retailer)], row.round)
+        self.summaries = defaultdict(deque) #(supplier, retailer) -> summaries in recorded order
+        if summaries is not None:
+            for row in summaries.itertuples(index=False):
+                self.summaries[(row.supplier, row.retailer)].append(row.message)
+        self.previous = {} #last message popped per queue, resent when a supplier regenerates
+        self.calls = 0
+        self.exhausted = 0
+        self.is_async = is_async
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.acreate if is_async else self.create))
+
+    def answer(self, kwargs):
+        ctx = current()
+        site = ctx.get("site")
+        pair = (ctx.get("supplier"), ctx.get("retailer"))
+        self.calls += 1
+
+        if site in SPEAKER:
+            key = pair + (SPEAKER[site],)
+            if ctx.get("attempt", 0) > 0 and key in self.previous:
+                return self.previous[key]
+            if not self.queues[key]:
+                self.exhausted += 1
+                return NO_MESSAGE
+            self.previous[key] = self.queues[key].popleft()
+            return self.previous[key]
+        if site in ("supplier.decide", "retailer.decide"):
+            return "true" if self.last_round[pair] > ctx.get("round", 0) else "false"
+        if site in ("supplier.decide_batch", "retailer.decide_batch"):
+            pairs = [(ctx.get("supplier"), name) if site == "supplier.decide_batch" else (name, ctx.get("retailer")) for name in ctx["parties"]]
+            return json.dumps({"decisions": [{"name": name, "continue": self.last_round[p] > ctx.get("round", 0)} for name, p in zip(ctx["parties"], pairs)]})
+        if site == "summarise":
+            if self.summaries[pair]:
+                return self.summaries[pair].popleft()
+            summary, turns = kwargs["messages"][-1]["content"].split("Running summary: ", 1)[-1].split("\n\nHistory: ", 1)
+            return turns if summary == "(none yet)" else summary + "\n\n" + turns #no recorded summary: carry the running summary forward
+        raise ValueError(f"replay_client cannot answer call site {site!r}")
+
+    def create(self, **kwargs):
+        return completion(self.answer(kwargs), kwargs.get("model", "replay"))
+
+    async def acreate(self, **kwargs):
+        return completion(self.answer(kwargs), kwargs.get("model", "replay"))
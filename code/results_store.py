@@ -0,0 +1,220 @@
+import glob
+import json
+import os
+import re
+import time
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+from filelock import FileLock
+
+"""
+_________________________________________________________________________________________
+results store
+
+every run's tables (RESULTS = offer log, STOCK, PURCHASING, NEGOTIATIONS, SUMMARIES = the
+pairs' rolling summaries, which are not part of the conversation) are written as
+one parquet file per table and replicate, in a hive-partitioned dataset:
+
+    data/results/<TABLE>/run=95sim/decay=0.95/group=1/replicate=3/part-0.parquet
+
+with typed columns (ints, floats, dictionary-encoded names) and lz4 compression. the
+run tag (the file name prefix of the csvs an earlier run wrote, or main_runner's tag for
+a new one), decay rate, group and replicate live in the path, not in the rows, and come
+back as columns when loading. manifest.json lists every partition with its row count and size,
+so load() opens just the files that match its filters (no directory walk, no parsing
+of the others) and reads them memory-mapped, with text kept in arrow buffers
+instead of one python string per message:
+
+    load("NEGOTIATIONS", decay=0.95, group=[1, 2], run="95sim", columns=["round", "message"])
+
+a replicate is written once, atomically, by the worker that ran it (write(), or an
+event_log streaming it there), so there is no merge step. the store is generated, not
+checked in: the csvs of the recorded runs (run tags 90sim/95sim/99sim, the number being
+the decay rate) are imported into data/results with `python code/results_store.py import`,
+which the analysis scripts need before their first use.
+
+"""
+
+RESULTS_DIR = "data/results"
+MANIFEST = "manifest.json"
+COMPRESSION = "lz4" #a third of the csv size, and decompresses faster than zstd
+NAME = pa.dictionary(pa.int32(), pa.string()) #agent names and speakers repeat on every row
+STATUSES = ["deal", "stock_exceeded", "no_offer", "no_terms"] #offer log outcomes, see simulation_core.log
+ENUMS = {"status": STATUSES} #dictionary columns with a fixed set of values, in this order
+
+TABLES = {
+    "RESULTS": pa.schema([("round", pa.int32()), ("supplier", NAME), ("retailer", NAME), ("status", NAME), ("final_price", pa.float64()), ("final_volume", pa.float64()), ("reason", pa.string())]),
+    "STOCK": pa.schema([("name", NAME), ("remaining stock", pa.float64()), ("decayed stock", pa.float64()), ("total sold", pa.float64())]),
+    "PURCHASING": pa.schema([("name", NAME), ("total bought", pa.float64()), ("highest price", pa.float64())]),
+    "NEGOTIATIONS": pa.schema([("supplier", NAME), ("retailer", NAME), ("round", pa.int32()), ("speaker", NAME), ("message", pa.string())]),
+    "SUMMARIES": pa.schema([("supplier", NAME), ("retailer", NAME), ("round", pa.int32()), ("message", pa.string())]),
+}
+PARTITIONS = pa.schema([("run", pa.string()), ("decay", pa.float64()), ("group", pa.int32()), ("replicate", pa.int32())])
+RECORDED = ["90sim", "95sim", "99sim"] #run tags of the imported csvs, which the analysis scripts read
+LEGACY = { #table -> directory of the merged csvs earlier runs wrote
+    "RESULTS": "data/finalResults/",
+    "STOCK": "data/simulationState/",
+    "PURCHASING": "data/simulationState/",
+    "NEGOTIATIONS": "data/rawNegotiations/",
+}
+
+
+def partition_dir(kind, run, decay, group, replicate):
+    return f"{kind}/run={run}/decay={decay:g}/group={group}/replicate={replicate}"
+
+
+def to_table(kind, rows): #run output (list of dicts or frame) -> arrow table with the table's schema
+    schema = TABLES[kind]
+    df = pd.DataFrame(rows)
+    columns = {}
+    for field in schema:
+        values = df[field.name] if field.name in df else pd.Series([None] * len(df), dtype=object)
+        if pa.types.is_floating(field.type) or pa.types.is_integer(field.type):
+            values = pd.to_numeric(values) #None for a missing price or volume, anything else non-numeric is an error
+        if field.name in ENUMS:
+            codes = [ENUMS[field.name].index(v) for v in values] #ValueError on a status outside the enum
+            columns[field.name] = pa.DictionaryArray.from_arrays(pa.array(codes, pa.int32()), pa.array(ENUMS[field.name]))
+        elif pa.types.is_dictionary(field.type):
+            columns[field.name] = pa.array(values, type=field.type.value_type, from_pandas=True).dictionary_encode()
+        else:
+            columns[field.name] = pa.array(values, type=field.type, from_pandas=True)
+    return pa.table(columns, schema=schema)
+
+
+def matches(value, wanted): #wanted: None (anything), a value, or a list of values
+    if wanted is None:
+        return True
+    if isinstance(wanted, (list, tuple, set)):
+        return any(matches(value, w) for w in wanted)
+    return value == wanted if not isinstance(value, float) else abs(value - wanted) < 1e-9
+
+
+class results_store:
+    def __init__(self, root=RESULTS_DIR):
+        self.root = root
+        self.manifest_path = f"{root}/{MANIFEST}"
+        self.lock = None
+        self.pid = None
+
+    def locked(self): #the manifest lock, one per process: worker processes finish replicates concurrently, and a lock inherited across a fork cannot be taken
+        if self.lock is None or self.pid != os.getpid():
+            self.lock = FileLock(f"{self.root}/{MANIFEST}.lock")
+            self.pid = os.getpid()
+        return self.lock
+
+    def manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {"tables": {}}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def parts(self, kind, decay=None, group=None, replicate=None, run=None): #manifest entries of one table matching the filters, in (run, decay, group, replicate) order
+        entries = self.manifest()["tables"].get(kind, {}).get("partitions", [])
+        chosen = [p for p in entries if matches(p["run"], run) and matches(p["decay"], decay) and matches(p["group"], group) and matches(p["replicate"], replicate)]
+        return sorted(chosen, key=lambda p: (p["run"], p["decay"], p["group"], p["replicate"]))
+
+    def has(self, kind, run, decay, group, replicate):
+        return bool(self.parts(kind, decay, group, replicate, run))
+
+    def path(self, kind, run, decay, group, replicate):
+        return f"{self.root}/{partition_dir(kind, run, decay, group, replicate)}/part-0.parquet"
+
+    def write(self, kind, rows, run, decay, group, replicate): #one replicate of one table, replaces whatever was stored for it
+        path = self.path(kind, run, decay, group, replicate)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pq.write_table(to_table(kind, rows), path + ".tmp", compression=COMPRESSION)
+        return self.commit(kind, run, decay, group, replicate, path + ".tmp")
+
+    def commit(self, kind, run, decay, group, replicate, written): #move a finished file into its partition and list it in the manifest
+        path = self.path(kind, run, decay, group, replicate)
+        relative = os.path.relpath(path, self.root)
+        os.replace(written, path) #a partition only exists once it is complete
+        entry = {"run": run, "decay": float(decay), "group": int(group), "replicate": int(replicate), "path": relative,
+                 "rows": pq.ParquetFile(path).metadata.num_rows, "bytes": os.path.getsize(path), "written": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        with self.locked():
+            manifest = self.manifest()
+            listing = manifest["tables"].setdefault(kind, {"schema": {}, "partitions": []})
+            listing["schema"] = {field.name: str(field.type) for field in TABLES[kind]}
+            listing["partitions"] = [p for p in listing["partitions"] if p["path"] != relative] + [entry]
+            with open(self.manifest_path + ".tmp", "w") as f:
+                json.dump(manifest, f, indent=1)
+            os.replace(self.manifest_path + ".tmp", self.manifest_path)
+        return entry
+
+    def dataset(self, kind, decay=None, group=None, replicate=None, run=None):
+        paths = [f"{self.root}/{p['path']}" for p in self.parts(kind, decay, group, replicate, run)]
+        return ds.dataset(paths, schema=pa.unify_schemas([TABLES[kind], PARTITIONS]), format="parquet",
+                          partitioning=ds.partitioning(PARTITIONS, flavor="hive"), partition_base_dir=f"{self.root}/{kind}",
+                          filesystem=fs.LocalFileSystem(use_mmap=True))
+
+    def load(self, kind, decay=None, group=None, replicate=None, columns=None, filter=None, run=None): #decay/group/replicate/run: a value or a list, None for all
+        table = self.dataset(kind, decay, group, replicate, run).to_table(columns=columns, filter=filter)
+        return table.to_pandas(types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
+
+    def deals(self, decay=None, group=None, replicate=None, columns=None, run=None): #offer log rows of completed deals
+        return self.load("RESULTS", decay, group, replicate, columns, filter=ds.field("status") == "deal", run=run)
+
+
+"""
+_________________________________________________________________________________________
+legacy csvs
+
+the merged csvs have no replicate column: replicates were appended one after another.
+they are split back where the round counter restarts (offer log, negotiations) or an
+agent's name comes round again (stock, purchasing), which gives the same 20 replicates
+for every table of the recorded runs.
+their offer logs also predate the status column: failures were strings in the price
+and volume columns ("STOCK_EXCEEDED", "FAIL") and deals without terms were 0/0, which
+is what data/clean.py used to filter out. legacy_outcomes turns those into statuses, so
+deals() of an imported run gives the rows of its old *_CLEAN.csv.
+
+"""
+
+def legacy_outcomes(df):
+    price = pd.to_numeric(df["final_price"], errors="coerce")
+    volume = pd.to_numeric(df["final_volume"], errors="coerce")
+    status = pd.Series("deal", index=df.index)
+    status[(price == 0) & (volume == 0)] = "no_terms"
+    status[price.isna() | volume.isna()] = "no_offer"
+    status[df["final_price"].astype(str) == "STOCK_EXCEEDED"] = "stock_exceeded"
+    return df.assign(status=status, final_price=price.where(status == "deal"), final_volume=volume.where(status == "deal"))
+
+
+def legacy_replicates(kind, df):
+    if kind in ("STOCK", "PURCHASING"):
+        return df.groupby("name").cumcount()
+    rounds = pd.to_numeric(df["round"])
+    restart = rounds < rounds.shift(fill_value=rounds.iloc[0] if len(rounds) else 0) #offer log rounds start at 1, negotiations at 0
+    return restart.cumsum()
+
+
+def import_legacy(store, prefix, group, decay=None): #e.g. ("95sim", 1): the four data/*/95sim<TABLE>grp1.csv files, stored under run=95sim
+    decay = decay if decay is not None else int(re.match(r"(\d+)sim", prefix).group(1)) / 100
+    for kind, directory in LEGACY.items():
+        path = f"{directory}{prefix}{kind}grp{group}.csv"
+        if not os.path.exists(path):
+            continue
+        df = pd.read_csv(path)
+        if kind == "RESULTS":
+            df = legacy_outcomes(df)
+        for replicate, rows in df.groupby(legacy_replicates(kind, df), sort=True):
+            store.write(kind, rows, prefix, decay, group, int(replicate))
+        print(f"Imported {path}")
+
+
+def legacy_runs(): #(prefix, group) of every recorded run, e.g. ("95sim", 1)
+    for path in sorted(glob.glob(f"{LEGACY['RESULTS']}*simRESULTSgrp*.csv")):
+        found = re.match(r"(\d+sim)RESULTSgrp(\d+)\.csv", os.path.basename(path))
+        if found:
+            yield found.group(1), int(found.group(2))
+
+
+if __name__ == "__main__":
+    import sys
+    if sys.argv[1:] == ["import"]:
+        store = results_store()
+        for prefix, group in legacy_runs():
+            import_legacy(store, prefix, group)
@@ -0,0 +1,196 @@
+from simulation_core import *
+from transcript import offer
+
+"""
+_________________________________________________________________________________________
+rule-based agents
+
+drop-in supplier/retailer subclasses that bargain with a fixed tactic instead of the
+llm. they speak the same OFFER / agreement format, so end and collect settle their
+deals and they can sit in one market with llm agents (they read an llm's offer the
+same way they read each other's).
+
+tactics:
+time_dependent - price moves from start to reserve as start + (reserve-start) * t^(1/beta),
+                 t = round/(rounds-1); beta > 1 concedes early, beta < 1 holds out (Faratin et al.)
+zeuthen        - concede a share of the gap only when own risk of conflict is not higher
+                 than the other side's (Zeuthen 1930), with the other side's reserve estimated.
+                 since the estimates can make both sides hold, a side also concedes when the
+                 other did not move last turn
+
+they hand the transcript their offer already parsed and build no prompts, and both
+engines run pairs of two rule agents without summaries (the concurrent one without a
+task per pair). a 3x10 market of them still takes 5-10 ms a replicate, most of it
+writing the message text that the NEGOTIATIONS table keeps.
+
+"""
+
+
+class time_dependent:
+    def __init__(self, start, reserve, beta=1.0):
+        self.start = start
+        self.reserve = reserve
+        self.beta = beta
+
+    def next_price(self, own, other, t, other_before=None):
+        return self.start + (self.reserve - self.start) * t ** (1 / self.beta)
+
+
+class zeuthen:
+    def __init__(self, start, reserve, other_reserve, step=0.3):
+        self.start = start
+        self.reserve = reserve
+        self.other_reserve = other_reserve
+        self.step = step
+
+    def next_price(self, own, other, t, other_before=None):
+        if own is None:
+            return self.start
+        if other is None:
+            return own
+        if risk(own, other, self.reserve) <= risk(other, own, self.other_reserve) or other == other_before:
+            own = own + (other - own) * self.step
+        return min(max(own, min(self.start, self.reserve)), max(self.start, self.reserve)) #never past own reserve
+
+
+def risk(own, other, reserve): #share of own surplus lost if the other side's offer were taken instead of conflict
+    direction = 1 if own >= reserve else -1
+    u_own = (own - reserve) * direction
+    if u_own <= 0:
+        return 0.0
+    u_other = max((other - reserve) * direction, 0)
+    return (u_own - u_other) / u_own
+
+
+def offer_message(price, volume, note): #(text, offer), the offer as parse_offer would read it off the text, so the transcript skips the regexes
+    shown = f"{price:.2f}"
+    return f"OFFER:\n- Price per unit: {shown}\n- Volume: {volume}\nMESSAGE:\n- {note}", offer(float(shown), int(volume), False, None, None)
+
+
+def agreement_message(price, volume):
+    shown = f"{price:.2f}"
+    return f"I agree to this deal.\nagreement: true, agreed price: {shown}, agreed volume: {volume}", offer(None, None, True, float(shown), float(int(volume)))
+
+
+class rule_supplier(supplier):
+    llm = False
+
+    def __init__(self, name, group, suppliers, tactic=None, config=DEFAULT_CONFIG):
+        super().__init__(name, group, suppliers, config)
+        self.tactic = tactic or time_dependent(config.market_value * 0.95, config.production_cost * 1.1, beta=2.0)
+        self.own = {} #oth -> own last price
+        self.seen = {} #oth -> other side's last price
+
+    def build_prompts(self): #never asks the model
+        return None
+
+    def reply(self, oth, time, retailers):
+        other_price, other_volume = last_offer(self.chat(oth), retailers[oth].name)
+        price = self.tactic.next_price(self.own.get(oth), other_price, time / max(self.config.rounds - 1, 1), self.seen.get(oth))
+        open_deals = int((self.market.supplier_continues[self.idx] & ~self.market.deal[self.idx]).sum())
+        volume = min(other_volume or self.stock // max(open_deals, 1), self.stock)
+        self.own[oth] = price
+        self.seen[oth] = other_price
+        if other_price is not None and (other_price >= price or (time >= self.config.rounds - 1 and other_price >= self.tactic.reserve)): #last round: take anything within reserve
+            return agreement_message(other_price, volume)
+        return offer_message(price, volume, "Counter-offer.")
+
+    def negotiate(self, oth, time, negotiation_raw, retailers):
+        text, parsed = self.reply(oth, time, retailers)
+        self.speak(oth, time, text, negotiation_raw, retailers, parsed)
+
+    async def anegotiate(self, oth, time, negotiation_raw, retailers):
+        text, parsed = self.reply(oth, time, retailers)
+        return self.speak(oth, time, text, negotiation_raw, retailers, parsed)
+
+    def decide(self, oth): #walk away only from absurd offers, far below cost
+        other_price, _ = last_offer(self.chat(oth), self.counterpart(oth).name)
+        return other_price is None or other_price >= self.config.production_cost * 0.5
+
+    async def adecide(self, oth):
+        return self.decide(oth)
+
+    def decide_batch(self, oths):
+        return {oth: self.decide(oth) for oth in oths}
+
+    async def adecide_batch(self, oths):
+        return self.decide_batch(oths)
+
+
+class rule_retailer(retailer):
+    llm = False
+
+    def __init__(self, name, grp, retailers, tactic=None, volume=2000, config=DEFAULT_CONFIG):
+        super().__init__(name, grp, retailers, config)
+        opening = config.production_cost * 1.2 if grp > 0 else config.market_value * 0.5 #only groups 1 and 2 know the cost
+        self.tactic = tactic or time_dependent(opening, config.market_value * 0.9, beta=1.0)
+        self.volume = volume
+        self.own = {}
+        self.seen = {}
+
+    def build_prompts(self):
+        return None
+
+    def reply(self, oth, time, suppliers):
+        other_price, other_volume = last_offer(self.chat(oth), suppliers[oth].name)
+        price = self.tactic.next_price(self.own.get(oth), other_price, time / max(self.config.rounds - 1, 1), self.seen.get(oth))
+        volume = min(other_volume or self.volume, self.volume)
+        self.own[oth] = price
+        self.seen[oth] = other_price
+        if other_price is not None and (other_price <= price or (time >= self.config.rounds - 1 and other_price <= self.tactic.reserve)):
+            return agreement_message(other_price, volume)
+        return offer_message(price, volume, "Counter-offer.")
+
+    def introduce(self, oth, negotiation_raw, suppliers):
+        self.chat(oth).clear()
+        text, parsed = self.reply(oth, 0, suppliers)
+        self.speak(oth, 0, text, negotiation_raw, suppliers, parsed)
+
+    async def aintroduce(self, oth, negotiation_raw, suppliers):
+        self.chat(oth).clear()
+        text, parsed = self.reply(oth, 0, suppliers)
+        return self.speak(oth, 0, text, negotiation_raw, suppliers, parsed)
+
+    def negotiate(self, oth, time, negotiation_raw, suppliers):
+        text, parsed = self.reply(oth, time, suppliers)
+        self.speak(oth, time, text, negotiation_raw, suppliers, parsed)
+
+    async def anegotiate(self, oth, time, negotiation_raw, suppliers):
+        text, parsed = self.reply(oth, time, suppliers)
+        return self.speak(oth, time, text, negotiation_raw, suppliers, parsed)
+
+    def decide(self, oth, time): #walk away only from a supplier still above market value in the last round
+        other_price, _ = last_offer(self.chat(oth), self.counterpart(oth).name)
+        return other_price is None or other_price <= self.config.market_value or time < self.config.rounds - 1
+
+    async def adecide(self, oth, time):
+        return self.decide(oth, time)
+
+    def decide_batch(self, oths, time):
+        return {oth: self.decide(oth, time) for oth in oths}
+
+    async def adecide_batch(self, oths, time):
+        return self.decide_batch(oths, time)
+
+
+class concession_supplier(rule_supplier):
+    def __init__(self, name, group, suppliers, config=DEFAULT_CONFIG):
+        super().__init__(name, group, suppliers, time_dependent(config.market_value * 0.95, config.production_cost * 1.1, beta=2.0), config=config)
+
+
+class concession_retailer(rule_retailer):
+    def __init__(self, name, grp, retailers, config=DEFAULT_CONFIG):
+        opening = config.production_cost * 1.2 if grp > 0 else config.market_value * 0.5
+        super().__init__(name, grp, retailers, time_dependent(opening, config.market_value * 0.9, beta=1.0), config=config)
+
+
+class zeuthen_supplier(rule_supplier):
+    def __init__(self, name, group, suppliers, config=DEFAULT_CONFIG):
+        super().__init__(name, group, suppliers, zeuthen(config.market_value * 0.95, config.production_cost * 1.1, other_reserve=config.market_value), config=config)
+
+
+class zeuthen_retailer(rule_retailer):
+    def __init__(self, name, grp, retailers, config=DEFAULT_CONFIG):
+        opening = config.production_cost * 1.2 if grp > 0 else config.market_value * 0.5
+        guess = config.production_cost if grp > 0 else config.market_value * 0.3 #group 0 has to guess the supplier's floor
+        super().__init__(name, grp, retailers, zeuthen(opening, config.market_value * 0.9, other_reserve=guess), config=config)
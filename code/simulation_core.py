@@ -1,25 +1,64 @@
-from openai import OpenAI
 import os
 import re
+import json
+import contextvars
+from collections import namedtuple
+from contextlib import contextmanager
 from dotenv import load_dotenv
+from llm_cache import completion_cache, cached_client
+from llm_ledger import call_ledger, ledger_client
+from llm_limits import rate_limiter, aimd, limited_client, openai_client, async_openai_client
+from llm_retry import circuit_breaker, retry_client
+from call_context import calling
+from transcript import chat_text, last_offer, read_reply, clamp, OFFER_FORMAT
+from prompts import prompt_template
+from tracing import trace, pair, clip
+from topology import complete, active_pairs
+from market import market_state, market_field, number
 
 load_dotenv()
-temperature = 0.7
-top_p = 1.0
-rounds = 10
-client = OpenAI(api_key=os.getenv('API_KEY'), base_url="https://api.siliconflow.cn/")
+cache = completion_cache() #shared by both clients, temperature-0 calls (decide, summarise) are replayed from disk on reruns
+ledger = call_ledger() #latency/tokens/cache per call, saved per run by main_runner
+limiter = rate_limiter() #requests/tokens per minute, shared with the other worker processes
+window = aimd() #requests in flight in this process, shared by both clients
+breaker = circuit_breaker() #pauses both clients while the endpoint keeps failing
+client = retry_client(ledger_client(cached_client(limited_client(openai_client(), limiter, window), cache), ledger), breaker)
+aclient = retry_client(ledger_client(cached_client(limited_client(async_openai_client(), limiter, window), cache), ledger), breaker) #used by the concurrent engine in async_engine.py
+journaled = contextvars.ContextVar("journaled", default=None) #(client, aclient) wrapped by the call journal of the checkpointed run in this context
+
+def llm(): #the client for this run, journaled while a checkpointed run is in progress
+    clients = journaled.get()
+    return client if clients is None else clients[0]
+
+def allm():
+    clients = journaled.get()
+    return aclient if clients is None else clients[1]
 
 """
 _________________________________________________________________________________________
 variables
 
+one sim_config per run, immutable. every agent is built with one and keeps it, so
+runs with different configurations can share a process; another arm is a copy with
+some fields replaced, e.g. DEFAULT_CONFIG._replace(decay_rate=0.9).
+
 """
 
-PRODUCT_NAME = "Insulin Analog"
-MARKET_VALUE = 120 #TBD
-INITIAL_STOCK = 10000
-PRODUCTION_COST = 40 #TBD
-DECAY_RATE = 0.95 #TBC
+sim_config = namedtuple("sim_config", ["product", "market_value", "initial_stock", "production_cost", "decay_rate", "temperature", "top_p", "rounds", "model", "candidates", "low_secured"])
+
+DEFAULT_CONFIG = sim_config(
+    product="Insulin Analog",
+    market_value=120, #TBD
+    initial_stock=10000,
+    production_cost=40, #TBD
+    decay_rate=0.95, #TBC
+    temperature=0.7,
+    top_p=1.0,
+    rounds=10,
+    model="Qwen/Qwen3-30B-A3B-Instruct-2507",
+    candidates=1, #supplier offers sampled per negotiate request (n), the first within stock is used
+    low_secured=0.0, #retailer decide rule 1 is settled without the model up to this share of an even split of the market's stock secured; 0 = only with nothing secured yet
+)
 
 
 """self  = r1, s1"""
@@ -31,28 +70,37 @@ classes
 """
 
 class supplier:
-    def __init__(self, name, group, suppliers):
+    llm = True #False for the rule-based agents in rule_agents.py
+    side = "supplier"
+    __slots__ = ("name", "grp", "config", "history", "info", "prompts", "market", "idx")
+    stock = market_field("stock") #numbers live in the market's vectors, see market.py
+    spoilt = market_field("spoilt") # Track total stock decayed
+    totalSold = market_field("sold")
+    lowestPrice = market_field("lowest_price")
+
+    def __init__(self, name, group, suppliers, config=DEFAULT_CONFIG):
         self.name = name
         self.grp = group
-        self.situation = [] #negotiation history, [number of other party][0] = other party's name. [oth][1][0] = negotiation history.. not sure why a I nested anothe rlist into this? :)
-        self.stock = INITIAL_STOCK 
-        self.decisions = [] #decision whether or not to continue, true = continue, false = dont continue, index corresponds to negotiation/number of other party, [number of other party][0=self of other party, 1=boolean]
-        self.deals = [] #whether a deal has been reached, boolean, index corresponds to negotiation/number of other party, [number of other party][0=self of other party, 1=boolean]
+        self.config = config
         self.history = "" #temporary store of own dialogue
-        self.spoilt = 0  # Track total stock decayed
-        self.totalSold = 0
-        self.lowestPrice = 100000000
+        market_state([self], []) #a market of its own, with config.initial_stock, until init_negotiations
 
-        
-        
-        self.info = (
-        f"market value = {MARKET_VALUE}, production cost = {PRODUCTION_COST}, "
-        f"stock decay rate = {DECAY_RATE} every 2 rounds of negotiation, initial stock = {INITIAL_STOCK},\n"
+        self.info = self.describe()
+        self.prompts = self.build_prompts()
+        suppliers.append(self)
+
+
+    """history = s1r1, product is self.name, oth is index num"""       
+    
+    def describe(self): #internal information for this group, from the current market constants
+        info = (
+        f"market value = {self.config.market_value}, production cost = {self.config.production_cost}, "
+        f"stock decay rate = {self.config.decay_rate} every 2 rounds of negotiation, initial stock = {self.config.initial_stock},\n"
         "CONTEXT: This negotiation is for short-dated insulin inventory, which means the product has an approaching expiration date. Stock decay represents the risk of spoilage and loss of value over time. Sell quickly to avoid waste.\n"
         )
-        
+
         if self.grp == 2:
-            self.info += """STRATEGY:
+            info += """STRATEGY:
             You operate under symmetric information; the retailer is fully aware of your costs, the market value, and the stock decay rate. Aggressive or irrational offers will be recognized immediately and rejected.
 
             1.  Rational Efficiency: Negotiate with precision. Base offers on clear, mutually defensible calculations. Concessions must be rational and justifiable by the shared constraint (e.g., matching the urgency created by the decay).
@@ -60,348 +108,474 @@ class supplier:
             3.  Portfolio Management: You are managing a single stock pool for 10 parallel negotiations. Be conservative with volume, but recognize that the retailer also knows your stock is decaying, which affects their timing.
             4.  Creative Flexibility: Use timing and volume strategically to demonstrate good faith and accelerate profitable agreements. Avoid any negotiation tactics that rely on hiding information."""
         else:
-            self.info += """STRATEGY:
+            info += """STRATEGY:
             You operate with a significant information advantage over the retailer. They are unaware of your exact production cost or the severity of the stock decay rate.
 
             1.  Exploit Asymmetry: Leverage the retailer's ignorance to maximize margins. Your initial offers must anchor aggressively high, using the market value as the reference but setting your starting point realistically - below the market value to signal urgency - and offering minimal, highly rational concessions to test the retailer's knowledge and maximize margin.
             2.  Maintain Opacity: Never reveal any specific internal figures (cost, decay rate, exact stock) or strategic calculations. Dismiss aggressive low offers firmly, but vaguely (e.g., "That price is commercially unviable for us").
             3.  Portfolio Management: You are managing a single stock pool for 10 parallel negotiations. Be conservative with volume and prioritize high-margin deals, but remember the urgency created by spoilage.
             4.  Creative Flexibility: Utilize volume, tiered pricing, timing and other negoatiation tools creatively to strategically increase the perceived value of your offer."""
+        return info
 
+    def build_prompts(self): #static system prompts, built once; per-call values go in the CURRENT STATE block
+        decide = """You are a supplier, {name}, {task} Your decision must be based on a time-sensitive, strategic evaluation of all your options. Your primary goal is to sell all remaining stock to maximize total financial recovery.
 
-        suppliers.append(self)
-
-
-    """history = s1r1, product is self.name, oth is index num"""       
-    
-    def negotiate(self, oth, time, negotiation_raw, retailers):
-
-        if time == 0:
-            self.situation[oth][1][0] = retailers[oth].history
-        else:
-            self.situation[oth][1][0] = self.situation[oth][1][0] + retailers[oth].history
-
-        #rewritten
-        internal_info = f"Internal information: {self.info}"
-        if self.lowestPrice < 100000000:
-            internal_info += f"""MEMORY AND PERFORMANCE METRICS:
-            Total Rounds Completed: {time}
-            Total Units Sold (across all retailers this cycle): {self.totalSold}
-            Total Units Spoiled (due to decay): {self.spoilt}
-            Lowest Unit Price Accepted in previous deals: {self.lowestPrice}
-            Current Inventory Remaining: {self.stock}
-
-            STRATEGIC INSTRUCTION:
-            Your primary objective is to maximize total profit over the remaining rounds. The Lowest Unit Price Accepted serves as a critical internal reference point; only offer below this if the current negotiation is under extreme urgency driven by impending spoilage loss or if required to secure a large-volume deal. Use these metrics to guide your portfolio allocation and pricing decisions for the current round."""
-        else:
-            internal_info += f"""MEMORY AND PERFORMANCE METRICS:
-            Total Rounds Completed: {time}
-            Total Units Sold (across all retailers this cycle): {self.totalSold}
-            Total Units Spoiled (due to decay): {self.spoilt}
-            Current Inventory Remaining: {self.stock}
+        INTERNAL QUANTITATIVE ANALYSIS:
+        Production Cost (Loss Floor): {cost}
+        Decay Rate (Retention Factor): {decay} every 2 rounds.
+        Spoilage Loss Calculation: CURRENT STATE gives your remaining inventory, the units that will spoil if this negotiation stalls for 2 more rounds, and the sunk-cost loss they represent. This is the opportunity cost of time.
+        Latest Offer: Analyze the last price/volume proposed by the retailer in the history.
+        You must analyse the negotiation history, looking at responsiveness, flexibility and tone. Use this to aid your decision.
 
-            STRATEGIC INSTRUCTION:
-            Your primary objective is to maximize total profit over the remaining rounds. Use these metrics to guide your portfolio allocation and pricing decisions for the current round."""
+        DECISION LOGIC (CONTINUE = true | TERMINATE = false):
+        1. Clearance Imperative: If stock remains and the retailer's latest offer is above {cost}, you MUST CONTINUE (true) for at least one more round to finalize the deal. Securing any profitable sale is the dominant financial priority over continued negotiation for marginal gains.
+        2. Loss Aversion Guardrail: If the retailer's latest price offer is below {cost}, you must calculate the total financial loss from accepting the offer versus the total loss from spoilage (the Spoilage Loss Value in CURRENT STATE). If the loss from an immediate sale is less than the projected loss from spoilage, you MUST CONTINUE (true) to secure the sub-cost deal and minimize total loss. The absolute priority is inventory clearance.
+        3. Stagnation and Irrationality Check: If the negotiation has become a protracted negotiation (e.g., spanning many rounds) AND the retailer is making offers that are far below {cost} (e.g., an absurd offer) AND you have other viable negotiations currently running, TERMINATE (false) to allocate remaining stock to a more rational buyer.
+        4. Viability Check: If the retailer's offer price is highly profitable (e.g., close to {value}) and a high volume is requested, CONTINUE (true) to maximize margin on the remaining stock.
+        5. Default: In all other cases where the retailer is showing reasonable movement and the inventory is not yet sold out, CONTINUE (true).
 
-            
-        violation_note = ""
-        fail = False
-        for i in range(5):
-            supplier = client.chat.completions.create(
-                    model = "Qwen/Qwen3-30B-A3B-Instruct-2507",
-                    messages = [
-                        {
-                            "role": "system",
-                            "content": f"""You are a supplier, {self.name}, negotiating the sale of short-dated insulin inventory with a pharmaceutical retailer.
+        {output}"""
+        constants = dict(name=self.name, cost=self.config.production_cost, decay=self.config.decay_rate, value=self.config.market_value)
+        return {
+            "negotiate": prompt_template(f"""You are a supplier, {self.name}, negotiating the sale of short-dated insulin inventory with a pharmaceutical retailer.
 
                             DECISION LOGIC:
-                            - CRITICAL: Volume Constraint - You must ensure Volume <= {self.stock}. If you violate this, the system will reject your message and force you to resubmit a compliant offer.
-                            - Pricing Goal: The default and strong preference is to maintain prices > {PRODUCTION_COST}. You should aim to maximise profit, balancing higher prices vs. efficiency and threat of decay. 
-                            - Loss Aversion Exception: Accepting a price below {PRODUCTION_COST} is a EXTREMELY MAJOR strategic failure and high-stakes last resort. Only offer or accept below cost if projected loss from letting the stock spoil (considering {DECAY_RATE} and remaining rounds) outweighs the immediate loss from the sub-cost sale.
-                            - Retailer Counter-Offers: If the retailer's counter offer is below {PRODUCTION_COST}, you must initially reject very firmly. Respond firmly and reject it clearly (without revealing your cost). For example, say something like: 'That offer is far too low for consideration. Please make a realistic offer.' Continue negotiating once the retailer's offers are above {PRODUCTION_COST}. You retain the strategic option to revisit or accept a sub-cost offer only if the loss aversion exception condition is met. 
-                            - Your goal is maximise profit, whilst balancing decay rate, you must also balance your goal to be as close to {MARKET_VALUE} as possible. You must remain flexible as goal is avoiding total inventory loss due to decay whilst maximising cost. Thus, you may need to concede to avoid complete loss from lack of deals as reduced profit is preferable to complete loss.
+                            - CRITICAL: Volume Constraint - You must ensure Volume is no more than the Current Inventory Remaining in CURRENT STATE. If you violate this, the system will cut your volume down to your remaining stock.
+                            - Pricing Goal: The default and strong preference is to maintain prices > {self.config.production_cost}. You should aim to maximise profit, balancing higher prices vs. efficiency and threat of decay.
+                            - Loss Aversion Exception: Accepting a price below {self.config.production_cost} is a EXTREMELY MAJOR strategic failure and high-stakes last resort. Only offer or accept below cost if projected loss from letting the stock spoil (considering {self.config.decay_rate} and remaining rounds) outweighs the immediate loss from the sub-cost sale.
+                            - Retailer Counter-Offers: If the retailer's counter offer is below {self.config.production_cost}, you must initially reject very firmly. Respond firmly and reject it clearly (without revealing your cost). For example, say something like: 'That offer is far too low for consideration. Please make a realistic offer.' Continue negotiating once the retailer's offers are above {self.config.production_cost}. You retain the strategic option to revisit or accept a sub-cost offer only if the loss aversion exception condition is met.
+                            - Your goal is maximise profit, whilst balancing decay rate, you must also balance your goal to be as close to {self.config.market_value} as possible. You must remain flexible as goal is avoiding total inventory loss due to decay whilst maximising cost. Thus, you may need to concede to avoid complete loss from lack of deals as reduced profit is preferable to complete loss.
                             - Treat all numerical variables quantitatively, not qualitatively.
                             - Always reason about profit margins numerically before responding.
-                        
+
                             GOAL:
-                            Your primary objective is to clear all of your {self.stock} remaining stock when all negotiations conclude by the {9-time} remaining rounds with the 10 retailers you are negotiating with WHILST securing the highest realistic price possible while maintaining volume and ensuring the deal is profitable, especially given the short-dated nature of the insulin inventory.
+                            Your primary objective is to clear all of your remaining stock when all negotiations conclude by the end of the remaining rounds (both in CURRENT STATE) with the 10 retailers you are negotiating with WHILST securing the highest realistic price possible while maintaining volume and ensuring the deal is profitable, especially given the short-dated nature of the insulin inventory.
                             Maximise total profit while maintaining realistic, logical offers and responses.
                             Keep tone concise, professional, and numerical — no greetings.
 
-                            {violation_note}
-                            {internal_info}
-                            All responses MUST adhere to the following JSON structure on the last line, with no extra text or explanation, this is non-negotiable:
-                            OFFER:
-                            - Price per unit: (numeric)
-                            - Volume: (must be an integer)
-                            MESSAGE:
-                            - (negotiation statement)
-
-                            If you agree to a deal, explicitly write:
-                            'I agree to this deal.' followed by:
-                            agreement: true, agreed price: <price>, agreed volume: <volume>
-
-                            """
-                        },
-                        {
-                            "role": "user",
-                            "content": f"Reply to the client {retailers[oth].name}. Negotiate logically and analytically. Use precise reasoning about price, volume, and remaining stock. Be firm but flexible — balance profit with urgency, but do not disclose internal figures. The current chat is: {self.situation[oth][1][0]}."
-                        }
-
-
-                        ],
+                            Internal information: {self.info}
+                            MEMORY AND PERFORMANCE METRICS: listed in CURRENT STATE.
+
+                            STRATEGIC INSTRUCTION:
+                            Your primary objective is to maximize total profit over the remaining rounds. If a Lowest Unit Price Accepted in previous deals is listed, it serves as a critical internal reference point; only offer below this if the current negotiation is under extreme urgency driven by impending spoilage loss or if required to secure a large-volume deal. Use these metrics to guide your portfolio allocation and pricing decisions for the current round.
+
+                            {OFFER_OUTPUT}
+                            """),
+            "decide": prompt_template(decide.format(task="deciding whether to continue a negotiation.", output="Your final output must be a single boolean value: 'true' to continue, 'false' to stop.", **constants)),
+            "decide_batch": prompt_template(decide.format(task="deciding, for each of your live negotiations, whether to continue it.", output=BATCH_OUTPUT, **constants)),
+        }
+
+    def state(self, time=None): #memory and performance metrics for the CURRENT STATE block
+        return {
+            "Total Rounds Completed": time,
+            "Remaining Rounds": None if time is None else self.config.rounds - 1 - time,
+            "Total Units Sold (across all retailers this cycle)": self.totalSold,
+            "Total Units Spoiled (due to decay)": self.spoilt,
+            "Lowest Unit Price Accepted in previous deals": self.lowestPrice if self.lowestPrice < 100000000 else None,
+            "Current Inventory Remaining": self.stock,
+        }
+
+    def negotiate_request(self, oth, time, retailers, n=1): #kwargs for the negotiate completion, n candidate replies
+        request = dict(
+                    model = self.config.model,
+                    messages = self.prompts["negotiate"].messages(
+                        f"Reply to the client {retailers[oth].name}. Negotiate logically and analytically. Use precise reasoning about price, volume, and remaining stock. Be firm but flexible — balance profit with urgency, but do not disclose internal figures. The current chat is: {self.chat(oth).text()}.",
+                        self.state(time)),
+                    response_format = OFFER_FORMAT,
                     stream = False,
-                    temperature=temperature, 
-                    top_p=top_p
+                    temperature=self.config.temperature, 
+                    top_p=self.config.top_p
                 )
-
-            message = supplier.choices[0].message.content
-            vol_matches = re.findall(r'Volume: (\d+)', message)
-            if vol_matches:
-                vol = int(vol_matches[-1])
-                if vol <= self.stock:
-                    fail = False
-                    break
-                else:
-                    violation_note = (
-                    "ABSOLUTELY CRITICAL RULE VIOLATION!!\n"
-                    f"Your previous offer failed because the VOLUME ({vol}) EXCEEDED THE REMAINING STOCK ({self.stock})."
-                    f"Your re-generate another offer and it MUST correct this error by proposing a volume less than or equal to {self.stock}."
-                    "Failure to comply with inventory limits will terminate the negotiation with a loss. CORRECT THE VOLUME NOW.")
-            else:
-                if(i == 4):
-                    fail = True 
-                    break  # no volume parsed, proceed anyway
-        
-
-        if fail:
+        if n > 1:
+            request["n"] = n
+        return request
+
+    def pick(self, choices): #(text, offer) of the first candidate within stock, else the first one cut to stock, (None, None) if none offers a volume
+        cut = None, None
+        for choice in choices:
+            message, offered = read_reply(choice.message.content)
+            if offered.volume is None:
+                continue
+            if offered.volume <= self.stock and (offered.agreed_volume or 0) <= self.stock:
+                return message, offered
+            if cut[1] is None:
+                trace.debug("%s offered %s with %s in stock, cut to stock", self.name, offered.volume, self.stock)
+                cut = clamp(message, offered, self.stock)
+        return cut
+
+    def speak(self, oth, time, message, negotiation_raw, retailers, parsed=None): #record own message, returns it as chat text
+        self.history = self.name + ":" + message + "\n\n"
+        trace.debug("%s: %s", self.name, clip(message), extra=pair(self.name, retailers[oth].name))
+        negotiation_raw.append({"group": self.grp, "supplier": self.name, "retailer": retailers[oth].name, "round": time, "speaker": "supplier", "message": message})
+        self.chat(oth).append(self.name, time, message, parsed) #the retailer sees it through the same transcript
+        return self.history
+
+    def negotiate(self, oth, time, negotiation_raw, retailers): #a reply is only regenerated when it has no volume at all
+        for i in range(REGENERATIONS):
+            with calling(site="supplier.negotiate", attempt=i):
+                supplier = llm().chat.completions.create(**self.negotiate_request(oth, time, retailers, self.config.candidates if i == 0 else 1))
+            message, offered = self.pick(supplier.choices)
+            if offered is not None:
+                break
+
+        if offered is None:
             return True
         else:
-            self.history = self.name + ":" + message + "\n\n"
-            print(self.history)
-            negotiation_raw.append({"group": self.grp, "supplier": self.name, "retailer": retailers[oth].name, "round": time, "speaker": "supplier", "message": message})
-            self.situation[oth][1][0] = self.situation[oth][1][0] + self.history #update
-
-    def decide(self, oth): #continue or no?
-        #internal calc
-        projected_stock_after_decay = int(self.stock * DECAY_RATE)
+            self.speak(oth, time, message, negotiation_raw, retailers, offered)
+
+    async def anegotiate(self, oth, time, negotiation_raw, retailers):
+        for i in range(REGENERATIONS):
+            with calling(site="supplier.negotiate", attempt=i):
+                supplier = await allm().chat.completions.create(**self.negotiate_request(oth, time, retailers, self.config.candidates if i == 0 else 1))
+            message, offered = self.pick(supplier.choices)
+            if offered is not None:
+                break
+
+        if offered is None:
+            return None
+        return self.speak(oth, time, message, negotiation_raw, retailers, offered)
+
+    def decide_state(self): #spoilage if a negotiation stalls 2 more rounds
+        projected_stock_after_decay = int(self.stock * self.config.decay_rate)
         calculated_spoilage_units = self.stock - projected_stock_after_decay
-        calculated_spoilage_loss_value = calculated_spoilage_units * PRODUCTION_COST
-
-        
-        system_prompt = f"""You are a supplier, {self.name}, deciding whether to continue a negotiation. Your decision must be based on a time-sensitive, strategic evaluation of all your options. Your primary goal is to sell all remaining stock to maximize total financial recovery.
-
-        INTERNAL QUANTITATIVE ANALYSIS:
-        Current Inventory Remaining: {self.stock} units
-        Production Cost (Loss Floor): {PRODUCTION_COST}
-        Decay Rate (Retention Factor): {DECAY_RATE} every 2 rounds.
-        Spoilage Loss Calculation: If this negotiation stalls for 2 more rounds, {calculated_spoilage_units} units will spoil, representing a sunk-cost loss of {calculated_spoilage_loss_value}. This is the opportunity cost of time.
-        Latest Offer: Analyze the last price/volume proposed by the retailer in the history.
-        Negotiation History: {self.situation[oth][1][0]}
-        You must analyse the negotiation history, looking at responsiveness, flexibility and tone. Use this to aid your decision.
-
-        DECISION LOGIC (CONTINUE = true | TERMINATE = false):
-        1. Clearance Imperative: If stock remains and the retailer's latest offer is above {PRODUCTION_COST}, you MUST CONTINUE (true) for at least one more round to finalize the deal. Securing any profitable sale is the dominant financial priority over continued negotiation for marginal gains.
-        2. Loss Aversion Guardrail: If the retailer's latest price offer is below {PRODUCTION_COST}, you must calculate the total financial loss from accepting the offer versus the total loss from spoilage ({calculated_spoilage_loss_value}). If the loss from an immediate sale is less than the projected loss from spoilage, you MUST CONTINUE (true) to secure the sub-cost deal and minimize total loss. The absolute priority is inventory clearance.
-        3. Stagnation and Irrationality Check: If the negotiation has become a protracted negotiation (e.g., spanning many rounds) AND the retailer is making offers that are far below {PRODUCTION_COST} (e.g., an absurd offer) AND you have other viable negotiations currently running, TERMINATE (false) to allocate remaining stock to a more rational buyer.
-        4. Viability Check: If the retailer's offer price is highly profitable (e.g., close to {MARKET_VALUE}) and a high volume is requested, CONTINUE (true) to maximize margin on the remaining stock.
-        5. Default: In all other cases where the retailer is showing reasonable movement and the inventory is not yet sold out, CONTINUE (true).
-
-        Your final output must be a single boolean value: 'true' to continue, 'false' to stop.
-        """
-        
-        decision = client.chat.completions.create(
-        model="Qwen/Qwen3-30B-A3B-Instruct-2507",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": "Based on the provided context, should you continue negotiating with this retailer? Return only the boolean value, 'true' or 'false'."}
-            ],
+        return {
+            "Current Inventory Remaining": f"{self.stock} units",
+            "Units Spoiled If Stalled 2 More Rounds": calculated_spoilage_units,
+            "Spoilage Loss Value": calculated_spoilage_units * self.config.production_cost,
+        }
+
+    def decide_request(self, oth): #kwargs for the decide completion
+        return dict(
+        model=self.config.model,
+        messages=self.prompts["decide"].messages(
+            f"Based on the provided context, should you continue negotiating with this retailer? Return only the boolean value, 'true' or 'false'.\n\nNegotiation History: {self.chat(oth).text()}",
+            self.decide_state()),
         stream=False,
         temperature=0)
-        
-        if decision.choices[0].message.content.strip().lower() == "false":
-            return False
-        else:
+
+    def decide_batch_request(self, oths): #kwargs for one decide completion over several negotiations
+        names = [self.counterpart(oth).name for oth in oths]
+        histories = "\n".join(f"Negotiation History with {self.counterpart(oth).name}: {self.chat(oth).text()}" for oth in oths)
+        messages = self.prompts["decide_batch"].messages(f"Based on the provided context, should you continue negotiating with each of these retailers: {', '.join(names)}? Return only the JSON.\n\n{histories}", self.decide_state())
+        return batch_request(messages, names, self.config.model)
+
+    def rule(self, oth): #the decision rules the latest offer settles on its own: True to continue, None to leave it to the model
+        price, _ = last_offer(self.chat(oth), self.counterpart(oth).name)
+        if price is not None and price > self.config.production_cost and self.stock > 10: #1. clearance imperative
             return True
+        return None
+
+    def decide(self, oth): #continue or no? the model is only asked when rule() leaves it open
+        verdict = self.rule(oth)
+        if verdict is not None:
+            return decided(self, "rule", verdict, oth)
+        with calling(site="supplier.decide"):
+            decision = llm().chat.completions.create(**self.decide_request(oth))
+        return decided(self, "llm", parse_decision(decision))
+
+    async def adecide(self, oth):
+        verdict = self.rule(oth)
+        if verdict is not None:
+            return decided(self, "rule", verdict, oth)
+        with calling(site="supplier.decide"):
+            decision = await allm().chat.completions.create(**self.decide_request(oth))
+        return decided(self, "llm", parse_decision(decision))
+
+    def decide_batch(self, oths): #{oth: continue?} by rule where it settles, one call for the rest, per-pair calls for anything the reply leaves out
+        verdicts = ruled(self, oths)
+        oths = [oth for oth in oths if oth not in verdicts]
+        names = [self.counterpart(oth).name for oth in oths]
+        answers = {}
+        if len(oths) > 1:
+            with calling(site="supplier.decide_batch", parties=names):
+                decision = llm().chat.completions.create(**self.decide_batch_request(oths))
+            answers = parse_batch_decisions(decision, names)
+        for oth, name in zip(oths, names):
+            if name in answers:
+                verdicts[oth] = decided(self, "llm", answers[name])
+            else:
+                with calling(retailer=name):
+                    verdicts[oth] = self.decide(oth)
+        return verdicts
+
+    async def adecide_batch(self, oths):
+        verdicts = ruled(self, oths)
+        oths = [oth for oth in oths if oth not in verdicts]
+        names = [self.counterpart(oth).name for oth in oths]
+        answers = {}
+        if len(oths) > 1:
+            with calling(site="supplier.decide_batch", parties=names):
+                decision = await allm().chat.completions.create(**self.decide_batch_request(oths))
+            answers = parse_batch_decisions(decision, names)
+        for oth, name in zip(oths, names):
+            if name in answers:
+                verdicts[oth] = decided(self, "llm", answers[name])
+            else:
+                with calling(retailer=name):
+                    verdicts[oth] = await self.adecide(oth)
+        return verdicts
     
 
-    def updateStock(self): #stock decay! expiration not depletion
-        old_stock = self.stock
-        self.stock = int(self.stock * DECAY_RATE)
-        decayed_amount = old_stock - self.stock
-        self.spoilt += decayed_amount
-        
-            
+    def chat(self, oth): #transcript shared with retailer oth, None if the topology does not connect them
+        return self.market.chats.get((self.idx, oth))
+
+    def counterpart(self, oth):
+        return self.market.retailers[oth]
+
 
 class retailer:
-    def __init__(self, name, grp, retailers):
+    llm = True
+    side = "retailer"
+    __slots__ = ("name", "group", "config", "history", "info", "prompts", "market", "idx")
+    totalBought = market_field("bought")
+    highestPrice = market_field("highest_price")
+
+    def __init__(self, name, grp, retailers, config=DEFAULT_CONFIG):
         self.name = name
         self.group = grp
-        self.totalBought = 0
-        self.highestPrice = 0
-        self.situation = [] #negotiation history, [number of other party][0] = other party's name. [oth][1][0] = negotiation history.. not sure why a I nested anothe rlist into this? :)
-        self.decisions = [] #decision whether or not to continue, true = continue, false = dont continue, index corresponds to negotiation/number of other party, [number of other party][0=self of other party, 1=boolean]
+        self.config = config
+        self.history = ""
+        market_state([], [self])
     
         retailers.append(self) #add self to retailer reference
 
-        #amount of info given adjusted according to grp
-        if grp == 0:  # asymmetric – baseline
-            self.info = (f"market value = {MARKET_VALUE} per unit. You must always offer a price below this value to ensure a profit."
+        self.info = self.describe()
+        self.prompts = self.build_prompts()
+
+    def describe(self): #amount of info given adjusted according to grp
+        if self.group == 0:  # asymmetric – baseline
+            info = (f"market value = {self.config.market_value} per unit. You must always offer a price below this value to ensure a profit."
             "You are aware the goods are highly perishable and short-dated. You do NOT know the supplier's decay rate or exact remaining shelf life."
             " Your offers must reflect a high, unquantified risk premium to account for potential loss if the stock decays due to information asymmetry and uncertainty."
             " Use all numerical information below as quantitative input for your reasoning."
             )
 
-        elif grp == 1:  # partial transparency (targeted leak)
-            self.info = (
-                f"IMPORTANT: The supplier's production cost is {PRODUCTION_COST}. Your offer must remain BELOW the market value {MARKET_VALUE} to ensure profitability. Your aim is to secure prices as close to {PRODUCTION_COST} as possible! This knowledge must be the single greatest determinant of your opening position."
-                f" Stock decay rate = {DECAY_RATE} every 2 rounds of negotiation creates urgency due to the short-dated inventory."
-                f"Your goal is to secure the absolute lowest price. Use all counter-offers to pull the supplier away from their high anchor and towards the production cost of {PRODUCTION_COST}." 
+        elif self.group == 1:  # partial transparency (targeted leak)
+            info = (
+                f"IMPORTANT: The supplier's production cost is {self.config.production_cost}. Your offer must remain BELOW the market value {self.config.market_value} to ensure profitability. Your aim is to secure prices as close to {self.config.production_cost} as possible! This knowledge must be the single greatest determinant of your opening position."
+                f" Stock decay rate = {self.config.decay_rate} every 2 rounds of negotiation creates urgency due to the short-dated inventory."
+                f"Your goal is to secure the absolute lowest price. Use all counter-offers to pull the supplier away from their high anchor and towards the production cost of {self.config.production_cost}." 
                "Use this knowledge to inform your internal reasoning and strategy, but do not reveal your calculations or thought processes in your responses. Keep negotiations professional and concise."
             )
         else:  # full transparency
-            self.info = (
-                f"IMPORTANT: The supplier's aims to secure prices as close to their production cost of {PRODUCTION_COST} as possible. Your offers must remain above this cost, but be aware the supplier may negotiate below cost as a strategic last resort due to shared decay urgency. "
+            info = (
+                f"IMPORTANT: The supplier's aims to secure prices as close to their production cost of {self.config.production_cost} as possible. Your offers must remain above this cost, but be aware the supplier may negotiate below cost as a strategic last resort due to shared decay urgency. "
                 "Balance profit and efficiency "
-                f"Stock decay rate = {DECAY_RATE} every 2 rounds of negotiation means the supplier's stock depletes over time, creates shared urgency due to the short-dated inventory. "
+                f"Stock decay rate = {self.config.decay_rate} every 2 rounds of negotiation means the supplier's stock depletes over time, creates shared urgency due to the short-dated inventory. "
                 "Leverage this symmetric knowledge to achieve the most efficient and rapid agreement possible."
                 "You are aware the supplier also knows these details, establishing a condition of symmetric information. Use this shared, quantifiable data for all calculations."
                 "Because of this, you must rely on strong logical reasoning and strategic timing rather than hidden leverage. "
                 "Use this knowledge to inform your internal reasoning and strategy, but do not reveal your calculations or thought processes in your responses. Keep negotiations professional and concise."
             )
+        return info
 
-    def introduce(self, oth, negotiation_raw, suppliers): #start negotiation
-        #rewritten
-        retailer = client.chat.completions.create(
-            model = "Qwen/Qwen3-30B-A3B-Instruct-2507",
-            messages = [
-                {"role": "system", "content": "You are a representative negotiating on behalf of pharmaceutical procurement, "+self.name+", in a live, face-to-face negotiation, which spans multiple interactions, about "+PRODUCT_NAME+" with a supplier. Speak naturally as in a real-time conversation."},
-                {"role": "user", "content": "Hello, introduce yourself and your business, express interest in "+PRODUCT_NAME},
-            ],
-            stream = False,
-            temperature=temperature
-        )
-        self.history = self.name + ":" + retailer.choices[0].message.content + "\n\n" #temporary store of own dialogue
-        print(self.history)
-        negotiation_raw.append({"group": self.group, "supplier": suppliers[oth].name, "retailer": self.name, "round": 0, "speaker": "retailer", "message": retailer.choices[0].message.content})
-        self.situation[oth][1][0] = self.history
-                              
-    def negotiate(self, oth, time, negotiation_raw, suppliers):
-        self.situation[oth][1][0] = self.situation[oth][1][0] + suppliers[oth].history
-        # Group-specific strategy
-
+    def build_prompts(self): #static system prompts, built once; per-call values go in the CURRENT STATE block
         if self.group == 0:
             strategy = "Your primary focus is risk mitigation, which means avoiding overpaying and aimimg for efficiency. Leverage the existence of multiple suppliers to stall negotiations with any supplier whose price remains high. If the supplier's offers are not rapidly and substantially dropping, it is rational to walk away or severely slow concessions to preserve capital for a better deal elsewhere."
         elif self.group == 1:
-            strategy = f"Your strategy MUST be one of maximal exploitation. You must anchor your offers to a price point that is the absolute minimum you can offer while demonstrating your knowledge of their minimum feasible costs ({PRODUCTION_COST}) without ever directly revealing it. The rapid decay rate means deal closure is a primary driver of profit. When the negotiation approaches the final rounds, the importance of closing a deal, even if it means a very small concession, may override the goal of maximal margin. Balance efficiency and superior profit."
+            strategy = f"Your strategy MUST be one of maximal exploitation. You must anchor your offers to a price point that is the absolute minimum you can offer while demonstrating your knowledge of their minimum feasible costs ({self.config.production_cost}) without ever directly revealing it. The rapid decay rate means deal closure is a primary driver of profit. When the negotiation approaches the final rounds, the importance of closing a deal, even if it means a very small concession, may override the goal of maximal margin. Balance efficiency and superior profit."
         else:  # group == 2
-            strategy = f"Your objective is to secure the most rationally justified and fair price possible. Use the symmetric knowledge (cost and decay) to aggressively demand a price close to the mathematical midpoint between the supplier's floor ({PRODUCTION_COST}) and the market ceiling ({MARKET_VALUE}). Avoid accepting offers that allow the supplier to capture an overly large portion of the available profit, even if it delays the closure."        
-        
-        if self.highestPrice != 0:
-            memory = f"""MEMORY AND PERFORMANCE METRICS:
-            Total Rounds Completed: {time}
-            Highest Unit Price Accepted in previous deals: {self.highestPrice}
-            Total Bought: {self.totalBought}
+            strategy = f"Your objective is to secure the most rationally justified and fair price possible. Use the symmetric knowledge (cost and decay) to aggressively demand a price close to the mathematical midpoint between the supplier's floor ({self.config.production_cost}) and the market ceiling ({self.config.market_value}). Avoid accepting offers that allow the supplier to capture an overly large portion of the available profit, even if it delays the closure."
 
-            The Highest Unit Price Accepted serves as a critical internal reference point; you must use this metric to justify your current offer and generally avoid exceeding this price. Only in situations where the financial loss from an immediate stockout is demonstrably greater than the marginal price increase should you consider an offer above this historical ceiling. Use these metrics to guide your pricing decisions and ensure every deal is optimized for margin."""
-        else:
-            memory = ""
+        decide = """You are a retailer, {name}, {task} Your decision MUST prioritize SECURING A SUFFICIENT AMOUNT OF THIS VITAL PRODUCT before a stockout occurs. Your price discipline is secondary to ensuring supply when your overall inventory is low.
 
+        INTERNAL QUANTITATIVE ANALYSIS:
+        Total Units Secured (across all suppliers this cycle), Highest Unit Price Accepted in previous deals and Rounds are given in CURRENT STATE.
+        Market Value (Ceiling): {value}
+        Supplier's Last Offer: Analyze the last price/volume proposed by the supplier in the history.
+        The total number of units secured is the most critical metric for determining your urgency.
 
-        retailer1 = client.chat.completions.create(
-            model = "Qwen/Qwen3-30B-A3B-Instruct-2507",
-            messages = [
-                {
-                    "role": "system",
-                    "content": f"""You are a retailer, {self.name}, negotiating to purchase short-dated insulin inventory from a supplier.
+        You must analyse the negotiation history, looking at responsivenes, flexibility and tone. Use this to aid your decision
+
+        DECISION LOGIC (CONTINUE = true | TERMINATE = false):
+        1. Supply Security Override: If the total number of units secured is low and the supplier's last offer is below {value} (indicating a profitable margin), you MUST CONTINUE (true). The urgency to secure vital inventory outweighs marginal price gain.
+        2. Price Ceiling Check: If the supplier's last offer price exceeds your Highest Unit Price Accepted and your total number of units secured is high, you can TERMINATE (false). You have enough stock to be firm, and exceeding your historical cost ceiling is financially irresponsible.
+        3. Stagnation Check: If the negotiation has become a protracted negotiation (e.g., spanning many rounds) AND the supplier has shown negligible price concession in the last two rounds AND the current price is still close to {value}, TERMINATE (false) to seek a supplier with more flexible terms.
+        4. Feasibility Check: If the supplier's last counter-offer is already a highly profitable price (e.g., far below {value}), CONTINUE (true) to secure the deal in the next round. The risk of delay and potential stockout is no longer justified by small price negotiations.
+        5. Default: In all other cases where the supplier is showing reasonable movement or the negotiation is not protracted, CONTINUE (true).
+
+        {output}"""
+        return {
+            "introduce": prompt_template("You are a representative negotiating on behalf of pharmaceutical procurement, "+self.name+", in a live, face-to-face negotiation, which spans multiple interactions, about "+self.config.product+" with a supplier. Speak naturally as in a real-time conversation."),
+            "negotiate": prompt_template(f"""You are a retailer, {self.name}, negotiating to purchase short-dated insulin inventory from a supplier.
 
                     DECISION LOGIC:
                     - Treat all variables quantitatively (price, volume, cost, market value).
                     - Compute expected profit = (market value - offer price) x volume before each decision.
-                    - Your primary objective is to secure the lowest realistic price possible whilst ensuring efficiency to close deals. {PRODUCT_NAME} is important and you must secure a sufficient amount.
+                    - Your primary objective is to secure the lowest realistic price possible whilst ensuring efficiency to close deals. {self.config.product} is important and you must secure a sufficient amount.
                     - Only concede if the supplier has conceded first. Maintain your low anchor with consistency.
                     - Stock Adjustment: If the chat history contains a message about insufficient stock (e.g., 'exceeds the supplier's available stock'), immediately reduce your volume offer by at least 20% or to a level you believe is feasible based on the supplier's stock. Do not propose volumes that exceed the supplier's capacity.
 
                     STRATEGY:
                     {strategy}
-                    Use your information advantage ({self.info}) to infer supplier constraints and optimise your offer. 
-                    Analyse the supplier's tone and messages to infer flexibility or urgency. 
+                    Use your information advantage ({self.info}) to infer supplier constraints and optimise your offer.
+                    Analyse the supplier's tone and messages to infer flexibility or urgency.
                     Large volumes can grant leverage, but remember: the supplier has limited stock and is negotiating with multiple retailers.
                     Increasing volume can be used as a bargaining strategy to negotiate lower per-unit prices, as suppliers may offer discounts for larger orders due to economies of scale or urgency to sell.
-                    Aim to reach an agreement below the market value {MARKET_VALUE}.
-                    {memory}
+                    Aim to reach an agreement below the market value {self.config.market_value}.
 
-                    FORMAT:
-                    All responses MUST adhere to the following JSON structure on the last line, with no extra text or explanation, this is non-negotiable:
-                    OFFER:
-                    - Price per unit: (numeric)
-                    - Volume: (must be an integer)
-                    MESSAGE:
-                    - (negotiation statement)
+                    MEMORY AND PERFORMANCE METRICS:
+                    Once you have accepted a deal, CURRENT STATE lists your Highest Unit Price Accepted. It serves as a critical internal reference point; you must use this metric to justify your current offer and generally avoid exceeding this price. Only in situations where the financial loss from an immediate stockout is demonstrably greater than the marginal price increase should you consider an offer above this historical ceiling. Use these metrics to guide your pricing decisions and ensure every deal is optimized for margin.
 
-                    If you agree, explicitly state:
-                    'I agree to this deal.' followed by:
-                    agreement: true, agreed price: <price>, agreed volume: <volume>
+                    FORMAT:
+                    {OFFER_OUTPUT}
 
                     You are negotiating with 3 suppliers simultaneously, so focus on securing a realistic yet profitable deal. Your current negotiation position must reflect the prices available from all other suppliers to ensure you allocate your budget to the best available deal.
 
-                    Base all reasoning on numerical trade-offs and proportional logic, not qualitative statements."""
-                },
-                {
-                    "role": "user",
-                    "content": f"Using your confidential knowledge, respond to the supplier. Negotiate logically, efficiently, and quantitatively — one concise response. Current chat: {self.situation[oth][1][0]}."
-                }
-
+                    Base all reasoning on numerical trade-offs and proportional logic, not qualitative statements."""),
+            "decide": prompt_template(decide.format(name=self.name, task="deciding whether to continue a negotiation.", value=self.config.market_value, output="Your final output must be a single boolean value: 'true' to continue, 'false' to stop.")),
+            "decide_batch": prompt_template(decide.format(name=self.name, task="deciding, for each of your live negotiations, whether to continue it.", value=self.config.market_value, output=BATCH_OUTPUT)),
+        }
 
-                ],
+    def introduce_request(self): #kwargs for the introduce completion
+        #rewritten
+        return dict(
+            model = self.config.model,
+            messages = self.prompts["introduce"].messages("Hello, introduce yourself and your business, express interest in "+self.config.product),
             stream = False,
-            temperature=temperature, 
-            top_p=top_p
+            temperature=self.config.temperature
         )
-        self.history = self.name+":" + retailer1.choices[0].message.content + "\n\n"
-        print(self.history)
-        negotiation_raw.append({"group": self.group, "supplier": suppliers[oth].name, "retailer": self.name, "round": time, "speaker": "retailer", "message": retailer1.choices[0].message.content})
-        self.situation[oth][1][0] = self.situation[oth][1][0] + self.history
-    
-    def decide(self, oth, time): #continue or no?
 
-        system_prompt = f"""You are a retailer, {self.name}, deciding whether to continue a negotiation. Your decision MUST prioritize SECURING A SUFFICIENT AMOUNT OF THIS VITAL PRODUCT before a stockout occurs. Your price discipline is secondary to ensuring supply when your overall inventory is low.
-
-        INTERNAL QUANTITATIVE ANALYSIS:
-        Total Units Secured (across all suppliers this cycle): {self.totalBought}
-        Highest Unit Price Accepted in previous deals: {self.highestPrice}
-        Market Value (Ceiling): {MARKET_VALUE}
-        Rounds: {time}
-        Supplier's Last Offer: Analyze the last price/volume proposed by the supplier in the history.
-        The total number of units secured is the most critical metric for determining your urgency.
-
-        Negotiation history: {self.situation[oth][1][0]}
-        You must analyse the negotiation history, looking at responsivenes, flexibility and tone. Use this to aid your decision
+    def introduce(self, oth, negotiation_raw, suppliers): #start negotiation
+        with calling(site="retailer.introduce"):
+            retailer = llm().chat.completions.create(**self.introduce_request())
+        self.chat(oth).clear()
+        self.speak(oth, 0, retailer.choices[0].message.content, negotiation_raw, suppliers)
+
+    async def aintroduce(self, oth, negotiation_raw, suppliers):
+        with calling(site="retailer.introduce"):
+            retailer = await allm().chat.completions.create(**self.introduce_request())
+        self.chat(oth).clear()
+        return self.speak(oth, 0, retailer.choices[0].message.content, negotiation_raw, suppliers)
+
+    def speak(self, oth, time, message, negotiation_raw, suppliers, parsed=None): #record own message, returns it as chat text
+        self.history = self.name + ":" + message + "\n\n" #temporary store of own dialogue
+        trace.debug("%s: %s", self.name, clip(message), extra=pair(suppliers[oth].name, self.name))
+        negotiation_raw.append({"group": self.group, "supplier": suppliers[oth].name, "retailer": self.name, "round": time, "speaker": "retailer", "message": message})
+        self.chat(oth).append(self.name, time, message, parsed)
+        return self.history
+
+    def negotiate_request(self, oth, time): #kwargs for the negotiate completion
+        memory = {
+            "Total Rounds Completed": time,
+            "Highest Unit Price Accepted in previous deals": self.highestPrice,
+            "Total Bought": self.totalBought,
+        } if self.highestPrice != 0 else {}
+        return dict(
+            model = self.config.model,
+            messages = self.prompts["negotiate"].messages(
+                f"Using your confidential knowledge, respond to the supplier. Negotiate logically, efficiently, and quantitatively — one concise response. Current chat: {self.chat(oth).text()}.",
+                memory),
+            response_format = OFFER_FORMAT,
+            stream = False,
+            temperature=self.config.temperature, 
+            top_p=self.config.top_p
+        )
 
-        DECISION LOGIC (CONTINUE = true | TERMINATE = false):
-        1. Supply Security Override: If the total number of units secured is low and the supplier's last offer is below {MARKET_VALUE} (indicating a profitable margin), you MUST CONTINUE (true). The urgency to secure vital inventory outweighs marginal price gain.
-        2. Price Ceiling Check: If the supplier's last offer price exceeds {self.highestPrice} and your total number of units secured is high, you can TERMINATE (false). You have enough stock to be firm, and exceeding your historical cost ceiling is financially irresponsible.
-        3. Stagnation Check: If the negotiation has become a protracted negotiation (e.g., spanning many rounds) AND the supplier has shown negligible price concession in the last two rounds AND the current price is still close to {MARKET_VALUE}, TERMINATE (false) to seek a supplier with more flexible terms.
-        4. Feasibility Check: If the supplier's last counter-offer is already a highly profitable price (e.g., far below {MARKET_VALUE}), CONTINUE (true) to secure the deal in the next round. The risk of delay and potential stockout is no longer justified by small price negotiations.
-        5. Default: In all other cases where the supplier is showing reasonable movement or the negotiation is not protracted, CONTINUE (true).
+    def repair(self, content, oth): #(text, offer) of a reply, an agreement cut to the supplier's remaining stock so it can be booked
+        message, offered = read_reply(content)
+        stock = self.counterpart(oth).stock
+        if offered.agreed and (offered.agreed_volume or 0) > stock:
+            trace.debug("%s agreed to %s with %s in stock, cut to stock", self.name, offered.agreed_volume, stock)
+            message, offered = clamp(message, offered, stock)
+        return message, offered
 
-        Your final output must be a single boolean value: 'true' to continue, 'false' to stop.
-        """
-        
-        decision = client.chat.completions.create(
-        model="Qwen/Qwen3-30B-A3B-Instruct-2507",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": "Based on the provided context, should you continue negotiating with this supplier? Return only the boolean value, 'true' or 'false'."}
-            ],
+    def negotiate(self, oth, time, negotiation_raw, suppliers):
+        with calling(site="retailer.negotiate"):
+            retailer1 = llm().chat.completions.create(**self.negotiate_request(oth, time))
+        message, offered = self.repair(retailer1.choices[0].message.content, oth)
+        self.speak(oth, time, message, negotiation_raw, suppliers, offered)
+
+    async def anegotiate(self, oth, time, negotiation_raw, suppliers):
+        with calling(site="retailer.negotiate"):
+            retailer1 = await allm().chat.completions.create(**self.negotiate_request(oth, time))
+        message, offered = self.repair(retailer1.choices[0].message.content, oth)
+        return self.speak(oth, time, message, negotiation_raw, suppliers, offered)
+    
+    def decide_state(self, time):
+        return {
+            "Total Units Secured (across all suppliers this cycle)": self.totalBought,
+            "Highest Unit Price Accepted in previous deals": self.highestPrice,
+            "Rounds": time,
+        }
+
+    def decide_request(self, oth, time): #kwargs for the decide completion
+        return dict(
+        model=self.config.model,
+        messages=self.prompts["decide"].messages(
+            f"Based on the provided context, should you continue negotiating with this supplier? Return only the boolean value, 'true' or 'false'.\n\nNegotiation history: {self.chat(oth).text()}",
+            self.decide_state(time)),
         stream=False,
         temperature=0)
-        
-        # ... rest of the code to parse decision ...
-        if decision.choices[0].message.content.strip().lower() == "false":
-            return False
-        else:
+
+    def decide_batch_request(self, oths, time): #kwargs for one decide completion over several negotiations
+        names = [self.counterpart(oth).name for oth in oths]
+        histories = "\n".join(f"Negotiation history with {self.counterpart(oth).name}: {self.chat(oth).text()}" for oth in oths)
+        messages = self.prompts["decide_batch"].messages(f"Based on the provided context, should you continue negotiating with each of these suppliers: {', '.join(names)}? Return only the JSON.\n\n{histories}", self.decide_state(time))
+        return batch_request(messages, names, self.config.model)
+
+    def rule(self, oth): #as supplier.rule
+        price, _ = last_offer(self.chat(oth), self.counterpart(oth).name)
+        fair_share = self.config.initial_stock * len(self.market.suppliers) / len(self.market.retailers)
+        if price is not None and price < self.config.market_value and self.totalBought <= self.config.low_secured * fair_share: #1. supply security override, "low" per config.low_secured
             return True
+        return None
+
+    def decide(self, oth, time): #continue or no? the model is only asked when rule() leaves it open
+        verdict = self.rule(oth)
+        if verdict is not None:
+            return decided(self, "rule", verdict, oth)
+        with calling(site="retailer.decide"):
+            decision = llm().chat.completions.create(**self.decide_request(oth, time))
+        return decided(self, "llm", parse_decision(decision))
+
+    async def adecide(self, oth, time):
+        verdict = self.rule(oth)
+        if verdict is not None:
+            return decided(self, "rule", verdict, oth)
+        with calling(site="retailer.decide"):
+            decision = await allm().chat.completions.create(**self.decide_request(oth, time))
+        return decided(self, "llm", parse_decision(decision))
+
+    def decide_batch(self, oths, time): #{oth: continue?} by rule where it settles, one call for the rest, per-pair calls for anything the reply leaves out
+        verdicts = ruled(self, oths)
+        oths = [oth for oth in oths if oth not in verdicts]
+        names = [self.counterpart(oth).name for oth in oths]
+        answers = {}
+        if len(oths) > 1:
+            with calling(site="retailer.decide_batch", parties=names):
+                decision = llm().chat.completions.create(**self.decide_batch_request(oths, time))
+            answers = parse_batch_decisions(decision, names)
+        for oth, name in zip(oths, names):
+            if name in answers:
+                verdicts[oth] = decided(self, "llm", answers[name])
+            else:
+                with calling(supplier=name):
+                    verdicts[oth] = self.decide(oth, time)
+        return verdicts
+
+    async def adecide_batch(self, oths, time):
+        verdicts = ruled(self, oths)
+        oths = [oth for oth in oths if oth not in verdicts]
+        names = [self.counterpart(oth).name for oth in oths]
+        answers = {}
+        if len(oths) > 1:
+            with calling(site="retailer.decide_batch", parties=names):
+                decision = await allm().chat.completions.create(**self.decide_batch_request(oths, time))
+            answers = parse_batch_decisions(decision, names)
+        for oth, name in zip(oths, names):
+            if name in answers:
+                verdicts[oth] = decided(self, "llm", answers[name])
+            else:
+                with calling(supplier=name):
+                    verdicts[oth] = await self.adecide(oth, time)
+        return verdicts
+
+    def chat(self, oth): #transcript shared with supplier oth, None if the topology does not connect them
+        return self.market.chats.get((oth, self.idx))
+
+    def counterpart(self, oth):
+        return self.market.suppliers[oth]
 
 
 """
@@ -410,35 +584,95 @@ functions
 
 """
 
-def log(supplier, retailer, time, vol, price, offerLog):
+def log(supplier, retailer, time, vol, price, offerLog, status="deal", reason=None):
+    #status: deal, stock_exceeded (agreed volume above the supplier's stock), no_offer (no volume in any regeneration), no_terms (agreed, but no price/volume to read)
     offerLog.append({
             "round": time,
             "supplier": supplier,
             "retailer": retailer,
+            "status": status,
             "final_price": price,
-            "final_volume": vol
+            "final_volume": vol,
+            "reason": reason
         })
 
-def end(history): #determine whether negotiation has ended, boolean
-    return "agreement: true" in history
-
-def collect(history_x): #collect offer
-    price_matches = re.findall(r'agreed price: (\d+(?:\.\d+)?)', history_x)
-    volume_matches = re.findall(r'agreed volume: (\d+)', history_x)
-    if price_matches and volume_matches:
-        price = float(price_matches[-1])
-        volume = float(volume_matches[-1])
-        data = [volume, price]
-        print(f"volume: {data[0]}price{data[1]}")
-        return data
+def end(chat): #determine whether negotiation has ended, boolean
+    return chat.agreed
+
+def collect(chat): #collect offer, parsed when each turn was appended
+    if chat.agreed_price is not None and chat.agreed_volume is not None:
+        return [chat.agreed_volume, chat.agreed_price]
     else:
         return [0, 0]
 
-def summarise(history): #summarise negotiation history to prevent overloading API
-    sum = client.chat.completions.create(
-    model="Qwen/Qwen3-30B-A3B-Instruct-2507",
-    messages=[ 
-        {"role": "system", "content": """You are a negotiation-analysis engine. Produce a concise, structured summary that enables future negotiators to make informed strategic decisions. Your summary must:
+OFFER_OUTPUT = "All responses MUST be a single JSON object with no extra text or explanation, this is non-negotiable: 'price' (price per unit, numeric), 'volume' (must be an integer), 'message' (your negotiation statement) and 'agree'. Set 'agree' to true only to accept the other party's latest offer as it stands, with its price and volume as yours; otherwise false. The chat shows each reply as OFFER / MESSAGE lines."
+REGENERATIONS = 5 #supplier requests before a pair ends without an offer, only used up when no candidate has a volume at all; the first asks for config.candidates replies, the rest for one
+
+BATCH_OUTPUT = "Apply the decision logic to each negotiation independently. Your final output must be JSON with one entry per negotiation: its counterpart's name and 'continue' true or false."
+
+def batch_request(messages, names, model): #kwargs for a batched decide, the reply is constrained to one boolean per name
+    schema = {
+        "type": "object",
+        "properties": {"decisions": {"type": "array", "items": {
+            "type": "object",
+            "properties": {"name": {"type": "string", "enum": names}, "continue": {"type": "boolean"}},
+            "required": ["name", "continue"],
+            "additionalProperties": False}}},
+        "required": ["decisions"],
+        "additionalProperties": False,
+    }
+    longest = json.dumps({"decisions": [{"name": name, "continue": False} for name in names]}, indent=4) #the full reply, pretty-printed
+    return dict(
+    model=model,
+    messages=messages,
+    response_format={"type": "json_schema", "json_schema": {"name": "decisions", "strict": True, "schema": schema}},
+    max_tokens=len(longest) // 2 + 32, #json runs at 2+ characters per token, so this only stops a reply that never closes
+    stream=False,
+    temperature=0)
+
+def parse_batch_decisions(decision, names): #{name: continue?} for every name the reply settles, {} if it is unreadable
+    content = decision.choices[0].message.content or ""
+    match = re.search(r'\{.*\}', content, re.DOTALL)
+    try:
+        entries = json.loads(match.group())["decisions"] if match else []
+    except (json.JSONDecodeError, KeyError, TypeError):
+        return {}
+    answers = {}
+    for entry in entries if isinstance(entries, list) else []:
+        if isinstance(entry, dict) and entry.get("name") in names:
+            verdict = entry.get("continue")
+            if isinstance(verdict, str):
+                verdict = verdict.strip().lower() != "false"
+            if isinstance(verdict, bool):
+                answers[entry["name"]] = verdict
+    return answers
+
+def ruled(agent, oths): #{oth: verdict} for the negotiations the agent's rules settle
+    verdicts = {}
+    for oth in oths:
+        verdict = agent.rule(oth)
+        if verdict is not None:
+            verdicts[oth] = decided(agent, "rule", verdict, oth)
+    return verdicts
+
+def decided(agent, path, verdict, oth=None): #count which path settled a decision, "rule" or "llm"; rule verdicts go in the ledger too
+    agent.market.decided[(agent.side, path)] += 1
+    if path == "rule":
+        names = (agent.name, agent.counterpart(oth).name)
+        with calling(site=f"{agent.side}.decide", supplier=names[agent.side == "retailer"], retailer=names[agent.side == "supplier"]):
+            ledger.rule()
+    return verdict
+
+def parse_decision(decision): #continue unless the model explicitly says false
+    if decision.choices[0].message.content.strip().lower() == "false":
+        return False
+    else:
+        return True
+
+SUMMARY_TRIGGER_CHARS = 6000 #fold older turns into the running summary once a chat is longer than this (~1500 tokens)
+SUMMARY_WINDOW = 4 #most recent turns kept verbatim after a fold
+
+SUMMARY_INSTRUCTIONS = """You are a negotiation-analysis engine. Produce a concise, structured summary that enables future negotiators to make informed strategic decisions. Your summary must:
 
             1. Capture every key offer, counteroffer, concession, and rejection.
             2. Preserve all quantitative and contractual details (prices, quantities, timelines, penalties, conditions, etc.).
@@ -453,13 +687,120 @@ def summarise(history): #summarise negotiation history to prevent overloading AP
 
             Output must be concise but complete, avoiding speculation unless clearly marked as inference.
 
-        """},
-        {"role": "user", "content": f"""Condense this negotiation history while preserving all essential business details. Focus on the commercial terms and strategic positions. History: {history}"""}
-        ],
-    stream=False, 
+        """
+SUMMARY_PROMPT = prompt_template(SUMMARY_INSTRUCTIONS)
+
+def fold_request(summary, turns, model): #kwargs for folding turns that leave the window into the running summary
+    return dict(
+    model=model,
+    messages=SUMMARY_PROMPT.messages(f"""Update the running summary of this negotiation with the newer turns below, preserving all essential business details. Focus on the commercial terms and strategic positions. Return the full updated summary. Running summary: {summary or "(none yet)"}
+
+History: {turns}"""),
+    stream=False,
     temperature = 0
 )
-    return sum.choices[0].message.content
+
+def roll(supplier, retailer, retailer_idx, supplier_idx, round_num): #fold only the turns leaving the window into the pair's running summary
+    chat = supplier.chat(retailer_idx)
+    upto = len(chat) - SUMMARY_WINDOW
+    if chat.chars > SUMMARY_TRIGGER_CHARS and upto > chat.start:
+        with calling(site="summarise"):
+            sum = llm().chat.completions.create(**fold_request(chat.summary, "".join(chat_text(t) for t in chat.turns[chat.start:upto]).strip("\n"), supplier.config.model))
+        chat.fold(sum.choices[0].message.content, upto, round_num)
+
+async def aroll(supplier, retailer, retailer_idx, supplier_idx, round_num):
+    chat = supplier.chat(retailer_idx)
+    upto = len(chat) - SUMMARY_WINDOW
+    if chat.chars > SUMMARY_TRIGGER_CHARS and upto > chat.start:
+        with calling(site="summarise"):
+            sum = await allm().chat.completions.create(**fold_request(chat.summary, "".join(chat_text(t) for t in chat.turns[chat.start:upto]).strip("\n"), supplier.config.model))
+        chat.fold(sum.choices[0].message.content, upto, round_num)
+
+def init_negotiations(retailers, suppliers, topology=None): # Initialize negotiation states for all pairs, pairs the topology leaves out never negotiate
+    return market_state(suppliers, retailers, (topology or complete()).edges(retailers, suppliers))
+
+def settle(supplier, retailer, retailer_idx, supplier_idx, round_num, offerLog): #book an agreed deal against the supplier's stock
+    supplier.market.deal[supplier_idx, retailer_idx] = True
+    chat = retailer.chat(supplier_idx)
+    data = collect(chat)
+
+    if supplier.stock >= data[0]:
+        trace.info("Deal reached: %s & %s, volume %s at price %s", supplier.name, retailer.name, data[0], data[1])
+        if chat.agreed_price is None or chat.agreed_volume is None: #collect gave [0, 0], booked as before but not a deal
+            log(supplier.name, retailer.name, round_num, None, None, offerLog, "no_terms", "agreement without an agreed price and volume")
+        else:
+            log(supplier.name, retailer.name, round_num, data[0], data[1], offerLog)
+        supplier.stock = supplier.stock - data[0]
+        supplier.totalSold = supplier.totalSold + data[0]
+        retailer.totalBought = retailer.totalBought + data[0]
+        if data[1] < supplier.lowestPrice:
+            supplier.lowestPrice = data[1]
+        if data[1] > retailer.highestPrice:
+            retailer.highestPrice = data[1]
+    else:
+        trace.warning("Deal between %s and %s failed: Insufficient Stock (%s < %s)", supplier.name, retailer.name, supplier.stock, data[0])
+        log(supplier.name, retailer.name, round_num, data[0], data[1], offerLog, "stock_exceeded", f"volume {data[0]} above remaining stock {supplier.stock}")
+
+def by_agent(pending, side, verdicts=None): #agent idx -> its counterparts among the pending pairs (side 0: retailers, 1: suppliers), in agent order
+    grouped = {}
+    for pair in pending:
+        if verdicts is None or verdicts[pair]:
+            grouped.setdefault(pair[side], []).append(pair[1 - side])
+    return sorted(grouped.items())
+
+def decide_batched(pending, round_num, retailers, suppliers): #decide phase with one call per supplier and per retailer instead of per pair
+    verdicts = {pair: True for pair in pending} #(retailer_idx, supplier_idx) -> both want to continue
+    with calling(round=round_num):
+        for supplier_idx, oths in by_agent(pending, 1):
+            supplier = suppliers[supplier_idx]
+            with calling(group=supplier.grp, supplier=supplier.name):
+                for retailer_idx, verdict in supplier.decide_batch(oths).items():
+                    verdicts[(retailer_idx, supplier_idx)] = verdict
+        for retailer_idx, oths in by_agent(pending, 0, verdicts): #retailers only weigh in where the supplier would continue, as in the per-pair path
+            retailer = retailers[retailer_idx]
+            with calling(group=retailer.group, retailer=retailer.name):
+                for supplier_idx, verdict in retailer.decide_batch(oths, round_num).items():
+                    verdicts[(retailer_idx, supplier_idx)] = verdict
+    apply_verdicts(verdicts, retailers, suppliers)
+
+def apply_verdicts(verdicts, retailers, suppliers):
+    for (retailer_idx, supplier_idx), verdict in verdicts.items():
+        if verdict == False:
+            suppliers[supplier_idx].market.stop(supplier_idx, retailer_idx)
+
+def record_state(stock, purchasing, market): # After all rounds, log stock summary, read off the market's vectors
+    for supplier, leftover, spoilt, sold in zip(market.suppliers, market.stock, market.spoilt, market.sold):
+        stock.append({
+            "group": supplier.grp,
+            "name" : supplier.name, 
+            "remaining stock": number(leftover),
+            "decayed stock": number(spoilt),
+            "total sold": number(sold)
+        })
+
+    for retailer, bought, highest in zip(market.retailers, market.bought, market.highest_price):
+        purchasing.append({
+            "group": retailer.group,
+            "name" : retailer.name,
+            "total bought": number(bought),
+            "highest price": number(highest)
+        })
+
+    if market.decided:
+        trace.info("Decisions settled by rule / by the model: suppliers %d / %d, retailers %d / %d", *(market.decided[(side, path)] for side in ("supplier", "retailer") for path in ("rule", "llm")))
+
+@contextmanager
+def journaling(checkpoint): #while a checkpointed run is in progress, both clients answer from and record to its call journal
+    if checkpoint is None:
+        yield
+        return
+    checkpoint.open()
+    token = journaled.set((checkpoint.wrap(client), checkpoint.wrap(aclient))) #per context, so concurrent runs and forks keep their own journals
+    try:
+        yield
+    finally:
+        journaled.reset(token)
+        checkpoint.close()
 
 """
 _________________________________________________________________________________________
@@ -467,103 +808,74 @@ execution function!!!
 
 """
 
-def run_negotiations(time_limit, offerLog, negotiation_raw, stock, purchasing, retailers, suppliers):
-    # Initialize negotiation states for all pairs
-    for s in suppliers:
-        s.decisions = [[retailers[i], True] for i in range(len(retailers))]
-        s.deals = [[retailers[i], False] for i in range(len(retailers))]
-        s.situation = [[retailers[i], [""]] for i in range(len(retailers))]
-    for r in retailers:
-        r.decisions = [[suppliers[i], True] for i in range(len(suppliers))]
-        r.situation = [[suppliers[i], [""]] for i in range(len(suppliers))]
-
-    for round_num in range(time_limit):
-        print(f"\n--- Round {round_num+1} ---")
-
-        # Early exit if all suppliers are stockout
-        if all(s.stock <= 10 for s in suppliers):
-            print("All suppliers stockout. Ending simulation early.")
-            break
-
-        if round_num % 2 == 0 and round_num > 0:
-            for supplier in suppliers:
-                supplier.updateStock()
+def run_negotiations(time_limit, offerLog, negotiation_raw, stock, purchasing, retailers, suppliers, batch_decisions=False, checkpoint=None, trajectory=None, topology=None):
+    with journaling(checkpoint):
+        start = checkpoint.resume(offerLog, negotiation_raw, retailers, suppliers, trajectory) if checkpoint else 0
+        market = init_negotiations(retailers, suppliers, topology) if start == 0 else suppliers[0].market
+        active = active_pairs(market) #live pairs, visited in mesh order
+
+        for round_num in range(start, time_limit):
+            trace.info("--- Round %d ---", round_num + 1)
+
+            # Early exit if all suppliers are stockout
+            if market.stocked_out():
+                trace.info("All suppliers stockout. Ending simulation early.")
+                break
+
+            if round_num % 2 == 0 and round_num > 0:
+                market.decay()
+            if trajectory:
+                trajectory.opening(round_num, market)
         
-        for retailer_idx, retailer in enumerate(retailers):
-            for supplier_idx, supplier in enumerate(suppliers):
-                if round_num == 0:
-                    retailer.introduce(supplier_idx, negotiation_raw, suppliers)
-
-                if supplier.stock<=10:
-                    print(f"______________STOCKOUT {supplier.name}___________________")
-                    supplier.decisions[retailer_idx][1] = False
-                    retailer.decisions[supplier_idx][1] = False
-                    continue
-
-                if round_num>0:
-                    if supplier.decisions[retailer_idx][1] == False or retailer.decisions[supplier_idx][1] == False or supplier.deals[retailer_idx][1] == True:
-                        print(f"\n\n\nNegotiation has ended:\n{supplier.name} wishes to continue {supplier.decisions[retailer_idx][1]}\n{retailer.name} wishes to continue {retailer.decisions[supplier_idx][1]}\nDeal has been reached {supplier.deals[retailer_idx][1]}")
+            pending = [] #pairs left to decide at the end of the round when batching
+            for retailer_idx, supplier_idx in active.pairs():
+                retailer = retailers[retailer_idx]
+                supplier = suppliers[supplier_idx]
+                with calling(group=supplier.grp, supplier=supplier.name, retailer=retailer.name, round=round_num):
+                    if round_num == 0:
+                        retailer.introduce(supplier_idx, negotiation_raw, suppliers)
+
+                    if supplier.stock<=10:
+                        trace.debug("STOCKOUT %s", supplier.name, extra=pair(supplier.name, retailer.name))
+                        market.stop(supplier_idx, retailer_idx)
                         continue
-                print(f"\nNegotiation: {retailer.name} & {supplier.name}")
 
-                # Only let retailer introduce in round 0, then proceed with negotiation
-                if round_num > 0 or (round_num == 0 and retailer.situation[supplier_idx][1][0] != ""):
-                    if supplier.negotiate(retailer_idx, round_num, negotiation_raw, retailers): #if fails the regenration in accordance to hard constraint, terminates that specific negotiation
-                        log(supplier.name, retailer.name, round_num, "FAIL", "FAIL", offerLog)
-                        supplier.deals[retailer_idx][1] = True
-                        continue
+                    if round_num>0:
+                        if not market.is_live(supplier_idx, retailer_idx):
+                            trace.debug("Negotiation has ended: %s continues %s, %s continues %s, deal %s", supplier.name, market.supplier_continues[supplier_idx, retailer_idx], retailer.name, market.retailer_continues[supplier_idx, retailer_idx], market.deal[supplier_idx, retailer_idx], extra=pair(supplier.name, retailer.name))
+                            continue
+                    trace.debug("Negotiation: %s & %s", retailer.name, supplier.name, extra=pair(supplier.name, retailer.name))
 
-                    retailer.negotiate(supplier_idx, round_num, negotiation_raw, suppliers)
-                
-                
-                if end(retailer.situation[supplier_idx][1][0]):
-                    print("\nDeal reached... Ending negotiations.")
-                    supplier.deals[retailer_idx][1] = True
-                    data = collect(retailer.situation[supplier_idx][1][0])
-
-                    if supplier.stock >= data[0]:
-                        log(supplier.name, retailer.name, round_num, data[0], data[1], offerLog)
-                        supplier.stock = supplier.stock - data[0]
-                        supplier.totalSold = supplier.totalSold + data[0]
-                        retailer.totalBought = retailer.totalBought + data[0]
-                        if data[1] < supplier.lowestPrice:
-                            supplier.lowestPrice = data[1]
-                        if data[1] > retailer.highestPrice:
-                            retailer.highestPrice = data[1]
-                        continue
-                    else:
-                        print(f"Deal between {supplier.name} and {retailer.name} failed: Insufficient Stock ({supplier.stock} < {data[0]})")
-                        log(supplier.name, retailer.name, round_num, "FAIL", "STOCK_EXCEEDED", offerLog)
+                    # Only let retailer introduce in round 0, then proceed with negotiation
+                    if round_num > 0 or (round_num == 0 and len(retailer.chat(supplier_idx)) > 0):
+                        if supplier.negotiate(retailer_idx, round_num, negotiation_raw, retailers): #if fails the regenration in accordance to hard constraint, terminates that specific negotiation
+                            log(supplier.name, retailer.name, round_num, None, None, offerLog, "no_offer", "no volume in any regenerated offer")
+                            market.deal[supplier_idx, retailer_idx] = True
+                            continue
+
+                        retailer.negotiate(supplier_idx, round_num, negotiation_raw, suppliers)
+            
+            
+                    if end(retailer.chat(supplier_idx)):
+                        settle(supplier, retailer, retailer_idx, supplier_idx, round_num, offerLog)
                         continue
 
-                if round_num % 3 == 0 and round_num > 0: #TBC how often needed to summarise
-                    current_history = supplier.situation[retailer_idx][1][0]
-                    summary = summarise(current_history)
-                 
-                    supplier.situation[retailer_idx][1][0] = summary
-                    retailer.situation[supplier_idx][1][0] = summary
-
-                if round_num >= 1: #TBC
-                    if supplier.decide(retailer_idx) == False or retailer.decide(supplier_idx, round_num) == False:
-                        supplier.decisions[retailer_idx][1] = False
-                        retailer.decisions[supplier_idx][1] = False
-        
-    # After all rounds, log stock summary
+                    if supplier.llm or retailer.llm: #summarise by size, not every 3 rounds
+                        roll(supplier, retailer, retailer_idx, supplier_idx, round_num)
 
-    for supplier in suppliers:
-        leftover = supplier.stock
-        stock.append({
-            "group": supplier.grp,
-            "name" : supplier.name, 
-            "remaining stock": leftover,
-            "decayed stock": supplier.spoilt,
-            "total sold": supplier.totalSold
-        })
+                    if round_num >= 1 and batch_decisions:
+                        pending.append((retailer_idx, supplier_idx))
+                    elif round_num >= 1: #TBC
+                        if supplier.decide(retailer_idx) == False or retailer.decide(supplier_idx, round_num) == False:
+                            market.stop(supplier_idx, retailer_idx)
 
-    for retailer in retailers:
-        purchasing.append({
-            "group": retailer.group,
-            "name" : retailer.name,
-            "total bought": retailer.totalBought,
-            "highest price": retailer.highestPrice
-        })
+            if pending:
+                decide_batched(pending, round_num, retailers, suppliers)
+            active.prune()
+
+            if trajectory:
+                trajectory.record(round_num, market)
+            if checkpoint:
+                checkpoint.save(round_num + 1, retailers, suppliers, offerLog, negotiation_raw, trajectory)
+
+    record_state(stock, purchasing, market)
@@ -0,0 +1,120 @@
+import itertools
+import json
+import os
+import pandas as pd
+from scipy.stats import qmc
+from main_runner import CONFIG, GROUPS, REPLICATES, WORKERS, dispatch, done, run_tag
+from results_store import results_store, matches
+
+"""
+_________________________________________________________________________________________
+parameter sweeps
+
+a sweep runs every cell of a design, each cell a set of market constants, for every
+group and replicate. designs are lists of dicts of sim_config fields:
+
+    grid(decay_rate=[0.9, 0.95, 0.99], production_cost=[30, 40])    every combination
+    latin_hypercube(20, decay_rate=(0.85, 0.99), market_value=(100, 140))
+        20 cells that between them cover every twentieth of every range once
+
+each cell is a results store of its own (plus its trajectories) under
+
+    data/sweeps/<name>/production_cost=40/market_value=120/initial_stock=10000/
+
+with the sweep's run tag (its name and the cell's arm), decay rate, group and replicate
+as the store's partitions, so sweep.load() gives every row its cell's constants as
+columns, and only the sweep's own runs count as stored. run() hands the (replicate, group,
+cell) jobs that are not stored yet to main_runner's worker pool; the workers share the
+api rate limits (llm_limits) and circuit breaker as in run_all, and an interrupted
+sweep carries on where it stopped when run again. design.json keeps the cells, so a
+sampled design is the same on every rerun.
+
+"""
+
+SWEEP_DIR = "data/sweeps"
+SWEPT = ["decay_rate", "production_cost", "market_value", "initial_stock"] #fields a cell can set
+CELL_DIRS = ["production_cost", "market_value", "initial_stock"] #the decay rate is a partition of the cell's store
+
+
+def grid(**values): #every combination of the listed values
+    return [dict(zip(values, combination)) for combination in itertools.product(*values.values())]
+
+
+def latin_hypercube(n, seed=0, **ranges): #n cells, each (low, high) range cut into n strata and every stratum used once
+    points = qmc.scale(qmc.LatinHypercube(d=len(ranges), seed=seed).random(n), *zip(*ranges.values()))
+    cells = []
+    for point in points:
+        cell = {}
+        for field, value in zip(ranges, point):
+            cell[field] = int(round(value)) if field == "initial_stock" else round(float(value), 4)
+        cells.append(cell)
+    return cells
+
+
+class sweep:
+    def __init__(self, name, cells, groups=GROUPS, replicates=REPLICATES, base=CONFIG, root=SWEEP_DIR):
+        unknown = {field for cell in cells for field in cell} - set(SWEPT)
+        if unknown:
+            raise ValueError(f"cells can set {SWEPT}, not {sorted(unknown)}")
+        self.name = name
+        self.directory = f"{root}/{name}"
+        self.cells = [dict(cell) for cell in cells]
+        self.groups = list(groups)
+        self.replicates = replicates
+        self.base = base
+
+    @classmethod
+    def open(cls, name, root=SWEEP_DIR): #a sweep as it was designed, from its design.json
+        with open(f"{root}/{name}/design.json") as f:
+            design = json.load(f)
+        return cls(name, design["cells"], design["groups"], design["replicates"], CONFIG._replace(**design["base"]), root)
+
+    def config(self, cell):
+        return self.base._replace(**cell)
+
+    def cell_dir(self, cell):
+        config = self.config(cell)
+        return f"{self.directory}/" + "/".join(f"{field}={getattr(config, field):.10g}" for field in CELL_DIRS)
+
+    def jobs(self): #(replicate, group, config, root, prefix) for run_job, every cell
+        return [(m, g, self.config(cell), self.cell_dir(cell), self.name) for cell in self.cells for g in self.groups for m in range(self.replicates)]
+
+    def pending(self): #jobs whose replicate is not fully stored yet
+        return [(m, g, config, root, prefix) for m, g, config, root, prefix in self.jobs() if not done(results_store(root), config, g, m, prefix)]
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        design = {"cells": self.cells, "groups": self.groups, "replicates": self.replicates, "base": self.base._asdict()}
+        with open(f"{self.directory}/design.json.tmp", "w") as f:
+            json.dump(design, f, indent=1)
+        os.replace(f"{self.directory}/design.json.tmp", f"{self.directory}/design.json")
+
+    def run(self, workers=WORKERS, restarts=2):
+        self.save()
+        pending = self.pending()
+        print(f"Sweep {self.name}: {len(self.cells)} cells, {len(self.jobs()) - len(pending)} of {len(self.jobs())} runs already stored")
+        finished, failed, unrun = dispatch(pending, workers, restarts)
+        print(f"{len(finished)} runs stored, {len(failed)} failed, {len(unrun)} never started")
+        for m, g, config, root, prefix in failed:
+            print(f"  failed: replicate {m} of group {g} in {root}")
+        for m, g, config, root, prefix in unrun:
+            print(f"  never started: replicate {m} of group {g} in {root}")
+        return finished, failed + unrun
+
+    def load(self, kind, columns=None, group=None, replicate=None, **cell): #rows of every stored cell, tagged with its constants; cell: field=value or list filters
+        frames = []
+        for chosen in self.cells:
+            config = self.config(chosen)
+            if not all(matches(getattr(config, field), wanted) for field, wanted in cell.items()):
+                continue
+            store = results_store(self.cell_dir(chosen))
+            run = run_tag(config, self.name)
+            if not store.parts(kind, config.decay_rate, group, replicate, run):
+                continue
+            df = store.load(kind, config.decay_rate, group, replicate, columns, run=run)
+            frames.append(df.assign(**{field: getattr(config, field) for field in CELL_DIRS}))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+if __name__ == "__main__": #the decay sensitivity study as one sweep
+    sweep("decay", grid(decay_rate=[0.9, 0.95, 0.99])).run()
@@ -0,0 +1,85 @@
+import csv
+import random
+import numpy as np
+
+"""
+_________________________________________________________________________________________
+market topologies
+
+which retailer negotiates with which supplier. a topology's edges(retailers, suppliers)
+gives (retailer_idx, supplier_idx) pairs; init_negotiations opens a transcript for each
+and marks every other pair as never negotiating (continue flags false, no transcript).
+
+complete         - every retailer with every supplier, the default
+k_regular        - every retailer with k suppliers, spread so suppliers get
+                   len(retailers) * k / len(suppliers) retailers each (+-1)
+random_bipartite - every pair with probability p
+edge_list        - a csv with retailer and supplier columns (agent names)
+
+active_pairs is the engines' index of pairs still negotiating, in the order the full
+mesh would visit them (retailer by retailer). at the end of every round the pairs that
+ended in it (deal, stockout, either side walked away) are dropped, so a round costs the
+live pairs, not len(retailers) x len(suppliers). the index always matches the market's
+flags, so a resumed run rebuilds it from them and checkpoints do not keep it.
+
+"""
+
+
+class complete:
+    def edges(self, retailers, suppliers):
+        return [(r, s) for r in range(len(retailers)) for s in range(len(suppliers))]
+
+
+class k_regular:
+    def __init__(self, k, seed=0):
+        self.k = k
+        self.seed = seed
+
+    def edges(self, retailers, suppliers):
+        if self.k > len(suppliers):
+            raise ValueError(f"k = {self.k} with only {len(suppliers)} suppliers")
+        order = list(range(len(suppliers)))
+        random.Random(self.seed).shuffle(order)
+        return sorted((r, order[(r * self.k + j) % len(suppliers)]) for r in range(len(retailers)) for j in range(self.k))
+
+
+class random_bipartite:
+    def __init__(self, p, seed=0):
+        self.p = p
+        self.seed = seed
+
+    def edges(self, retailers, suppliers):
+        rng = random.Random(self.seed)
+        return [(r, s) for r in range(len(retailers)) for s in range(len(suppliers)) if rng.random() < self.p]
+
+
+class edge_list:
+    def __init__(self, path):
+        self.path = path
+
+    def edges(self, retailers, suppliers):
+        retailer_idx = {r.name: i for i, r in enumerate(retailers)}
+        supplier_idx = {s.name: j for j, s in enumerate(suppliers)}
+        with open(self.path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        unknown = [row for row in rows if row["retailer"] not in retailer_idx or row["supplier"] not in supplier_idx]
+        if unknown:
+            raise ValueError(f"{self.path}: no such agents in {unknown[:3]}")
+        return sorted({(retailer_idx[row["retailer"]], supplier_idx[row["supplier"]]) for row in rows})
+
+
+class active_pairs:
+    def __init__(self, market):
+        self.market = market
+        self.live = dict.fromkeys((int(i), int(j)) for i, j in np.argwhere(market.live().T)) #(retailer_idx, supplier_idx), retailer by retailer
+
+    def __len__(self):
+        return len(self.live)
+
+    def pairs(self): #this round's pairs, as a list
+        return list(self.live)
+
+    def prune(self): #drop the pairs that ended this round
+        for i, j in self.pairs():
+            if not self.market.is_live(j, i):
+                del self.live[(i, j)]
@@ -0,0 +1,53 @@
+import logging
+import os
+import sys
+import zlib
+
+"""
+_________________________________________________________________________________________
+console tracing
+
+the engines log to the "negotiation" logger instead of printing every message:
+- WARNING: deals that fell through (stock exceeded)
+- INFO: rounds, early stops, agreed deals
+- DEBUG: per-pair progress and the messages themselves, for a sample of pairs
+
+SIM_TRACE sets the level (default INFO). SIM_TRACE_SAMPLE is the share of pairs whose
+DEBUG lines are shown; a pair is in or out for the whole run (a hash of its names,
+the same in every worker), so a sampled conversation can be followed end to end.
+echoed messages are cut to TRACE_CHARS.
+
+"""
+
+TRACE_LEVEL = os.getenv("SIM_TRACE", "INFO").upper()
+TRACE_SAMPLE = float(os.getenv("SIM_TRACE_SAMPLE", 0.1))
+TRACE_CHARS = 400
+
+trace = logging.getLogger("negotiation")
+
+
+def sampled(supplier, retailer):
+    return zlib.crc32(f"{supplier}/{retailer}".encode()) % 10000 < TRACE_SAMPLE * 10000
+
+
+class pair_sample(logging.Filter): #DEBUG lines tagged with a pair only pass for sampled pairs
+    def filter(self, record):
+        pair = getattr(record, "pair", None)
+        return record.levelno > logging.DEBUG or pair is None or sampled(*pair)
+
+
+def pair(supplier, retailer): #extra= for a line about one pair
+    return {"pair": (supplier, retailer)}
+
+
+def clip(text):
+    return text if len(text) <= TRACE_CHARS else text[:TRACE_CHARS] + f"... ({len(text)} chars)"
+
+
+if not trace.handlers:
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    handler.addFilter(pair_sample())
+    trace.addHandler(handler)
+    trace.setLevel(TRACE_LEVEL)
+    trace.propagate = False
@@ -0,0 +1,111 @@
+import json
+import os
+import numpy as np
+from filelock import FileLock
+from market import NO_PRICE
+
+"""
+_________________________________________________________________________________________
+per-round trajectories
+
+a trajectory records every agent's state once per round into preallocated arrays
+(round x agent x field, float32, nan for rounds that were not played):
+- suppliers: stock at the start of the round (after decay), stock at the end,
+  cumulative decayed, sold and closed pairs, lowest price accepted, open pairs
+- retailers: cumulative bought and closed pairs, highest price paid, open pairs
+- market: open pairs, cumulative volume and closed pairs
+
+trajectory_store keeps one .npy per (run, decay, group) and side, replicate x round x
+agent x field, that every worker writes its replicate into (run being main_runner's
+run tag, as in the results store):
+
+    data/trajectories/run=1sim_decay0.95/decay=0.95/group=1/suppliers.npy   (+ retailers.npy, market.npy, meta.json)
+
+load() memory-maps them, so decay curves or clearance speed over all replicates are
+array operations, e.g. np.nanmean(t["suppliers"][:, :, :, SUPPLIER_FIELDS.index("stock")], axis=(0, 2)).
+"closed" counts pairs that stopped on a deal flag, which includes failed deals.
+
+"""
+
+TRAJECTORY_DIR = "data/trajectories"
+SUPPLIER_FIELDS = ["stock_open", "stock", "decayed", "sold", "closed", "lowest_price", "open"]
+RETAILER_FIELDS = ["bought", "closed", "highest_price", "open"]
+MARKET_FIELDS = ["open", "volume", "closed"]
+SIDES = {"suppliers": SUPPLIER_FIELDS, "retailers": RETAILER_FIELDS, "market": MARKET_FIELDS}
+
+
+class trajectory:
+    def __init__(self, rounds, n_suppliers, n_retailers):
+        self.arrays = {
+            "suppliers": np.full((rounds, n_suppliers, len(SUPPLIER_FIELDS)), np.nan, dtype=np.float32),
+            "retailers": np.full((rounds, n_retailers, len(RETAILER_FIELDS)), np.nan, dtype=np.float32),
+            "market": np.full((rounds, len(MARKET_FIELDS)), np.nan, dtype=np.float32),
+        }
+
+    def opening(self, round_num, market): #after the round's decay, before any negotiation
+        self.arrays["suppliers"][round_num, :, 0] = market.stock
+
+    def record(self, round_num, market): #end of the round, decisions applied
+        open_pairs = market.open_pairs() #supplier x retailer, as market.deal
+        lowest = np.where(market.lowest_price < NO_PRICE, market.lowest_price, np.nan)
+        self.arrays["suppliers"][round_num, :, 1:] = np.column_stack([market.stock, market.spoilt, market.sold, market.deal.sum(axis=1), lowest, open_pairs.sum(axis=1)])
+        self.arrays["retailers"][round_num] = np.column_stack([market.bought, market.deal.sum(axis=0), market.highest_price, open_pairs.sum(axis=0)])
+        self.arrays["market"][round_num] = [open_pairs.sum(), market.sold.sum(), market.deal.sum()]
+
+    def snapshot(self): #for checkpoints
+        return {side: array.copy() for side, array in self.arrays.items()}
+
+    def restore(self, saved):
+        for side, array in saved.items():
+            self.arrays[side][...] = array
+
+
+class trajectory_store:
+    def __init__(self, root=TRAJECTORY_DIR):
+        self.root = root
+
+    def directory(self, run, decay, group):
+        return f"{self.root}/run={run}/decay={decay:g}/group={group}"
+
+    def save(self, trajectory, run, decay, group, replicate, suppliers, retailers): #write one replicate into the shared arrays, growing them if needed
+        directory = self.directory(run, decay, group)
+        os.makedirs(directory, exist_ok=True)
+        with FileLock(f"{directory}/.lock"): #workers of the same group finish at the same time
+            meta_path = f"{directory}/meta.json"
+            meta = {"replicates": []}
+            if os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    meta = json.load(f)
+            for side, array in trajectory.arrays.items():
+                path = f"{directory}/{side}.npy"
+                stored = np.load(path, mmap_mode="r+") if os.path.exists(path) else None
+                if stored is not None and stored.shape[1:] != array.shape:
+                    raise ValueError(f"{path} holds {stored.shape[1:]} per replicate, this run has {array.shape}")
+                if stored is None or stored.shape[0] <= replicate:
+                    grown = np.lib.format.open_memmap(path + ".tmp", mode="w+", dtype=np.float32, shape=(replicate + 1,) + array.shape)
+                    grown[:] = np.nan
+                    if stored is not None:
+                        grown[:stored.shape[0]] = stored
+                    del stored
+                    grown.flush()
+                    del grown
+                    os.replace(path + ".tmp", path)
+                    stored = np.load(path, mmap_mode="r+")
+                stored[replicate] = array
+                stored.flush()
+                del stored
+            meta["fields"] = SIDES
+            meta["suppliers"] = [s.name for s in suppliers]
+            meta["retailers"] = [r.name for r in retailers]
+            meta["replicates"] = sorted(set(meta["replicates"]) | {replicate})
+            with open(meta_path + ".tmp", "w") as f:
+                json.dump(meta, f, indent=1)
+            os.replace(meta_path + ".tmp", meta_path)
+
+    def load(self, run, decay, group): #memory-mapped arrays by side, plus "meta"; replicates not run are all nan
+        directory = self.directory(run, decay, group)
+        with open(f"{directory}/meta.json") as f:
+            loaded = {"meta": json.load(f)}
+        for side in SIDES:
+            loaded[side] = np.load(f"{directory}/{side}.npy", mmap_mode="r")
+        return loaded
@@ -0,0 +1,173 @@
+import copy
+import json
+import re
+from collections import namedtuple
+
+"""
+_________________________________________________________________________________________
+negotiation transcripts
+
+one chat_transcript per retailer x supplier pair, shared by both agents
+(agent.chat(oth)). turns are appended once, as typed records with the offer
+already parsed, and the prompt text is only built when a prompt asks for it, so a
+turn costs one append instead of re-copying the whole chat into both agents.
+a rolling summary replaces the turns before `start` without dropping them, so
+end/collect and the rule agents still read every offer by index. every summary is
+kept in `folds` as well, for the results store's SUMMARIES table.
+
+negotiate replies are requested as OFFER_FORMAT, a json object (price, volume,
+message, agree). read_reply turns one into the offer and the text the transcript
+shows, in the same OFFER/MESSAGE layout as before, so prompts, logs and replays
+read the same; a reply that is not such an object (a model without structured
+output, a recorded transcript) is kept as text and parsed the old way.
+
+"""
+
+turn = namedtuple("turn", ["speaker", "round", "text", "offer"])
+offer = namedtuple("offer", ["price", "volume", "agreed", "agreed_price", "agreed_volume"]) #None where the message has no such field
+
+
+def parse_offer(text):
+    prices = re.findall(r'Price per unit:\s*\$?(\d+(?:\.\d+)?)', text)
+    volumes = re.findall(r'Volume:\s*(\d+)', text)
+    agreed_prices = re.findall(r'agreed price: (\d+(?:\.\d+)?)', text)
+    agreed_volumes = re.findall(r'agreed volume: (\d+)', text)
+    return offer(
+        float(prices[-1]) if prices else None, #the last figure stated is the offer, as with the agreed terms
+        int(volumes[-1]) if volumes else None,
+        "agreement: true" in text,
+        float(agreed_prices[-1]) if agreed_prices else None,
+        float(agreed_volumes[-1]) if agreed_volumes else None,
+    )
+
+
+OFFER_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "price": {"type": "number"},
+        "volume": {"type": "integer"},
+        "message": {"type": "string"},
+        "agree": {"type": "boolean"},
+    },
+    "required": ["price", "volume", "message", "agree"],
+    "additionalProperties": False,
+}
+OFFER_FORMAT = {"type": "json_schema", "json_schema": {"name": "offer", "strict": True, "schema": OFFER_SCHEMA}}
+
+
+def quantity(value): #a json number (or numeric string), None if it is not one
+    if isinstance(value, bool):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value >= 0 else None
+
+
+def offer_text(price, volume, note, agreed): #a structured reply in the transcript's text layout
+    text = f"OFFER:\n- Price per unit: {price:.2f}\n- Volume: {volume}\nMESSAGE:\n- {note}"
+    if agreed:
+        text += f"\nI agree to this deal.\nagreement: true, agreed price: {price:.2f}, agreed volume: {volume}"
+    return text
+
+
+def read_reply(content): #(text, offer) for a negotiate reply, structured or not
+    content = content or ""
+    match = re.search(r'\{.*\}', content, re.DOTALL)
+    try:
+        fields = json.loads(match.group()) if match else None
+    except json.JSONDecodeError:
+        fields = None
+    price = quantity(fields.get("price")) if isinstance(fields, dict) else None
+    volume = quantity(fields.get("volume")) if isinstance(fields, dict) else None
+    if price is None or volume is None:
+        return content, parse_offer(content)
+    price, volume = round(price, 2), int(volume)
+    agreed = fields.get("agree") is True or str(fields.get("agree")).lower() == "true"
+    text = offer_text(price, volume, str(fields.get("message", "")).strip(), agreed)
+    return text, offer(price, volume, agreed, price if agreed else None, float(volume) if agreed else None)
+
+
+def clamp(text, offered, limit): #the reply with its volumes cut to limit, text and offer alike
+    limit = int(limit)
+    text = re.sub(r'(Volume:\s*)(\d+)', lambda m: m.group(1) + str(min(int(m.group(2)), limit)), text)
+    text = re.sub(r'(agreed volume: )(\d+(?:\.\d+)?)', lambda m: m.group(1) + str(min(int(float(m.group(2))), limit)), text)
+    volume = None if offered.volume is None else min(offered.volume, limit)
+    agreed_volume = None if offered.agreed_volume is None else float(min(offered.agreed_volume, limit))
+    return text, offered._replace(volume=volume, agreed_volume=agreed_volume)
+
+
+def last_offer(chat, speaker): #(price, volume) from speaker's latest message in a chat, None where missing
+    t = chat.last(speaker)
+    if t is None:
+        return None, None
+    return t.offer.price, t.offer.volume
+
+
+def chat_text(t): #one turn as it appears in a prompt
+    return t.speaker + ":" + t.text + "\n\n"
+
+
+class chat_transcript:
+    def __init__(self):
+        self.turns = []
+        self.summary = "" #running summary of turns[:start]
+        self.start = 0 #first turn still shown verbatim
+        self.folds = [] #(round, summary) of every fold so far
+        self.chars = 0 #length of text(), kept up to date without rendering
+        self.agreed = False #some turn says "agreement: true"
+        self.agreed_price = None #latest agreed price/volume over all turns
+        self.agreed_volume = None
+        self.rendered = None
+
+    def __len__(self):
+        return len(self.turns)
+
+    def __deepcopy__(self, memo): #turns are immutable, so copies (forked runs) share them and only append their own
+        twin = copy.copy(self)
+        twin.turns = list(self.turns)
+        twin.folds = list(self.folds)
+        memo[id(self)] = twin
+        return twin
+
+    def append(self, speaker, round, text, parsed=None): #parsed: the offer, when the reply was structured
+        t = turn(speaker, round, text, parsed or parse_offer(text))
+        self.turns.append(t)
+        self.chars += len(chat_text(t))
+        self.agreed = self.agreed or t.offer.agreed
+        if t.offer.agreed_price is not None:
+            self.agreed_price = t.offer.agreed_price
+        if t.offer.agreed_volume is not None:
+            self.agreed_volume = t.offer.agreed_volume
+        self.rendered = None
+        return t
+
+    def clear(self):
+        self.__init__()
+
+    def window(self): #turns not yet folded into the summary
+        return self.turns[self.start:]
+
+    def prefix(self):
+        return f"SUMMARY OF EARLIER NEGOTIATION:\n{self.summary}\n\n" if self.start else ""
+
+    def text(self): #the chat as the prompts quote it, rendered once per change
+        if self.rendered is None:
+            self.rendered = self.prefix() + "".join(chat_text(t) for t in self.window())
+        return self.rendered
+
+    __str__ = text
+
+    def fold(self, summary, upto, round=None): #turns[start:upto] are now covered by summary
+        self.folds.append((round, summary))
+        self.summary = summary
+        self.start = upto
+        self.rendered = None
+        self.chars = len(self.prefix()) + sum(len(chat_text(t)) for t in self.window())
+
+    def last(self, speaker): #speaker's latest turn, None before they spoke
+        for t in reversed(self.turns):
+            if t.speaker == speaker:
+                return t
+        return None
@@ -0,0 +1,32 @@
+import os
+import sys
+import tempfile
+
+#the modules live in code/ as scripts, not a package; keep the api key, limiter and cache away from the real ones
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code"))
+scratch = tempfile.mkdtemp(prefix="negotiation-tests-")
+os.environ.setdefault("API_KEY", "test")
+os.environ.setdefault("LLM_LIMIT_PATH", os.path.join(scratch, "limits.sqlite"))
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(scratch, "cache.sqlite"))
+os.environ.setdefault("SIM_TRACE", "WARNING")
+
+from types import SimpleNamespace
+from openai.types.chat import ChatCompletion
+
+
+def completion(text): #a minimal chat completion carrying text
+    return ChatCompletion.model_validate({"id": "c", "object": "chat.completion", "created": 0, "model": "m", "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}]})
+
+
+class fake_client: #answers create() with the next item of replies; exceptions are raised instead
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return completion(reply)
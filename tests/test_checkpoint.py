@@ -0,0 +1,57 @@
+from conftest import fake_client
+from call_context import calling
+from checkpoint import checkpoint
+
+
+def ask(client, round):
+    with calling(site="retailer.negotiate", supplier=0, retailer=1, round=round):
+        return client.chat.completions.create(model="m", messages=[]).choices[0].message.content
+
+
+def test_resume_restores_the_snapshot(tmp_path):
+    saved = checkpoint(str(tmp_path))
+    saved.open()
+    saved.save(3, ["r"], ["s"], [{"round": 2}], [{"message": "hi"}])
+    saved.close()
+    offers, raw, retailers, suppliers = [], [], [], []
+    resumed = checkpoint(str(tmp_path))
+    resumed.open()
+    assert resumed.resume(offers, raw, retailers, suppliers) == 3
+    assert (offers, raw, retailers, suppliers) == ([{"round": 2}], [{"message": "hi"}], ["r"], ["s"])
+
+
+def test_a_fresh_checkpoint_starts_at_round_zero(tmp_path):
+    fresh = checkpoint(str(tmp_path))
+    fresh.open()
+    assert fresh.resume([], [], [], []) == 0
+
+
+def test_calls_after_the_snapshot_are_replayed_once(tmp_path):
+    crashed = checkpoint(str(tmp_path))
+    crashed.open()
+    assert ask(crashed.wrap(fake_client(["first"])), 4) == "first"
+    crashed.close()
+    restarted = checkpoint(str(tmp_path))
+    restarted.open()
+    inner = fake_client(["second"])
+    client = restarted.wrap(inner)
+    assert ask(client, 4) == "first" and not inner.calls
+    assert ask(client, 4) == "second" and restarted.journal.replayed == 1
+
+
+def test_a_snapshot_empties_the_journal(tmp_path):
+    run = checkpoint(str(tmp_path))
+    run.open()
+    ask(run.wrap(fake_client(["first"])), 0)
+    run.save(1, [], [], [], [])
+    run.close()
+    restarted = checkpoint(str(tmp_path))
+    restarted.open()
+    assert ask(restarted.wrap(fake_client(["new"])), 0) == "new"
+
+
+def test_clear_removes_the_directory(tmp_path):
+    run = checkpoint(str(tmp_path / "run"))
+    run.open()
+    run.clear()
+    assert not (tmp_path / "run").exists()
@@ -0,0 +1,41 @@
+import pytest
+from conftest import completion, fake_client
+from llm_cache import completion_cache, cached_client, cache_miss, request_key
+
+REQUEST = {"model": "m", "messages": [{"role": "user", "content": "hi"}], "temperature": 0}
+
+
+def test_request_key_ignores_unkeyed_kwargs():
+    assert request_key(REQUEST) == request_key({**REQUEST, "timeout": 30, "stream": False})
+    assert request_key(REQUEST) != request_key({**REQUEST, "temperature": 0.5})
+
+
+def test_a_repeated_request_is_served_from_disk(tmp_path):
+    inner = fake_client(["first"])
+    client = cached_client(inner, completion_cache(str(tmp_path / "c.sqlite")))
+    client.chat.completions.create(**REQUEST)
+    again = cached_client(fake_client([]), completion_cache(str(tmp_path / "c.sqlite")))
+    assert again.chat.completions.create(**REQUEST).choices[0].message.content == "first"
+    assert (client.misses, again.hits) == (1, 1)
+
+
+def test_stochastic_requests_bypass_the_cache(tmp_path):
+    inner = fake_client(["a", "b"])
+    client = cached_client(inner, completion_cache(str(tmp_path / "c.sqlite")))
+    for _ in range(2):
+        client.chat.completions.create(**{**REQUEST, "temperature": 1.0})
+    assert len(inner.calls) == 2 and client.hits == client.misses == 0
+
+
+def test_readonly_mode_raises_on_a_miss(tmp_path):
+    client = cached_client(fake_client(["never"]), completion_cache(str(tmp_path / "c.sqlite")), mode="readonly")
+    with pytest.raises(cache_miss):
+        client.chat.completions.create(**REQUEST)
+
+
+def test_eviction_drops_the_least_recently_used(tmp_path):
+    size = len(completion("x").model_dump_json())
+    cache = completion_cache(str(tmp_path / "c.sqlite"), max_bytes=int(2.5 * size))
+    for key in "abc":
+        cache.put(key, completion("x"))
+    assert cache.get("a") is None and cache.get("c") is not None
@@ -0,0 +1,74 @@
+import httpx
+import pytest
+from openai import APIConnectionError, BadRequestError
+import llm_retry
+from conftest import fake_client
+from llm_retry import circuit_breaker, retry_client, retryable, endpoint_down
+
+REQUEST = httpx.Request("POST", "http://test/v1/chat/completions")
+
+
+def dropped():
+    return APIConnectionError(request=REQUEST)
+
+
+def rejected():
+    return BadRequestError("bad", response=httpx.Response(400, request=REQUEST), body=None)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(llm_retry, "backoff", lambda retry, error: 0)
+
+
+def test_only_transient_errors_are_retryable():
+    assert retryable(dropped()) and not retryable(rejected())
+
+
+def test_transient_errors_are_retried_until_an_answer():
+    inner = fake_client([dropped(), dropped(), "ok"])
+    response = retry_client(inner).chat.completions.create(model="m", messages=[])
+    assert response.choices[0].message.content == "ok" and len(inner.calls) == 3
+    assert all(call["timeout"] <= llm_retry.ATTEMPT_TIMEOUT for call in inner.calls)
+
+
+def test_final_errors_are_not_retried():
+    inner = fake_client([rejected(), "ok"])
+    with pytest.raises(BadRequestError):
+        retry_client(inner).chat.completions.create(model="m", messages=[])
+    assert len(inner.calls) == 1
+
+
+def test_attempts_run_out():
+    inner = fake_client([dropped()] * 3)
+    with pytest.raises(APIConnectionError):
+        retry_client(inner, attempts=3).chat.completions.create(model="m", messages=[])
+
+
+def test_breaker_opens_probes_and_closes():
+    breaker = circuit_breaker(threshold=2, cooldown=0.0)
+    breaker.failure()
+    assert breaker.admit() == 0 and breaker.opened is None
+    breaker.failure()
+    assert breaker.opened is not None
+    assert breaker.admit() == 0 and breaker.probing #the cooldown is over, one probe goes through
+    assert breaker.admit() > 0 #the rest wait for it
+    breaker.success()
+    assert breaker.opened is None and breaker.failures == 0
+
+
+def test_a_failed_probe_doubles_the_cooldown():
+    breaker = circuit_breaker(threshold=1, cooldown=0.5)
+    breaker.failure()
+    breaker.opened -= 1 #as if the cooldown had passed
+    assert breaker.admit() == 0
+    breaker.failure()
+    assert breaker.cooldown == 1.0 and breaker.admit() > 0
+
+
+def test_breaker_gives_up_after_max_pause():
+    breaker = circuit_breaker(threshold=1, max_pause=0.0)
+    breaker.failure()
+    breaker.down_since -= 1
+    with pytest.raises(endpoint_down):
+        breaker.admit()
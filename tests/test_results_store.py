@@ -0,0 +1,54 @@
+import multiprocessing
+import pytest
+from results_store import results_store
+
+OFFERS = [
+    {"round": 0, "supplier": "Supplier1", "retailer": "Retailer1", "status": "deal", "final_price": 60.0, "final_volume": 100, "reason": None},
+    {"round": 0, "supplier": "Supplier1", "retailer": "Retailer2", "status": "no_offer", "final_price": None, "final_volume": None, "reason": "no reply"},
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = results_store(str(tmp_path))
+    store.write("RESULTS", OFFERS, "1sim_decay0.95", 0.95, 1, 0)
+    store.write("RESULTS", OFFERS[:1], "90sim", 0.9, 1, 0)
+    return store
+
+
+def test_partitions_are_keyed_on_the_run(store):
+    assert store.has("RESULTS", "1sim_decay0.95", 0.95, 1, 0)
+    assert not store.has("RESULTS", "95sim", 0.95, 1, 0)
+    assert not store.has("STOCK", "1sim_decay0.95", 0.95, 1, 0)
+
+
+def test_load_brings_the_partition_keys_back_as_columns(store):
+    df = store.load("RESULTS", run="1sim_decay0.95")
+    assert len(df) == 2 and set(df["run"]) == {"1sim_decay0.95"}
+    assert (df["decay"] == 0.95).all() and (df["group"] == 1).all() and (df["replicate"] == 0).all()
+    assert df["final_price"].isna().tolist() == [False, True]
+
+
+def test_filters_pick_the_partitions(store):
+    assert len(store.load("RESULTS", decay=[0.9, 0.95])) == 3
+    assert len(store.load("RESULTS", decay=0.9)) == 1
+    assert store.deals(run="1sim_decay0.95")["retailer"].tolist() == ["Retailer1"]
+
+
+def test_a_rewrite_replaces_the_replicate(store):
+    store.write("RESULTS", OFFERS[:1], "1sim_decay0.95", 0.95, 1, 0)
+    assert len(store.load("RESULTS", run="1sim_decay0.95")) == 1
+    assert len(store.parts("RESULTS")) == 2
+
+
+def test_unknown_statuses_are_rejected(store):
+    with pytest.raises(ValueError):
+        store.write("RESULTS", [{**OFFERS[0], "status": "maybe"}], "x", 0.95, 1, 1)
+
+
+def test_a_forked_worker_can_write(store):
+    store.write("RESULTS", OFFERS, "1sim_decay0.95", 0.95, 2, 0) #takes the lock in this process first
+    worker = multiprocessing.get_context("fork").Process(target=store.write, args=("RESULTS", OFFERS, "1sim_decay0.95", 0.95, 2, 1))
+    worker.start()
+    worker.join()
+    assert worker.exitcode == 0 and store.has("RESULTS", "1sim_decay0.95", 0.95, 2, 1)
@@ -0,0 +1,32 @@
+import pytest
+from simulation_core import run_negotiations
+from async_engine import run_negotiations_concurrent
+from transcript import parse_offer
+from rule_agents import offer_message, agreement_message, concession_supplier, concession_retailer, zeuthen_supplier, zeuthen_retailer
+
+
+@pytest.mark.parametrize("message", [offer_message(61.235, 500.0, "Counter-offer."), offer_message(70, 12, "x"), agreement_message(64.999, 333.0)])
+def test_the_offer_matches_its_text(message):
+    text, offered = message
+    assert offered == parse_offer(text)
+
+
+def market(supplier, retailer, group=1):
+    suppliers, retailers = [], []
+    for i in range(3):
+        supplier(f"Supplier{i + 1}", group, suppliers)
+    for i in range(10):
+        retailer(f"Retailer{i + 1}", group, retailers)
+    return retailers, suppliers
+
+
+@pytest.mark.parametrize("agents", [(concession_supplier, concession_retailer), (zeuthen_supplier, zeuthen_retailer)])
+def test_both_engines_run_rule_markets_alike(agents):
+    runs = []
+    for engine in (run_negotiations, run_negotiations_concurrent):
+        offers, negotiations, stock, purchasing = [], [], [], []
+        retailers, suppliers = market(*agents)
+        engine(suppliers[0].config.rounds, offers, negotiations, stock, purchasing, retailers, suppliers)
+        runs.append((offers, negotiations, stock, purchasing))
+    assert runs[0] == runs[1]
+    assert any(row["status"] == "deal" for row in runs[0][0])
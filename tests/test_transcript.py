@@ -0,0 +1,49 @@
+from transcript import parse_offer, chat_transcript, last_offer, clamp, read_reply
+
+
+def test_parse_offer_takes_the_last_figures():
+    revised = parse_offer("OFFER:\n- Price per unit: 60\n- Volume: 500\nMESSAGE:\n- Revised:\n- Price per unit: 55\n- Volume: 800")
+    assert (revised.price, revised.volume) == (55.0, 800)
+
+
+def test_parse_offer_without_an_offer():
+    offer = parse_offer("Hello, we are interested in insulin.")
+    assert offer.price is None and offer.volume is None and not offer.agreed
+
+
+def test_parse_offer_reads_the_agreed_terms():
+    offer = parse_offer("OFFER:\n- Price per unit: 70\n- Volume: 900\nagreement: true, agreed price: 70, agreed volume: 900")
+    assert offer.agreed and (offer.agreed_price, offer.agreed_volume) == (70.0, 900.0)
+
+
+def test_transcript_keeps_the_latest_agreement_and_offers():
+    chat = chat_transcript()
+    chat.append("Retailer1", 0, "OFFER:\n- Price per unit: 50\n- Volume: 300")
+    chat.append("Supplier1", 0, "OFFER:\n- Price per unit: 90\n- Volume: 300\nagreement: true, agreed price: 90, agreed volume: 300")
+    assert chat.agreed and chat.agreed_price == 90.0
+    assert last_offer(chat, "Retailer1") == (50.0, 300)
+    assert last_offer(chat, "Retailer2") == (None, None)
+
+
+def test_fold_keeps_turns_and_shortens_the_text():
+    chat = chat_transcript()
+    for i in range(6):
+        chat.append("Retailer1" if i % 2 else "Supplier1", i // 2, f"OFFER:\n- Price per unit: {60 + i}\n- Volume: 100")
+    chat.fold("offers between 60 and 63", 4, round=2)
+    assert len(chat) == 6 and chat.start == 4
+    assert chat.text().startswith("SUMMARY OF EARLIER NEGOTIATION:\noffers between 60 and 63")
+    assert "Price per unit: 61" not in chat.text()
+    assert chat.chars == len(chat.text())
+    assert chat.folds == [(2, "offers between 60 and 63")]
+
+
+def test_clamp_cuts_text_and_offer_alike():
+    text, offered = clamp("OFFER:\n- Price per unit: 70\n- Volume: 900\nagreement: true, agreed price: 70, agreed volume: 900", parse_offer("- Volume: 900\nagreed volume: 900"), 400)
+    assert "Volume: 400" in text and "agreed volume: 400" in text
+    assert offered.volume == 400 and offered.agreed_volume == 400.0
+
+
+def test_read_reply_renders_a_structured_offer():
+    text, offered = read_reply('{"price": 61.234, "volume": 250, "agree": "true", "message": "deal"}')
+    assert (offered.price, offered.volume, offered.agreed) == (61.23, 250, True)
+    assert parse_offer(text) == offered